@@ -1,148 +1,428 @@
 """
 Energy Dashboard Flask Application
 """
-from flask import Flask, render_template, jsonify, request, redirect, url_for
-from services.home_assistant import HomeAssistantClient
-from services.data_processor import DataProcessor
+from flask import (Blueprint, Flask, Response, abort, current_app, g, render_template, jsonify, request,
+                   redirect, stream_with_context, url_for)
+from flask.json.provider import DefaultJSONProvider
+from typing import Optional
+from services.container import ServiceContainer
+from services.export import FORMATS, ExportError, export_stream
+from services.models import to_json
 from utils.logger import setup_logger
+from utils import assets, http, timing
+from utils.profiler import SamplingProfiler, ProfilerBusyError
 import config
+import hmac
+import json
 import os
-
-app = Flask(__name__)
-app.config.from_object(config)
+import sys
+import time
 
 # Initialize logger
 logger = setup_logger(__name__)
+setup_logger('services')
+
+bp = Blueprint('dashboard', __name__)
+
+
+class DashboardJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes the compact internal types (services.models)"""
+
+    def default(self, o):
+        try:
+            return to_json(o)
+        except TypeError:
+            return super().default(o)
+
+
+def create_app(config_object=config) -> Flask:
+    """
+    Create and configure the Flask application
+
+    Services are built lazily on first use, so a missing HA_TOKEN surfaces
+    as an error page instead of preventing the app from importing.
+
+    Args:
+        config_object: Configuration module or object
+
+    Returns:
+        Configured Flask application
+    """
+    app = Flask(__name__)
+    app.json = DashboardJSONProvider(app)
+    app.config.from_object(config_object)
+
+    services = ServiceContainer(config_object)
+    app.extensions['energy_dashboard'] = services
+
+    for message in config.missing_settings(config_object):
+        logger.error("%s", message)
+
+    # ETag / compression; registered first so it runs last, on the final body
+    if config_object.ETAGS or config_object.COMPRESS_RESPONSES:
+        app.after_request(finalize_response)
+    app.config['ETAG_RELEASE'] = http.release_id(os.path.join(app.root_path, app.template_folder),
+                                                 app.static_folder)
+
+    # Per-request stage timings (Server-Timing header)
+    timing.enable(config_object.SERVER_TIMING)
+    if config_object.SERVER_TIMING:
+        app.before_request(start_timing)
+        app.after_request(emit_timing)
+
+    app.before_request(refresh_settings)
+    app.before_request(note_request)
+    app.register_blueprint(bp)
+
+    # Fingerprinted, precompressed static files (python build_assets.py)
+    if config_object.STATIC_FINGERPRINTS:
+        assets.init_app(app)
+
+    if config_object.WARMUP_ON_START and config_object.HA_TOKEN and not services.read_only:
+        services.start_warmup(timeout=config_object.WARMUP_TIMEOUT)
+    else:
+        services.ready.set()
+
+    return app
+
+
+def get_services() -> ServiceContainer:
+    """Services of the application handling the current request"""
+    return current_app.extensions['energy_dashboard']
+
+
+def render_page(template: str, **context):
+    """
+    Render a template with the live settings, timed as the 'render' stage
+
+    Pages with view data are served from the page cache while the data
+    object (one cache generation of the view) and the settings are unchanged.
+    """
+    data = context.get('data')
+    cached = not_modified(data)
+    if cached is not None:
+        return cached
+
+    services = get_services()
+    context.setdefault('config', services.settings_view())
+    settings = services.settings.fingerprint
+    key = (template, request.script_root, request.endpoint,
+           tuple(sorted((name, value) for name, value in context.items() if name not in ('data', 'config'))))
+
+    with timing.stage('render'):
+        if data is not None:
+            html = services.page_cache.lookup(key, data, settings)
+            if html is not None:
+                return html
 
-# Initialize services
-ha_client = HomeAssistantClient(config.HA_URL, config.HA_TOKEN)
-data_processor = DataProcessor(ha_client, config.CACHE_TTL)
+        html = render_template(template, **context)
+        if data is not None:
+            services.page_cache.store(key, data, settings, html)
+        return html
 
 
-@app.route('/')
+def not_modified(data, version=None) -> Optional[Response]:
+    """
+    Answer with 304 when the client holds the response built from this data
+
+    The ETag is derived from the view's version (the time it was computed),
+    the URL, the settings values and the deployed templates, so it is known
+    before rendering; finalize_response attaches it to full responses.
+
+    Args:
+        data: View data the response is built from
+        version: Data version (defaults to the view's 'timestamp')
+
+    Returns:
+        304 response, or None if the body has to be built
+    """
+    if not current_app.config['ETAGS'] or not isinstance(data, dict):
+        return None
+    version = version if version is not None else data.get('timestamp')
+    if version is None:
+        return None
+    g.etag = http.data_etag(current_app.config['ETAG_RELEASE'], request.full_path, version,
+                            data.get('stale', False), get_services().settings.fingerprint)
+    return http.not_modified(g.etag, request)
+
+
+def refresh_settings():
+    """Pick up runtime settings changed by another worker"""
+    get_services().settings.refresh()
+
+
+# Requests that do not mean somebody is using the dashboard
+BACKGROUND_ENDPOINTS = ('static', 'static_asset', 'dashboard.ready')
+
+
+def note_request():
+    """Keep device prefetching running while the dashboard is in use"""
+    if request.endpoint not in BACKGROUND_ENDPOINTS:
+        get_services().note_request()
+
+
+def start_timing():
+    """Start collecting stage timings for this request"""
+    timing.start_request()
+
+
+def emit_timing(response):
+    """Attach collected timings as a Server-Timing header"""
+    timings = timing.end_request()
+    if timings is None:
+        return response
+
+    response.headers['Server-Timing'] = timings.header()
+
+    # Optional JSON debug block, e.g. /api/history?period=30d&timing=1
+    if request.args.get('timing'):
+        if response.is_json:
+            body = response.get_json(silent=True)
+            if isinstance(body, dict):
+                body['_timing'] = timings.as_dict()
+                response.set_data(json.dumps(body))
+        elif response.mimetype == 'text/html' and not response.direct_passthrough:
+            block = ('<script type="application/json" id="server-timing">'
+                     f'{json.dumps(timings.as_dict())}</script>\n</body>')
+            response.set_data(response.get_data(as_text=True).replace('</body>', block, 1))
+    return response
+
+
+def finalize_response(response):
+    """Answer unchanged views with 304 and compress the rest"""
+    settings = current_app.config
+    if settings['ETAGS']:
+        response = http.add_etag(response, request, g.get('etag'))
+    if settings['COMPRESS_RESPONSES']:
+        response = http.compress(response, request, settings['COMPRESS_MIN_SIZE'])
+    return response
+
+
+@bp.route('/')
 def index():
     """Redirect to overview page"""
-    return redirect(url_for('overview'))
+    return redirect(url_for('dashboard.overview'))
 
 
-@app.route('/overview')
+@bp.route('/overview')
 def overview():
     """Overview page with summary statistics"""
     try:
-        data = data_processor.get_overview_data()
-        return render_template('overview.html', data=data, config=config)
+        data = get_services().data_processor.get_overview_data()
+        return render_page('overview.html', data=data)
     except Exception as e:
-        logger.error(f"Error loading overview: {e}")
+        logger.error("Error loading overview: %s", e)
         return render_template('error.html', error=str(e)), 500
 
 
-@app.route('/realtime')
+@bp.route('/realtime')
 def realtime():
     """Real-time monitoring page"""
     try:
-        data = data_processor.get_realtime_data()
-        return render_template('realtime.html', data=data, config=config)
+        processor = get_services().data_processor
+        data = processor.get_realtime_data()
+        # The index belongs to this snapshot, so it can be part of the page cache key
+        return render_page('realtime.html', data=data, device_index=processor.get_device_index(data),
+                           page_size=current_app.config['DEVICE_PAGE_SIZE'])
     except Exception as e:
-        logger.error(f"Error loading realtime data: {e}")
+        logger.error("Error loading realtime data: %s", e)
         return render_template('error.html', error=str(e)), 500
 
 
-@app.route('/costs')
+@bp.route('/costs')
 def costs():
     """Cost analysis page"""
     try:
-        data = data_processor.get_cost_data()
-        return render_template('costs.html', data=data, config=config)
+        data = get_services().data_processor.get_cost_data()
+        return render_page('costs.html', data=data)
     except Exception as e:
-        logger.error(f"Error loading cost data: {e}")
+        logger.error("Error loading cost data: %s", e)
         return render_template('error.html', error=str(e)), 500
 
 
-@app.route('/history')
+@bp.route('/history')
 def history():
     """Historical trends page"""
     try:
         period = request.args.get('period', '24h')
-        data = data_processor.get_history_data(period)
-        return render_template('history.html', data=data, config=config, period=period)
+        data = get_services().data_processor.get_history_data(
+            period, request.args.get('start'), request.args.get('end'))
+        return render_page('history.html', data=data, period=period,
+                           start=request.args.get('start'), end=request.args.get('end'))
+    except ValueError as e:
+        return render_template('error.html', error=str(e)), 400
     except Exception as e:
-        logger.error(f"Error loading history data: {e}")
+        logger.error("Error loading history data: %s", e)
         return render_template('error.html', error=str(e)), 500
 
 
-@app.route('/device/<device_id>')
+@bp.route('/device/<device_id>')
 def device(device_id):
     """Device details page"""
     try:
-        data = data_processor.get_device_data(device_id)
-        return render_template('device.html', data=data, config=config, device_id=device_id)
+        services = get_services()
+        data = services.data_processor.get_device_data(device_id)
+        services.note_device_view(device_id)
+        return render_page('device.html', data=data, device_id=device_id)
+    except Exception as e:
+        logger.error("Error loading device data: %s", e)
+        return render_template('error.html', error=str(e)), 500
+
+
+@bp.route('/portfolio')
+def portfolio():
+    """Combined overview and costs of all sites"""
+    try:
+        data = get_services().sites.get_portfolio_data()
+        return render_page('portfolio.html', data=data)
     except Exception as e:
-        logger.error(f"Error loading device data: {e}")
+        logger.error("Error loading portfolio: %s", e)
         return render_template('error.html', error=str(e)), 500
 
 
-@app.route('/settings', methods=['GET', 'POST'])
+def write_env(updates: dict):
+    """
+    Update values in the .env file, keeping other entries
+
+    Args:
+        updates: Mapping of variable name to new value
+    """
+    # Read current .env file
+    env_path = os.path.join(os.path.dirname(__file__), '.env')
+    env_vars = {}
+
+    if os.path.exists(env_path):
+        with open(env_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    env_vars[key] = value
+
+    env_vars.update(updates)
+
+    # Write back to .env
+    with open(env_path, 'w') as f:
+        for key, value in env_vars.items():
+            f.write(f"{key}={value}\n")
+
+
+@bp.route('/settings', methods=['GET', 'POST'])
 def settings():
     """Configuration settings page"""
     if request.method == 'POST':
         # Handle settings update
         try:
             # Get form data
-            electricity_rate = request.form.get('electricity_rate')
-            currency = request.form.get('currency')
-            cache_ttl = request.form.get('cache_ttl')
-
-            # Read current .env file
-            env_path = os.path.join(os.path.dirname(__file__), '.env')
-            env_vars = {}
-
-            if os.path.exists(env_path):
-                with open(env_path, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#') and '=' in line:
-                            key, value = line.split('=', 1)
-                            env_vars[key] = value
-
-            # Update values
-            if electricity_rate:
-                env_vars['ELECTRICITY_RATE'] = electricity_rate
-            if currency:
-                env_vars['CURRENCY_SYMBOL'] = currency
-            if cache_ttl:
-                env_vars['CACHE_TTL'] = cache_ttl
-
-            # Write back to .env
-            with open(env_path, 'w') as f:
-                for key, value in env_vars.items():
-                    f.write(f"{key}={value}\n")
-
-            logger.info("Settings updated successfully")
-            return jsonify({'success': True, 'message': 'Settings saved! Restart service to apply changes.'})
+            form_fields = {
+                'ELECTRICITY_RATE': request.form.get('electricity_rate'),
+                'CURRENCY_SYMBOL': request.form.get('currency'),
+                'CACHE_TTL': request.form.get('cache_ttl'),
+            }
+            updates = {key: value for key, value in form_fields.items() if value}
+
+            # Apply live in every worker; only dependent cache entries are dropped
+            try:
+                changed = get_services().settings.update(updates)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+
+            # Keep .env in sync so a fresh deployment starts with the same values
+            try:
+                write_env(updates)
+            except OSError as e:
+                logger.warning("Could not update .env: %s", e)
+
+            logger.info("Settings updated successfully: %s", ', '.join(sorted(changed)) or 'no changes')
+            return jsonify({'success': True, 'message': 'Settings saved and applied.'})
         except Exception as e:
-            logger.error(f"Error updating settings: {e}")
+            logger.error("Error updating settings: %s", e)
             return jsonify({'success': False, 'error': str(e)}), 500
 
-    return render_template('settings.html', config=config)
+    return render_page('settings.html')
 
 
-@app.route('/api/realtime')
+@bp.route('/api/realtime')
 def api_realtime():
     """API endpoint for real-time data updates"""
     try:
-        data = data_processor.get_realtime_data()
-        return jsonify(data)
+        data = get_services().data_processor.get_realtime_data()
+        return not_modified(data) or jsonify(data)
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/test-connection')
+@bp.route('/api/sparklines')
+def api_sparklines():
+    """API endpoint for the recent power of every device (or of ?entity_id=a,b), served from memory"""
+    entity_ids = [entity_id.strip()
+                  for value in request.args.getlist('entity_id')
+                  for entity_id in value.split(',') if entity_id.strip()]
+    try:
+        data = get_services().data_processor.get_sparklines(entity_ids or None)
+        return (not_modified(data, data['timestamps'][-1] if data.get('timestamps') else None)
+                or jsonify({'success': True, **data}))
+    except Exception as e:
+        logger.error("API error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/devices')
+def api_devices():
+    """API endpoint for a sorted, filtered page of the tracked devices"""
+    try:
+        active = request.args.get('active')
+        if active not in (None, '', 'true', 'false', '1', '0'):
+            raise ValueError("active must be true or false")
+        try:
+            limit = int(request.args.get('limit', current_app.config['DEVICE_PAGE_SIZE']))
+            offset = int(request.args.get('offset', '0'))
+        except ValueError:
+            raise ValueError("limit and offset must be integers")
+        data = get_services().data_processor.get_device_listing(
+            sort=request.args.get('sort', 'power'),
+            room=request.args.get('room') or None,
+            active=None if not active else active in ('true', '1'),
+            limit=limit,
+            offset=offset)
+        return not_modified(data) or jsonify({'success': True, **data})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error("API error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/portfolio')
+def api_portfolio():
+    """API endpoint for the combined data of all sites"""
+    try:
+        data = get_services().sites.get_portfolio_data()
+        return not_modified(data) or jsonify({'success': True, **data})
+    except Exception as e:
+        logger.error("API error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/test-connection')
 def api_test_connection():
     """API endpoint to test Home Assistant connection"""
+    services = get_services()
+    if services.read_only:
+        # Only the collector talks to Home Assistant; report its last cycle
+        collector = services.shared_store.collector_status()
+        connected = (collector is not None and not collector.get('errors')
+                     and collector['age'] < 3 * services.config.COLLECTOR_INTERVAL)
+        return jsonify({
+            'success': connected,
+            'message': 'Collector connected' if connected else 'Collector not running or failing',
+            'collector': collector
+        }), 200 if connected else 503
+
     try:
         # Test connection by attempting to get states
-        states = ha_client.get_states()
+        states = services.ha_client.get_states()
         if states is not None:
             return jsonify({
                 'success': True,
@@ -155,53 +435,190 @@ def api_test_connection():
                 'message': 'Failed to retrieve states from Home Assistant'
             }), 500
     except Exception as e:
-        logger.error(f"Connection test failed: {e}")
+        logger.error("Connection test failed: %s", e)
         return jsonify({
             'success': False,
             'message': f'Connection failed: {str(e)}'
         }), 500
 
 
-@app.route('/api/device/<device_id>')
+@bp.route('/api/device/<device_id>')
 def api_device(device_id):
     """API endpoint for device data"""
     try:
-        data = data_processor.get_device_data(device_id)
-        return jsonify(data)
+        services = get_services()
+        data = services.data_processor.get_device_data(device_id)
+        services.note_device_view(device_id)
+        return not_modified(data) or jsonify(data)
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/history')
+@bp.route('/api/history')
 def api_history():
     """API endpoint for historical data"""
     try:
         period = request.args.get('period', '24h')
-        data = data_processor.get_history_data(period)
-        return jsonify({
+        data = get_services().data_processor.get_history_data(
+            period, request.args.get('start'), request.args.get('end'))
+        return not_modified(data) or jsonify({
             'success': True,
             'history': data.get('history', []),
-            'period': period
+            'period': data.get('period', period),
+            'start': data.get('start'),
+            'end': data.get('end'),
+            'step': data.get('step'),
+            'stale': data.get('stale', False)
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        logger.error(f"API error: {e}")
+        logger.error("API error: %s", e)
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.errorhandler(404)
+@bp.route('/api/history/breakdown')
+def api_history_breakdown():
+    """API endpoint for per-room and per-device history"""
+    try:
+        period = request.args.get('period', '24h')
+        data = get_services().data_processor.get_breakdown_history(
+            period, request.args.get('start'), request.args.get('end'))
+        return not_modified(data) or jsonify({'success': True, **data})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error("API error: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@bp.route('/api/export')
+def api_export():
+    """Stream raw state history as CSV, NDJSON, Parquet or Arrow"""
+    services = get_services()
+    file_format = request.args.get('format', 'csv').lower()
+    entity_ids = [entity_id.strip()
+                  for value in request.args.getlist('entity_id')
+                  for entity_id in value.split(',') if entity_id.strip()]
+
+    try:
+        start, end = services.data_processor.resolve_range(
+            request.args.get('period', '24h'), request.args.get('start'), request.args.get('end'))
+        if not entity_ids:
+            entity_ids = [sensor['entity_id'] for sensor in services.ha_client.get_power_sensors()]
+        chunks = export_stream(services.ha_client, entity_ids, start, end, file_format,
+                               services.config.EXPORT_SLICE_HOURS)
+    except (ValueError, ExportError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error("Export failed: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    # Exports query Home Assistant directly, also in read-only workers: cap
+    # how many run at once per worker
+    if not services.export_slots.acquire(blocking=False):
+        return jsonify({'success': False, 'error': 'Too many exports running; try again shortly'}), 429, \
+            {'Retry-After': '10'}
+
+    def stream():
+        try:
+            yield from chunks
+        finally:
+            services.export_slots.release()
+
+    mimetype, extension = FORMATS[file_format]
+    filename = f"history-{time.strftime('%Y%m%d-%H%M%S', time.localtime(start))}.{extension}"
+    return Response(stream_with_context(stream()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@bp.route('/ready')
+def ready():
+    """Readiness probe: 200 once the startup cache warm-up has finished (or the collector is running)"""
+    services = get_services()
+    if services.read_only:
+        collector = services.shared_store.collector_status()
+        is_ready = collector is not None and collector['age'] < 3 * services.config.COLLECTOR_INTERVAL
+        return jsonify({'ready': is_ready, 'collector': collector}), 200 if is_ready else 503
+
+    is_ready = services.ready.is_set()
+    return jsonify({'ready': is_ready, 'warmup': services.warmup}), 200 if is_ready else 503
+
+
+@bp.route('/debug/profile')
+def debug_profile():
+    """
+    Admin-only sampling profile of the running process
+
+    Query parameters:
+        seconds: Profile duration (capped at PROFILE_MAX_SECONDS)
+        interval_ms: Sampling interval in milliseconds (default 10)
+        idle: Include threads waiting for work ('1' to enable)
+
+    Returns a collapsed-stack file for flamegraph.pl / speedscope.
+    """
+    # Hidden unless a debug token is configured
+    debug_token = current_app.config.get('DEBUG_TOKEN')
+    if not debug_token:
+        abort(404)
+
+    # Header only: query strings end up in access and proxy logs
+    token = request.headers.get('X-Debug-Token', '')
+    if not hmac.compare_digest(token.encode(), debug_token.encode()):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    try:
+        seconds = float(request.args.get('seconds', '10'))
+        interval_ms = float(request.args.get('interval_ms', '10'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid seconds or interval_ms'}), 400
+
+    seconds = min(max(seconds, 0.1), current_app.config['PROFILE_MAX_SECONDS'])
+    interval_ms = min(max(interval_ms, 1.0), 1000.0)
+
+    profiler = SamplingProfiler(interval=interval_ms / 1000, include_idle=request.args.get('idle') == '1')
+    try:
+        logger.info("Profiling for %.1fs at %.0fms interval", seconds, interval_ms)
+        profiler.run(seconds)
+    except ProfilerBusyError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+    filename = time.strftime('profile-%Y%m%d-%H%M%S.collapsed')
+    return Response(
+        profiler.collapsed(),
+        mimetype='text/plain',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Profile-Samples': str(profiler.samples)
+        }
+    )
+
+
+@bp.app_errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
     return render_template('error.html', error='Page not found'), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
-    logger.error(f"Internal error: {error}")
+    logger.error("Internal error: %s", error)
     return render_template('error.html', error='Internal server error'), 500
 
 
+app = create_app()
+
+
 if __name__ == '__main__':
-    logger.info(f"Starting Energy Dashboard on http://localhost:5002")
+    missing = config.missing_settings()
+    if missing:
+        for message in missing:
+            print(f"ERROR: {message}", file=sys.stderr)
+        print("Set it with: export HA_TOKEN='your-token-here'", file=sys.stderr)
+        print("Or create a .env file with HA_TOKEN=your-token", file=sys.stderr)
+        sys.exit(1)
+
+    logger.info("Starting Energy Dashboard on http://localhost:5002")
     app.run(host='0.0.0.0', port=5002, debug=config.DEBUG)
@@ -0,0 +1,192 @@
+"""
+Energy Dashboard Benchmark
+
+Records Home Assistant responses once, then times the DataProcessor views
+against the recording on any machine, without Home Assistant:
+
+    python benchmark.py record ha.jsonl.gz
+    python benchmark.py run ha.jsonl.gz --runs 20 --json results.json
+    python benchmark.py run ha.jsonl.gz --compare results.json --threshold 1.25
+    python benchmark.py run ha.jsonl.gz --profile stacks.txt
+
+Every run uses a fresh DataProcessor, so each view is computed from scratch.
+With --latency the recorded response times are replayed (scaled by the
+factor); the default replays instantly, which measures processing alone.
+"""
+from statistics import median
+import argparse
+import json
+import sys
+import threading
+import time
+import logging
+
+from services.data_processor import DataProcessor
+from services.home_assistant import HomeAssistantClient
+from services.recording import RecordingTransport, ReplayTransport
+from utils import timing
+from utils.profiler import SamplingProfiler
+import config
+
+# Views timed by default; 'device' is the first tracked power sensor
+DEFAULT_VIEWS = ('overview', 'realtime', 'costs', 'history_24h', 'history_7d', 'history_30d',
+                 'breakdown_24h', 'device')
+
+
+def make_processor(ha_client) -> DataProcessor:
+    return DataProcessor(ha_client, config.CACHE_TTL, config.ELECTRICITY_RATE, config.TARIFF,
+                         config.HISTORY_STATISTICS_HOURS, config.HISTORY_MAX_POINTS,
+                         sparkline_points=config.SPARKLINE_POINTS)
+
+
+def resolve_views(names: list, processor: DataProcessor) -> list:
+    """Replace 'device' by the cache key of the first tracked power sensor"""
+    views = []
+    for name in names:
+        if name == 'device':
+            sensors = [sensor for sensor in processor.ha_client.get_power_readings()
+                       if not processor._is_main_meter(sensor)]
+            if sensors:
+                views.append(f'device_{sensors[0].entity_id}')
+        else:
+            views.append(name)
+    return views
+
+
+def record(args) -> int:
+    """Query every view once against Home Assistant and record the responses"""
+    for message in config.missing_settings():
+        print(f"ERROR: {message}", file=sys.stderr)
+        return 1
+
+    transport = RecordingTransport(args.archive, config.HA_URL)
+    client = HomeAssistantClient(config.HA_URL, config.HA_TOKEN, timeout=config.HA_TIMEOUT,
+                                 retries=0, transport=transport)
+    try:
+        for view in resolve_views(args.views, make_processor(client)):
+            # Each view from a fresh processor, as it is timed later
+            started = time.perf_counter()
+            make_processor(client).refresh(view)
+            print(f"{view:<40} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    finally:
+        transport.close()
+    print(f"Recorded {transport.count} responses to {args.archive}")
+    return 0
+
+
+def benchmark(transport: ReplayTransport, views: list, runs: int) -> dict:
+    """
+    Time each view over several runs against a replay
+
+    Returns:
+        Mapping of view to timing summary (milliseconds)
+    """
+    timing.enable()
+    results = {}
+    for view in views:
+        totals = []
+        stages = {}
+        calls = transport.calls
+        for _ in range(runs):
+            client = HomeAssistantClient(transport.base_url or config.HA_URL, 'replay', retries=0,
+                                         transport=transport)
+            processor = make_processor(client)
+            timing.start_request()
+            processor.refresh(view)
+            timings = timing.end_request()
+
+            totals.append(timings.total_ms())
+            for name, (duration, _) in timings.stages.items():
+                stages.setdefault(name, []).append(duration * 1000)
+
+        totals.sort()
+        results[view] = {
+            'median_ms': round(median(totals), 3),
+            'p95_ms': round(totals[min(len(totals) - 1, int(len(totals) * 0.95))], 3),
+            'min_ms': round(totals[0], 3),
+            'ha_calls': (transport.calls - calls) / runs,
+            'stages': {name: round(median(values), 3) for name, values in stages.items()}
+        }
+    return results
+
+
+def run(args) -> int:
+    """Time the views against a recording"""
+    transport = ReplayTransport(args.archive, latency=args.latency)
+    processor = make_processor(HomeAssistantClient(transport.base_url or config.HA_URL, 'replay',
+                                                   retries=0, transport=transport))
+    views = resolve_views(args.views, processor)
+
+    if args.profile:
+        profiler = SamplingProfiler(interval=0.001)
+        results = {}
+        worker = threading.Thread(target=lambda: results.update(benchmark(transport, views, args.runs)),
+                                  name='benchmark')
+        worker.start()
+        while worker.is_alive():
+            profiler.run(0.2)
+        worker.join()
+        with open(args.profile, 'w') as f:
+            f.write(profiler.collapsed())
+        print(f"Wrote {profiler.samples} samples to {args.profile}")
+    else:
+        results = benchmark(transport, views, args.runs)
+
+    if transport.misses:
+        print(f"WARNING: {transport.misses} requests had no recorded response", file=sys.stderr)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"{'view':<40} {'median':>9} {'p95':>9} {'min':>9} {'HA calls':>9}  stages (median ms)")
+    regressions = []
+    for view, result in results.items():
+        stages = ', '.join(f"{name} {ms:.1f}" for name, ms in result['stages'].items())
+        line = (f"{view:<40} {result['median_ms']:9.2f} {result['p95_ms']:9.2f} {result['min_ms']:9.2f} "
+                f"{result['ha_calls']:9.1f}  {stages}")
+        if view in baseline:
+            ratio = result['median_ms'] / max(baseline[view]['median_ms'], 1e-6)
+            line += f"  ({ratio:.2f}x baseline)"
+            if ratio > args.threshold:
+                regressions.append(view)
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f"Slower than {args.threshold:.2f}x baseline: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="record Home Assistant responses for all views")
+    record_parser.add_argument('archive', help="archive to write (.jsonl.gz)")
+    record_parser.add_argument('--views', nargs='+', default=list(DEFAULT_VIEWS))
+
+    run_parser = commands.add_parser('run', help="time the views against a recording")
+    run_parser.add_argument('archive', help="archive written by 'record' or HA_RECORD_PATH")
+    run_parser.add_argument('--views', nargs='+', default=list(DEFAULT_VIEWS))
+    run_parser.add_argument('--runs', type=int, default=10)
+    run_parser.add_argument('--latency', type=float, default=0.0,
+                            help="replay recorded response times scaled by this factor")
+    run_parser.add_argument('--json', help="write the results to this file")
+    run_parser.add_argument('--compare', help="results file of an earlier run to compare against")
+    run_parser.add_argument('--threshold', type=float, default=1.25,
+                            help="fail when a median is this many times the baseline")
+    run_parser.add_argument('--profile', help="write collapsed stacks of the runs to this file")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    return record(args) if args.command == 'record' else run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
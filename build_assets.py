@@ -0,0 +1,25 @@
+"""
+Build fingerprinted, precompressed static assets
+
+Writes static/dist/ (see utils/assets.py). Run after changing anything in
+static/ and before starting the dashboard; without a build, the dashboard
+serves the plain static files.
+"""
+from utils import assets
+import os
+import sys
+
+
+def main() -> int:
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    manifest = assets.build(static_folder)
+    for source, hashed in sorted(manifest.items()):
+        print(f"{source:<35} -> {hashed}")
+    if assets.brotli is None:
+        print("brotli is not installed: only gzip variants were written", file=sys.stderr)
+    print(f"Built {len(manifest)} assets in {os.path.join(static_folder, assets.DIST_DIR)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Energy Dashboard Collector
+
+Single process that queries Home Assistant and publishes the dashboard views
+to SHARED_STORE_PATH. Web workers started with the same SHARED_STORE_PATH
+serve those views without contacting Home Assistant themselves.
+"""
+from services.collector import Collector
+from services.container import ServiceContainer
+from utils.logger import setup_logger
+import config
+import signal
+import sys
+
+logger = setup_logger(__name__)
+setup_logger('services')
+
+
+def main() -> int:
+    for message in config.missing_settings():
+        print(f"ERROR: {message}", file=sys.stderr)
+        return 1
+    if not config.SHARED_STORE_PATH:
+        print("ERROR: SHARED_STORE_PATH must be set for the collector", file=sys.stderr)
+        return 1
+
+    services = ServiceContainer(config, role='collector')
+    collector = Collector(services.data_processor, services.shared_store, services.settings,
+                          config.COLLECTOR_INTERVAL, config.COLLECTOR_DEMAND_WINDOW, services.prefetcher)
+    signal.signal(signal.SIGTERM, lambda signum, frame: collector.stop())
+
+    try:
+        collector.run()
+    except KeyboardInterrupt:
+        pass
+    logger.info("Collector stopped")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,21 +13,152 @@ DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'
 HA_URL = os.environ.get('HA_URL', 'http://homeassistant.local:8123')
 HA_TOKEN = os.environ.get('HA_TOKEN', 'your-home-assistant-token-here')
 
+# Home Assistant request policy
+# Timeouts adapt to the observed latency (1 second up to HA_TIMEOUT)
+HA_TIMEOUT = float(os.environ.get('HA_TIMEOUT', '10'))
+# Failed GET requests are retried this many times with jittered backoff
+HA_RETRIES = int(os.environ.get('HA_RETRIES', '2'))
+# After this many consecutive failures, calls fail immediately and pages show
+# the last known data (marked stale) until HA answers a probe again
+HA_CIRCUIT_THRESHOLD = int(os.environ.get('HA_CIRCUIT_THRESHOLD', '5'))
+# Seconds to wait before probing Home Assistant again
+HA_CIRCUIT_RESET = float(os.environ.get('HA_CIRCUIT_RESET', '30'))
+
+# Recorded Home Assistant traffic (see benchmark.py)
+# Write every Home Assistant response to this gzip JSON Lines archive. Long-term
+# statistics are not recorded, so history is read from raw state history.
+HA_RECORD_PATH = os.environ.get('HA_RECORD_PATH', '')
+# Answer from a recorded archive instead of Home Assistant (HA_TOKEN is not needed)
+HA_REPLAY_PATH = os.environ.get('HA_REPLAY_PATH', '')
+# Replay the recorded response times scaled by this factor (0 = instantly)
+HA_REPLAY_LATENCY = float(os.environ.get('HA_REPLAY_LATENCY', '0'))
+
+# Multi-site portfolio
+# The instance at HA_URL is the primary site; all other pages show it.
+SITE_NAME = os.environ.get('SITE_NAME', 'Home')
+# Further Home Assistant instances for the /portfolio page, as JSON, e.g.
+# '[{"id": "office", "name": "Office", "url": "http://office-ha:8123", "rate": 0.21}]'
+# Each site's token is read from HA_TOKEN_<ID> (here HA_TOKEN_OFFICE) unless
+# the entry has a "token"; "rate" overrides ELECTRICITY_RATE for that site.
+SITES = os.environ.get('SITES', '')
+# Sites that do not answer within this many seconds are shown as failed
+SITE_TIMEOUT = float(os.environ.get('SITE_TIMEOUT', '15'))
+
 # Energy monitoring settings
 # Your electricity rate in currency per kWh
 ELECTRICITY_RATE = float(os.environ.get('ELECTRICITY_RATE', '0.12'))
 CURRENCY_SYMBOL = os.environ.get('CURRENCY_SYMBOL', '$')
+# Optional time-of-use and tiered tariff as JSON (see services/tariff.py), e.g.
+# '{"windows": [{"name": "Off-peak", "start": 22, "end": 6, "rate": 0.08}]}'
+# Hours outside every window use the tiers, or ELECTRICITY_RATE without tiers.
+TARIFF = os.environ.get('TARIFF', '')
+
+# Settings changed from the settings page are stored here and picked up
+# live by every worker (electricity rate, currency symbol, cache TTL)
+SETTINGS_PATH = os.environ.get('SETTINGS_PATH', os.path.join(os.path.dirname(__file__), 'cache', 'settings.json'))
 
 # Cache settings (in seconds)
 # How long to cache real-time data
 CACHE_TTL = int(os.environ.get('CACHE_TTL', '60'))
 # How long to cache historical data
 HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', '300'))
+# Realtime sparklines keep this many refreshes per device in memory
+# (60 at the default CACHE_TTL of 60 seconds covers the last hour)
+SPARKLINE_POINTS = int(os.environ.get('SPARKLINE_POINTS', '60'))
+# Devices per page in the realtime device table (/api/devices)
+DEVICE_PAGE_SIZE = int(os.environ.get('DEVICE_PAGE_SIZE', '50'))
+# History periods at least this many hours long are read from Home Assistant's
+# long-term statistics instead of raw state history (needs websocket-client;
+# 0 always uses raw history)
+HISTORY_STATISTICS_HOURS = int(os.environ.get('HISTORY_STATISTICS_HOURS', '72'))
+# History responses pick the smallest bucket size (5 min ... 1 week) that keeps
+# them under this many buckets, e.g. hourly for 24h and daily for 30d
+HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', '40'))
+# /api/export fetches the requested range from Home Assistant in slices of
+# this many hours, so memory stays flat for long exports
+EXPORT_SLICE_HOURS = float(os.environ.get('EXPORT_SLICE_HOURS', '6'))
+# Exports always query Home Assistant, also in read-only web workers; this
+# many may run at once per worker, further requests get 429 Too Many Requests
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', '1'))
+# Where the cache is persisted across restarts (empty string disables snapshots)
+CACHE_SNAPSHOT_PATH = os.environ.get('CACHE_SNAPSHOT_PATH',
+                                     os.path.join(os.path.dirname(__file__), 'cache', 'snapshot.json.gz'))
+# How often the snapshot is rewritten (0 = only at shutdown)
+CACHE_SNAPSHOT_INTERVAL = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL', '300'))
+# Snapshot entries older than this are not restored
+CACHE_SNAPSHOT_MAX_AGE = int(os.environ.get('CACHE_SNAPSHOT_MAX_AGE', '86400'))
+
+# Collector process
+# Run `python collector.py` and point every web worker at the same SQLite file:
+# only the collector talks to Home Assistant, the workers read what it
+# publishes. Leave empty to let each worker query Home Assistant itself.
+SHARED_STORE_PATH = os.environ.get('SHARED_STORE_PATH', '')
+# How often the collector checks its views (each is recomputed once CACHE_TTL expires)
+COLLECTOR_INTERVAL = float(os.environ.get('COLLECTOR_INTERVAL', '10'))
+# Device pages and custom history ranges are collected while a worker asked
+# for them within this many seconds
+COLLECTOR_DEMAND_WINDOW = int(os.environ.get('COLLECTOR_DEMAND_WINDOW', '600'))
+# How long a worker waits for the collector to publish a view it asks for the first time
+COLLECTOR_WAIT = float(os.environ.get('COLLECTOR_WAIT', '5'))
+
+# Responses
+# Tag pages and API responses with an ETag so unchanged views are answered
+# with an empty 304 (wall tablets polling the same view save the transfer)
+ETAGS = os.environ.get('ETAGS', 'True').lower() == 'true'
+# Compress text responses with brotli (if the brotli package is installed) or gzip.
+# Turn off when a reverse proxy already compresses.
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'True').lower() == 'true'
+# Bodies smaller than this many bytes are not worth compressing
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+# Rendered pages kept in memory and reused until their data is refreshed
+# (0 renders every request)
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', '64'))
+
+# Serve the output of `python build_assets.py`: content-hashed static URLs with
+# immutable cache headers and precompressed .br/.gz files. Rerun the build after
+# changing static files; without a build, static files are served as they are.
+STATIC_FINGERPRINTS = os.environ.get('STATIC_FINGERPRINTS', 'True').lower() == 'true'
 
 # Application settings
 # How often to auto-refresh real-time page (in seconds)
 REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', '30'))
 
+# Startup cache warm-up
+# Prefetch overview, realtime, costs and 24h history before serving traffic
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'False').lower() == 'true'
+# How long startup waits for the warm-up before accepting traffic anyway
+WARMUP_TIMEOUT = float(os.environ.get('WARMUP_TIMEOUT', '30'))
+# Number of parallel warm-up fetches
+WARMUP_WORKERS = int(os.environ.get('WARMUP_WORKERS', '4'))
+
+# Device page prefetching
+# Keep the device views of the top consumers and of recently viewed devices
+# warm in the background, so device pages open from the cache. Each device
+# view costs 2 Home Assistant requests; the budget caps what prefetching may
+# spend per minute (0 disables it). Devices that do not fit wait a cycle.
+PREFETCH_BUDGET = float(os.environ.get('PREFETCH_BUDGET', '20'))
+# Top consumers of the overview to prefetch
+PREFETCH_TOP_N = int(os.environ.get('PREFETCH_TOP_N', '5'))
+# Recently opened device pages to keep warm
+PREFETCH_RECENT = int(os.environ.get('PREFETCH_RECENT', '10'))
+# Seconds between prefetch cycles
+PREFETCH_INTERVAL = float(os.environ.get('PREFETCH_INTERVAL', '15'))
+# Seconds a viewed device stays warm after its page was last opened
+PREFETCH_RECENT_WINDOW = float(os.environ.get('PREFETCH_RECENT_WINDOW', '1800'))
+# Prefetching pauses when no dashboard request arrived for this many seconds
+# (in the collector: while no web worker requested a view within
+# COLLECTOR_DEMAND_WINDOW)
+PREFETCH_IDLE = float(os.environ.get('PREFETCH_IDLE', '300'))
+
+# Diagnostics
+# Emit per-request Server-Timing headers (HA I/O, JSON, aggregation, render).
+# Add ?timing=1 to a URL to also get the breakdown as a JSON block.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() == 'true'
+# Token required by the /debug/profile sampling profiler (disabled when empty)
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
+# Longest profile a single request may ask for (in seconds)
+PROFILE_MAX_SECONDS = int(os.environ.get('PROFILE_MAX_SECONDS', '60'))
+
 # Example for different regions:
 # UK: ELECTRICITY_RATE = 0.28, CURRENCY_SYMBOL = '£'
 # EU: ELECTRICITY_RATE = 0.25, CURRENCY_SYMBOL = '€'
@@ -2,6 +2,7 @@
 Configuration settings for Energy Dashboard
 """
 import os
+import sys
 
 # Flask settings
 SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -10,22 +11,86 @@ DEBUG = os.environ.get('DEBUG', 'True').lower() == 'true'
 # Home Assistant settings
 HA_URL = os.environ.get('HA_URL', 'http://homeassistant.local:8123')
 HA_TOKEN = os.environ.get('HA_TOKEN', '')
+HA_TIMEOUT = float(os.environ.get('HA_TIMEOUT', '10'))  # upper bound of the adaptive request timeout
+HA_RETRIES = int(os.environ.get('HA_RETRIES', '2'))  # extra attempts for failed GET requests
+HA_CIRCUIT_THRESHOLD = int(os.environ.get('HA_CIRCUIT_THRESHOLD', '5'))  # failures that open the circuit
+HA_CIRCUIT_RESET = float(os.environ.get('HA_CIRCUIT_RESET', '30'))  # seconds before probing HA again
+HA_RECORD_PATH = os.environ.get('HA_RECORD_PATH', '')  # record HA responses to this archive (see benchmark.py)
+HA_REPLAY_PATH = os.environ.get('HA_REPLAY_PATH', '')  # serve recorded responses instead of querying HA
+HA_REPLAY_LATENCY = float(os.environ.get('HA_REPLAY_LATENCY', '0'))  # factor on recorded response times
 
-# Validate required configuration
-if not HA_TOKEN:
-    import sys
-    print("ERROR: HA_TOKEN environment variable is required", file=sys.stderr)
-    print("Set it with: export HA_TOKEN='your-token-here'", file=sys.stderr)
-    print("Or create a .env file with HA_TOKEN=your-token", file=sys.stderr)
-    sys.exit(1)
+# Multi-site portfolio (HA_URL is the primary site)
+SITE_NAME = os.environ.get('SITE_NAME', 'Home')  # display name of the primary site
+SITES = os.environ.get('SITES', '')  # JSON list of additional sites, see services/sites.py
+SITE_TIMEOUT = float(os.environ.get('SITE_TIMEOUT', '15'))  # seconds the portfolio waits for a site
 
 # Energy monitoring settings
 ELECTRICITY_RATE = float(os.environ.get('ELECTRICITY_RATE', '0.12'))  # $ per kWh
 CURRENCY_SYMBOL = os.environ.get('CURRENCY_SYMBOL', '$')
+TARIFF = os.environ.get('TARIFF', '')  # JSON time-of-use/tiered tariff, see services/tariff.py
+
+# File with settings changed at runtime from the settings page (shared by all workers)
+SETTINGS_PATH = os.environ.get('SETTINGS_PATH', os.path.join(os.path.dirname(__file__), 'cache', 'settings.json'))
 
 # Cache settings
 CACHE_TTL = int(os.environ.get('CACHE_TTL', '60'))  # seconds
 HISTORY_CACHE_TTL = int(os.environ.get('HISTORY_CACHE_TTL', '300'))  # seconds
+SPARKLINE_POINTS = int(os.environ.get('SPARKLINE_POINTS', '60'))  # realtime refreshes kept per device
+DEVICE_PAGE_SIZE = int(os.environ.get('DEVICE_PAGE_SIZE', '50'))  # devices per page on the realtime page
+HISTORY_STATISTICS_HOURS = int(os.environ.get('HISTORY_STATISTICS_HOURS', '72'))  # use HA statistics from here, 0 = off
+HISTORY_MAX_POINTS = int(os.environ.get('HISTORY_MAX_POINTS', '40'))  # target buckets per history response
+EXPORT_SLICE_HOURS = float(os.environ.get('EXPORT_SLICE_HOURS', '6'))  # history fetched per request by /api/export
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', '1'))  # /api/export streams running at once per worker
+CACHE_SNAPSHOT_PATH = os.environ.get('CACHE_SNAPSHOT_PATH',
+                                     os.path.join(os.path.dirname(__file__), 'cache', 'snapshot.json.gz'))
+CACHE_SNAPSHOT_INTERVAL = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL', '300'))  # seconds, 0 = only at exit
+CACHE_SNAPSHOT_MAX_AGE = int(os.environ.get('CACHE_SNAPSHOT_MAX_AGE', '86400'))  # ignore older entries
+
+# Collector process (collector.py); web workers only read its store when set
+SHARED_STORE_PATH = os.environ.get('SHARED_STORE_PATH', '')  # SQLite file shared with the collector
+COLLECTOR_INTERVAL = float(os.environ.get('COLLECTOR_INTERVAL', '10'))  # seconds between collector cycles
+COLLECTOR_DEMAND_WINDOW = int(os.environ.get('COLLECTOR_DEMAND_WINDOW', '600'))  # keep requested views this long
+COLLECTOR_WAIT = float(os.environ.get('COLLECTOR_WAIT', '5'))  # seconds a worker waits for a new view
+
+# Responses
+ETAGS = os.environ.get('ETAGS', 'True').lower() == 'true'  # ETag / 304 Not Modified for pages and APIs
+COMPRESS_RESPONSES = os.environ.get('COMPRESS_RESPONSES', 'True').lower() == 'true'  # gzip/brotli bodies
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))  # bytes; smaller bodies are sent as is
+RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', '64'))  # rendered pages kept, 0 = off
+STATIC_FINGERPRINTS = os.environ.get('STATIC_FINGERPRINTS', 'True').lower() == 'true'  # serve the build_assets.py output
 
 # Application settings
 REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', '30'))  # seconds for auto-refresh
+
+# Startup cache warm-up
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'False').lower() == 'true'
+WARMUP_TIMEOUT = float(os.environ.get('WARMUP_TIMEOUT', '30'))  # seconds to hold startup for warm-up
+WARMUP_WORKERS = int(os.environ.get('WARMUP_WORKERS', '4'))  # parallel warm-up fetches
+PREFETCH_BUDGET = float(os.environ.get('PREFETCH_BUDGET', '20'))  # HA requests per minute for device prefetching (0 disables)
+PREFETCH_TOP_N = int(os.environ.get('PREFETCH_TOP_N', '5'))  # top consumers whose device views are prefetched
+PREFETCH_RECENT = int(os.environ.get('PREFETCH_RECENT', '10'))  # recently viewed devices kept warm
+PREFETCH_INTERVAL = float(os.environ.get('PREFETCH_INTERVAL', '15'))  # seconds between prefetch cycles
+PREFETCH_RECENT_WINDOW = float(os.environ.get('PREFETCH_RECENT_WINDOW', '1800'))  # seconds a viewed device is kept warm
+PREFETCH_IDLE = float(os.environ.get('PREFETCH_IDLE', '300'))  # pause prefetching after this many idle seconds
+
+# Diagnostics
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'False').lower() == 'true'  # Server-Timing headers
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')  # enables /debug/profile when set
+PROFILE_MAX_SECONDS = int(os.environ.get('PROFILE_MAX_SECONDS', '60'))  # upper bound for one profile
+
+
+def missing_settings(settings=None) -> list:
+    """
+    Validate required configuration
+
+    Args:
+        settings: Configuration object to check (defaults to this module)
+
+    Returns:
+        List of error messages, empty if the configuration is complete
+    """
+    settings = settings or sys.modules[__name__]
+    errors = []
+    if not getattr(settings, 'HA_TOKEN', '') and not getattr(settings, 'HA_REPLAY_PATH', ''):
+        errors.append("HA_TOKEN environment variable is required")
+    return errors
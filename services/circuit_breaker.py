@@ -0,0 +1,135 @@
+"""
+Circuit Breaker and Adaptive Timeouts
+
+Protects request threads when Home Assistant is slow or down. After a run of
+failed calls the circuit opens and calls fail immediately instead of each
+waiting for a timeout; after a cool-down a single probe call decides whether
+it closes again. Timeouts follow the observed latency (smoothed mean plus
+four deviations, as TCP does for retransmissions) instead of a fixed value.
+"""
+import threading
+import time
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling Home Assistant while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        Initialize circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe call
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Check whether a call may go out
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with a
+                probe already in flight
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(f"Home Assistant unavailable; retrying in {remaining:.0f}s")
+                self.state = self.HALF_OPEN
+                self._probing = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError("Home Assistant unavailable; waiting for probe request")
+                self._probing = True
+
+    def record_success(self):
+        """Record a call that reached Home Assistant"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Home Assistant reachable again; closing circuit")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Record a call that timed out, failed to connect or got a server error"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Opening circuit to Home Assistant after %d failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def release(self):
+        """Record a call that neither succeeded nor failed (e.g. cut short by the client)"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused"""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+
+class AdaptiveTimeout:
+    """Request timeout derived from the smoothed latency of recent calls"""
+
+    def __init__(self, minimum: float = 1.0, maximum: float = 10.0):
+        """
+        Initialize timeout estimator
+
+        Args:
+            minimum: Lower bound in seconds
+            maximum: Upper bound in seconds, also used before any call finished
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = None
+        self.deviation = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        """
+        Add the duration of a call
+
+        Args:
+            seconds: Call latency (or the timeout, for calls that timed out)
+        """
+        with self._lock:
+            if self.mean is None:
+                self.mean = seconds
+                self.deviation = seconds / 2
+            else:
+                self.deviation = 0.75 * self.deviation + 0.25 * abs(self.mean - seconds)
+                self.mean = 0.875 * self.mean + 0.125 * seconds
+
+    @property
+    def timeout(self) -> float:
+        """Current timeout in seconds"""
+        if self.mean is None:
+            return self.maximum
+        return min(self.maximum, max(self.minimum, self.mean + 4 * self.deviation))
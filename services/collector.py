@@ -0,0 +1,100 @@
+"""
+Collector Process
+
+Runs the data processor in a single process and publishes every view it
+computes to the shared store. Web workers configured with the same store
+only read from it, so Home Assistant sees the load of one client no matter
+how many workers or nodes serve the dashboard.
+
+Start it with `python collector.py`.
+"""
+from typing import Dict
+import threading
+import time
+import logging
+
+from services.store import SharedStore
+
+logger = logging.getLogger(__name__)
+
+# Views kept current whether or not anybody is looking at them
+CORE_VIEWS = ('realtime', 'overview', 'costs', 'history_24h')
+
+
+class Collector:
+    """Refresh the views in a loop and publish them through the shared store"""
+
+    def __init__(self, processor, store: SharedStore, settings=None, interval: float = 10,
+                 demand_window: float = 600, prefetcher=None):
+        """
+        Initialize collector
+
+        Args:
+            processor: DataProcessor publishing to the store (not read-only)
+            store: Shared store the web workers read from
+            settings: Optional SettingsStore, re-read every cycle so settings
+                changed from the settings page apply here too
+            interval: Seconds between refresh cycles
+            demand_window: Views requested by a web worker are kept current
+                for this many seconds after the last request
+            prefetcher: Optional Prefetcher, kept running while web workers
+                request views
+        """
+        self.processor = processor
+        self.store = store
+        self.settings = settings
+        self.interval = interval
+        self.demand_window = demand_window
+        self.prefetcher = prefetcher
+        self._stop = threading.Event()
+
+    def run_once(self) -> Dict:
+        """
+        Run one refresh cycle
+
+        Each view is recomputed only when its processor cache entry has
+        expired (CACHE_TTL), so a short interval does not add HA requests.
+
+        Returns:
+            Dictionary mapping view key to 'ok' or an error message
+        """
+        if self.settings is not None:
+            self.settings.refresh()
+
+        started = time.time()
+        keys = list(CORE_VIEWS)
+        demanded = self.store.demanded(started - self.demand_window)
+        keys += sorted(set(demanded) - set(keys))
+        if demanded and self.prefetcher is not None:
+            # Web workers are reading views, so somebody uses the dashboard
+            self.prefetcher.note_activity()
+
+        results = {}
+        for key in keys:
+            try:
+                self.processor.refresh(key)
+                results[key] = 'ok'
+            except Exception as e:
+                logger.warning("Collecting %s failed: %s", key, e)
+                results[key] = str(e)
+
+        duration = time.time() - started
+        self.store.heartbeat({'views': len(keys), 'duration': round(duration, 3),
+                              'errors': sum(1 for result in results.values() if result != 'ok')})
+        logger.debug("Collector cycle: %d views in %.2fs", len(keys), duration)
+        return results
+
+    def run(self):
+        """Run refresh cycles until stop() is called"""
+        logger.info("Collector publishing to %s every %ss", self.store.path, self.interval)
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("Collector cycle failed: %s", e)
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def stop(self):
+        """Stop the loop after the current cycle"""
+        self._stop.set()
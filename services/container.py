@@ -0,0 +1,268 @@
+"""
+Lazily constructed services for one Flask application
+"""
+from datetime import datetime
+from typing import Optional
+import atexit
+import threading
+import time
+import logging
+
+from services.home_assistant import HomeAssistantClient
+from services.recording import RecordingTransport, ReplayTransport
+from services.data_processor import DataProcessor
+from services.prefetch import Prefetcher
+from services.settings_store import SettingsStore, SettingsView
+from services.sites import Site, SiteRegistry, parse_sites
+from services.store import SharedStore
+from utils.render_cache import PageCache
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigurationError(RuntimeError):
+    """Raised when a service is needed but required settings are missing"""
+
+
+class ServiceContainer:
+    """Build the Home Assistant client and data processor on first use"""
+
+    def __init__(self, config, role: str = 'web'):
+        """
+        Initialize service container
+
+        Args:
+            config: Configuration object (module or class with settings attributes)
+            role: 'web' for a dashboard worker, 'collector' for the collector
+                process. With SHARED_STORE_PATH set, web workers only read the
+                views the collector publishes.
+        """
+        self.config = config
+        self.role = role
+        self._lock = threading.Lock()
+        self._ha_client = None
+        self._data_processor = None
+        self._shared_store = None
+        self._sites = None
+        # Background prefetcher of device views (processors querying Home Assistant only)
+        self.prefetcher = None
+
+        # Runtime settings shared by all workers
+        self.settings = SettingsStore(config.SETTINGS_PATH, {
+            'ELECTRICITY_RATE': config.ELECTRICITY_RATE,
+            'CURRENCY_SYMBOL': config.CURRENCY_SYMBOL,
+            'CACHE_TTL': config.CACHE_TTL,
+        })
+
+        # Concurrent /api/export streams allowed in this process
+        self.export_slots = threading.BoundedSemaphore(max(1, config.EXPORT_CONCURRENCY))
+
+        # Rendered pages, reused while their view data is unchanged
+        self.page_cache = PageCache(config.RENDER_CACHE_SIZE)
+
+        # Warm-up state reported by the readiness endpoint
+        self.ready = threading.Event()
+        self.warmup = {
+            'state': 'pending',
+            'started': None,
+            'finished': None,
+            'results': {}
+        }
+
+    @property
+    def ha_client(self) -> HomeAssistantClient:
+        """Home Assistant client, created on first access"""
+        if self._ha_client is None:
+            with self._lock:
+                if self._ha_client is None:
+                    if not self.config.HA_TOKEN and not self.config.HA_REPLAY_PATH:
+                        raise ConfigurationError("HA_TOKEN environment variable is required")
+                    self._ha_client = HomeAssistantClient(self.config.HA_URL, self.config.HA_TOKEN,
+                                                          timeout=self.config.HA_TIMEOUT,
+                                                          retries=self.config.HA_RETRIES,
+                                                          failure_threshold=self.config.HA_CIRCUIT_THRESHOLD,
+                                                          reset_timeout=self.config.HA_CIRCUIT_RESET,
+                                                          transport=self._make_transport())
+        return self._ha_client
+
+    def _make_transport(self):
+        """Replay or recording transport for the Home Assistant client, if configured"""
+        if self.config.HA_REPLAY_PATH:
+            logger.warning("Serving recorded Home Assistant responses from %s", self.config.HA_REPLAY_PATH)
+            return ReplayTransport(self.config.HA_REPLAY_PATH, self.config.HA_REPLAY_LATENCY)
+        if self.config.HA_RECORD_PATH:
+            logger.warning("Recording Home Assistant responses to %s", self.config.HA_RECORD_PATH)
+            transport = RecordingTransport(self.config.HA_RECORD_PATH, self.config.HA_URL)
+            atexit.register(transport.close)
+            return transport
+        return None
+
+    @property
+    def read_only(self) -> bool:
+        """Whether this process serves views from the collector instead of Home Assistant"""
+        return self.role == 'web' and bool(self.config.SHARED_STORE_PATH)
+
+    @property
+    def shared_store(self) -> Optional[SharedStore]:
+        """Store shared with the collector process, None if not configured"""
+        if self._shared_store is None and self.config.SHARED_STORE_PATH:
+            with self._lock:
+                if self._shared_store is None:
+                    self._shared_store = SharedStore(self.config.SHARED_STORE_PATH)
+        return self._shared_store
+
+    @property
+    def data_processor(self) -> DataProcessor:
+        """Data processor, created on first access"""
+        if self._data_processor is None:
+            client = self.ha_client
+            store = self.shared_store
+            with self._lock:
+                if self._data_processor is None:
+                    processor = DataProcessor(client,
+                                              self.settings.get('CACHE_TTL'),
+                                              self.settings.get('ELECTRICITY_RATE'),
+                                              self.config.TARIFF,
+                                              self.config.HISTORY_STATISTICS_HOURS,
+                                              self.config.HISTORY_MAX_POINTS,
+                                              store=store,
+                                              read_only=self.read_only,
+                                              store_wait=self.config.COLLECTOR_WAIT,
+                                              sparkline_points=self.config.SPARKLINE_POINTS)
+                    self.settings.subscribe(processor.apply_settings)
+                    # The store already outlives restarts for read-only workers
+                    if self.config.CACHE_SNAPSHOT_PATH and not self.read_only:
+                        processor.load_snapshot(self.config.CACHE_SNAPSHOT_PATH,
+                                                self.config.CACHE_SNAPSHOT_MAX_AGE)
+                        self._start_snapshots(processor)
+                    if self.config.PREFETCH_BUDGET > 0 and not self.read_only:
+                        self.prefetcher = Prefetcher(processor, self.config.PREFETCH_BUDGET,
+                                                     self.config.PREFETCH_TOP_N, self.config.PREFETCH_RECENT,
+                                                     self.config.PREFETCH_INTERVAL,
+                                                     self.config.PREFETCH_RECENT_WINDOW,
+                                                     self.config.PREFETCH_IDLE)
+                        self.prefetcher.start()
+                    self._data_processor = processor
+        return self._data_processor
+
+    @property
+    def sites(self) -> SiteRegistry:
+        """
+        Registry of the primary site (HA_URL) and the sites listed in SITES
+
+        Raises:
+            ValueError: If SITES is malformed
+        """
+        if self._sites is None:
+            primary = Site('main', self.config.SITE_NAME, self.ha_client, self.data_processor)
+            extra = [self._build_site(spec) for spec in parse_sites(self.config.SITES)]
+            with self._lock:
+                if self._sites is None:
+                    self._sites = SiteRegistry([primary] + extra, self.config.SITE_TIMEOUT)
+        return self._sites
+
+    def _build_site(self, spec: dict) -> Site:
+        """
+        Create the client and processor of an additional site
+
+        Args:
+            spec: Site settings from parse_sites()
+
+        Returns:
+            Site with its own cache and circuit breaker
+        """
+        client = HomeAssistantClient(spec['url'], spec['token'],
+                                     timeout=self.config.HA_TIMEOUT,
+                                     retries=self.config.HA_RETRIES,
+                                     failure_threshold=self.config.HA_CIRCUIT_THRESHOLD,
+                                     reset_timeout=self.config.HA_CIRCUIT_RESET)
+        processor = DataProcessor(client,
+                                  self.settings.get('CACHE_TTL'),
+                                  spec['rate'] if spec['rate'] is not None else self.settings.get('ELECTRICITY_RATE'),
+                                  self.config.TARIFF,
+                                  self.config.HISTORY_STATISTICS_HOURS,
+                                  self.config.HISTORY_MAX_POINTS,
+                                  sparkline_points=self.config.SPARKLINE_POINTS)
+
+        def apply_settings(changed):
+            # A site with its own rate keeps it when the global rate changes
+            if spec['rate'] is not None:
+                changed = {key: value for key, value in changed.items() if key != 'ELECTRICITY_RATE'}
+            if changed:
+                processor.apply_settings(changed)
+
+        self.settings.subscribe(apply_settings)
+        return Site(spec['id'], spec['name'], client, processor)
+
+    def settings_view(self) -> SettingsView:
+        """Config object for templates, with runtime settings applied"""
+        return SettingsView(self.config, self.settings)
+
+    def note_request(self):
+        """Tell the prefetcher the dashboard is in use"""
+        if self.prefetcher is not None:
+            self.prefetcher.note_activity()
+
+    def note_device_view(self, device_id: str):
+        """
+        Tell the prefetcher a device page was opened
+
+        Args:
+            device_id: Device entity ID
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.note_view(device_id)
+
+    def _start_snapshots(self, processor: DataProcessor):
+        """
+        Save cache snapshots periodically and at interpreter exit
+
+        Args:
+            processor: Data processor whose cache is persisted
+        """
+        path = self.config.CACHE_SNAPSHOT_PATH
+        interval = self.config.CACHE_SNAPSHOT_INTERVAL
+
+        def save():
+            try:
+                processor.save_snapshot(path)
+            except Exception as e:
+                logger.warning("Could not save cache snapshot: %s", e)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                save()
+
+        if interval > 0:
+            threading.Thread(target=run, name='cache-snapshot', daemon=True).start()
+        atexit.register(save)
+
+    def start_warmup(self, timeout: float = 0):
+        """
+        Prefetch the common views in the background
+
+        Args:
+            timeout: Seconds to wait for the warm-up before returning
+                (0 returns immediately)
+        """
+        self.warmup['state'] = 'running'
+        self.warmup['started'] = datetime.now().isoformat()
+
+        thread = threading.Thread(target=self._run_warmup, name='cache-warmup', daemon=True)
+        thread.start()
+
+        if timeout and not self.ready.wait(timeout):
+            logger.warning("Cache warm-up still running after %ss; accepting traffic", timeout)
+
+    def _run_warmup(self):
+        try:
+            self.warmup['results'] = self.data_processor.warm_up(self.config.WARMUP_WORKERS)
+            self.warmup['state'] = 'done'
+        except Exception as e:
+            logger.error("Cache warm-up failed: %s", e)
+            self.warmup['state'] = 'failed'
+            self.warmup['results'] = {'error': str(e)}
+        finally:
+            self.warmup['finished'] = datetime.now().isoformat()
+            self.ready.set()
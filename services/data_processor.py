@@ -1,51 +1,349 @@
 """
 Data Processing and Caching Service
 """
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from dateutil import parser
+import functools
+import gzip
+import json
+import math
+import os
+import re
+import threading
 import time
 import logging
 
+import requests
+
+from services.energy import (HourlyEnergyBuckets, integrate_kwh, parse_datetime, parse_samples,
+                             parse_timestamp, resample, slot_sketches)
+from services.device_index import DeviceIndex
+from services.home_assistant import StatisticsUnavailable
+from services.insights import InsightsEngine
+from services.models import DeviceCost, RingSeries, SensorReading, Series, to_json
+from services.sketch import QuantileSketch
+from services.store import CollectorUnavailable
+from services.tariff import Tariff
+from utils.timing import timed
+
 logger = logging.getLogger(__name__)
 
+# Spans up to this long are read from HA's 5-minute statistics, longer ones hourly
+STATISTICS_SHORT_TERM_HOURS = 168
+
+# Bucket sizes (seconds) history queries choose from, finest first
+HISTORY_STEPS = (300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400)
+
+# Hours per unit of a period string ('30m', '6h', '7d', '2w')
+PERIOD_UNITS = {'m': 1 / 60, 'h': 1, 'd': 24, 'w': 168}
+
+# History periods offered by the history page, always kept in the cache
+PRESET_PERIODS = ('24h', '7d', '30d')
+
+# Other periods and custom ranges (history and breakdown) cached at a time;
+# the least recently used one is dropped beyond this
+ADHOC_HISTORY_ENTRIES = 16
+
+# Longest range served from raw state history when statistics are unavailable
+RAW_HISTORY_MAX_HOURS = 24 * 31
+
+# Target number of slots in the room/device breakdown grid
+BREAKDOWN_MAX_POINTS = 40
+
+# Views published longer than this many TTLs ago are marked stale for readers
+STALE_AFTER_TTLS = 3
+
+# Cache key prefixes that must be recomputed when a runtime setting changes
+SETTING_DEPENDENCIES = {
+    'ELECTRICITY_RATE': ('costs',),
+}
+
+
+def serves_stale(view: Callable) -> Callable:
+    """
+    Fall back to the last known entry of a view when Home Assistant fails
+
+    The entry is the one the view just missed in the cache (expired); it is
+    returned with 'stale': True and 'stale_since' instead of raising.
+    """
+    @functools.wraps(view)
+    def wrapper(self, *args, **kwargs):
+        self._local.missed = None
+        try:
+            return view(self, *args, **kwargs)
+        except requests.RequestException as e:
+            key = self._local.missed
+            if key not in self._cache:
+                raise
+            logger.warning("Serving stale %s: %s", key, e)
+            return self._mark_stale(self._cache[key], self._cache_timestamps.get(key, 0))
+    return wrapper
+
 
 class DataProcessor:
     """Process and cache energy data from Home Assistant"""
 
-    def __init__(self, ha_client, cache_ttl: int = 60):
+    def __init__(self, ha_client, cache_ttl: int = 60, electricity_rate: float = 0.12,
+                 tariff_spec=None, statistics_min_hours: int = 72, history_max_points: int = 40,
+                 store=None, read_only: bool = False, store_wait: float = 5.0, sparkline_points: int = 60):
         """
         Initialize data processor
 
         Args:
             ha_client: HomeAssistantClient instance
             cache_ttl: Cache time-to-live in seconds
+            electricity_rate: Price per kWh used for cost data
+            tariff_spec: Optional time-of-use/tiered tariff (see services.tariff)
+            statistics_min_hours: History periods at least this long use HA
+                long-term statistics (0 disables)
+            history_max_points: Target maximum number of history buckets
+            store: Optional SharedStore; computed views are published to it
+            read_only: Serve views from the store only and never query Home
+                Assistant for them (web workers next to a collector process)
+            store_wait: Seconds a read-only processor waits for the collector
+                to publish a view it has not seen before
+            sparkline_points: Realtime refreshes kept per device for sparklines
         """
         self.ha_client = ha_client
         self.cache_ttl = cache_ttl
+        self.electricity_rate = electricity_rate
+        self.tariff_spec = tariff_spec
+        self.statistics_min_hours = statistics_min_hours
+        self.history_max_points = history_max_points
+        self.store = store
+        self.read_only = read_only
+        self.store_wait = store_wait
+
+        # Hourly kWh of the main meter, extended incrementally for cost queries
+        self.energy_buckets = HourlyEnergyBuckets(ha_client)
+        # Power of every sensor at each realtime refresh, for sparklines
+        self.sparklines = RingSeries(sparkline_points)
+        # Running per-device statistics behind the history insights
+        self.insights = InsightsEngine()
+        # Sorted device listings of the current realtime snapshot
+        self._device_index = None
         self._cache = {}
         self._cache_timestamps = {}
 
+        # Keys loaded from a snapshot: served stale while revalidating
+        self._restored = set()
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+
+        # History views of custom ranges and non-preset periods, least recently used first
+        self._adhoc = OrderedDict()
+        self._adhoc_lock = threading.Lock()
+
+        # Views this read-only processor last asked the collector for
+        self._requested = {}
+        # Cache key each thread last missed, for serves_stale
+        self._local = threading.local()
+
     def _get_cached(self, key: str) -> Optional[Dict]:
         """
         Get cached data if still valid
 
+        Entries restored from a snapshot are returned even when expired,
+        and a background refresh is started for them.
+
         Args:
             key: Cache key
 
         Returns:
             Cached data or None if expired/missing
+
+        Raises:
+            CollectorUnavailable: If read-only and the collector has not
+                published the view
         """
-        if key in self._cache:
+        if self.read_only:
+            return self._get_published(key)
+
+        if key in self._cache and getattr(self._local, 'force', None) != key:
             timestamp = self._cache_timestamps.get(key, 0)
             if time.time() - timestamp < self.cache_ttl:
-                logger.debug(f"Cache hit: {key}")
+                logger.debug("Cache hit: %s", key)
+                return self._cache[key]
+            elif key in self._restored:
+                logger.debug("Serving restored entry while revalidating: %s", key)
+                self._revalidate(key)
                 return self._cache[key]
             else:
-                logger.debug(f"Cache expired: {key}")
+                logger.debug("Cache expired: %s", key)
 
+        self._local.missed = key
         return None
 
+    def _get_published(self, key: str) -> Dict:
+        """
+        Get a view published by the collector
+
+        The collector only keeps on-demand views current while they are being
+        requested, so every read renews the request (at most once per TTL).
+        Views not published yet are requested and waited for.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Published data
+
+        Raises:
+            CollectorUnavailable: If the view is not published within store_wait
+        """
+        now = time.time()
+        if now - self._requested.get(key, 0) >= self.cache_ttl:
+            self.store.request(key)
+            self._requested[key] = now
+
+        entry = self.store.get(key)
+        deadline = time.monotonic() + self.store_wait
+        while entry is None and time.monotonic() < deadline:
+            time.sleep(0.1)
+            entry = self.store.get(key)
+
+        if entry is None:
+            raise CollectorUnavailable(f"The collector has not published '{key}' yet; is collector.py running?")
+
+        ts, data = entry
+        if now - ts > STALE_AFTER_TTLS * self.cache_ttl:
+            return self._mark_stale(data, ts)
+        return data
+
+    def _mark_stale(self, data: Dict, ts: float) -> Dict:
+        """
+        Copy of a view marked as outdated
+
+        Args:
+            data: View data
+            ts: Time the data was computed
+
+        Returns:
+            Data with 'stale': True and 'stale_since' (ISO time)
+        """
+        return {**data, 'stale': True, 'stale_since': datetime.fromtimestamp(ts).isoformat(timespec='seconds')}
+
+    def _refresher(self, key: str) -> Optional[Callable]:
+        """
+        Find the view method that produces a cache key
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Callable recomputing the entry, or None if unknown
+        """
+        views = {
+            'overview': self.get_overview_data,
+            'realtime': self.get_realtime_data,
+            'costs': self.get_cost_data,
+            # Sparklines are published as a side effect of realtime refreshes
+            'sparklines': self.get_realtime_data,
+        }
+        if key in views:
+            return views[key]
+        if key.startswith('history_range_'):
+            start, end = self._range_bounds(key[len('history_range_'):])
+            return lambda: self.get_history_data(start=start, end=end)
+        if key.startswith('history_'):
+            return lambda: self.get_history_data(key[len('history_'):])
+        if key.startswith('breakdown_range_'):
+            start, end = self._range_bounds(key[len('breakdown_range_'):])
+            return lambda: self.get_breakdown_history(start=start, end=end)
+        if key.startswith('breakdown_'):
+            return lambda: self.get_breakdown_history(key[len('breakdown_'):])
+        if key.startswith('device_'):
+            return lambda: self.get_device_data(key[len('device_'):])
+        return None
+
+    @staticmethod
+    def _range_bounds(suffix: str) -> Tuple[str, Optional[str]]:
+        """ISO start and end (None for an open end) of a '<start>_<end|now>' key suffix"""
+        range_start, range_end = suffix.split('_')
+        start = datetime.fromtimestamp(int(range_start)).isoformat()
+        end = None if range_end == 'now' else datetime.fromtimestamp(int(range_end)).isoformat()
+        return start, end
+
+    def refresh(self, key: str, force: bool = False):
+        """
+        Produce a view by its cache key (recomputed only if its entry expired)
+
+        Args:
+            key: Cache key (e.g. 'realtime', 'history_7d', 'device_sensor.tv_power')
+            force: Recompute even if the entry is still valid
+
+        Raises:
+            ValueError: If no view produces the key
+        """
+        refresh = self._refresher(key)
+        if refresh is None:
+            raise ValueError(f"Unknown view: {key}")
+        if not force:
+            refresh()
+            return
+
+        # Only this thread bypasses the entry; requests keep being served from it
+        self._local.force = key
+        try:
+            refresh()
+        finally:
+            self._local.force = None
+
+    def peek(self, key: str) -> Optional[Dict]:
+        """
+        Get a cached entry, valid or not, without computing it
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached data or None if never computed
+        """
+        return self._cache.get(key)
+
+    def expires_in(self, key: str) -> Optional[float]:
+        """
+        Time until a cached entry expires
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Seconds left (negative once expired), or None if not cached
+        """
+        if key not in self._cache:
+            return None
+        return self._cache_timestamps.get(key, 0) + self.cache_ttl - time.time()
+
+    def _revalidate(self, key: str):
+        """
+        Recompute a restored cache entry in a background thread
+
+        Args:
+            key: Cache key
+        """
+        refresh = self._refresher(key)
+        with self._revalidate_lock:
+            if refresh is None or key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                # Drop the restored flag so the view recomputes instead of
+                # being served the stale entry again
+                self._restored.discard(key)
+                refresh()
+            except Exception as e:
+                logger.warning("Background revalidation of %s failed: %s", key, e)
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, name=f'revalidate-{key}', daemon=True).start()
+
     def _set_cache(self, key: str, data: Dict):
         """
         Store data in cache
@@ -56,8 +354,14 @@ class DataProcessor:
         """
         self._cache[key] = data
         self._cache_timestamps[key] = time.time()
-        logger.debug(f"Cache set: {key}")
+        self._restored.discard(key)
+        logger.debug("Cache set: %s", key)
+
+        if self.store is not None:
+            self.store.put(key, data, self._cache_timestamps[key])
 
+    @timed('aggregate')
+    @serves_stale
     def get_overview_data(self) -> Dict:
         """
         Get overview dashboard data
@@ -69,19 +373,17 @@ class DataProcessor:
         if cached:
             return cached
 
-        power_sensors = self.ha_client.get_power_sensors()
-        energy_sensors = self.ha_client.get_energy_sensors()
+        power_sensors = self.ha_client.get_power_readings()
+        energy_sensors = self.ha_client.get_energy_readings()
+        self._observe(power_sensors)
 
         # Separate bitshake from tracked devices
         bitshake_power = 0
         tracked_sensors = []
 
         for sensor in power_sensors:
-            entity_id = sensor['entity_id']
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', entity_id)
-
-            if 'bitshake' in entity_id.lower() or 'bitshake' in friendly_name.lower():
-                bitshake_power = self._parse_power(sensor)
+            if self._is_main_meter(sensor):
+                bitshake_power = sensor.power
             else:
                 tracked_sensors.append(sensor)
 
@@ -92,7 +394,7 @@ class DataProcessor:
         top_consumers = self._get_top_consumers(tracked_sensors, limit=5)
 
         # Calculate daily energy consumption
-        daily_energy = self._calculate_daily_energy(energy_sensors)
+        daily_energy = self._calculate_daily_energy(energy_sensors, power_sensors)
 
         # Device count (tracked devices only, exclude bitshake)
         device_count = len(tracked_sensors)
@@ -108,6 +410,8 @@ class DataProcessor:
         self._set_cache('overview', data)
         return data
 
+    @timed('aggregate')
+    @serves_stale
     def get_realtime_data(self) -> Dict:
         """
         Get real-time monitoring data
@@ -119,32 +423,29 @@ class DataProcessor:
         if cached:
             return cached
 
-        power_sensors = self.ha_client.get_power_sensors()
+        power_sensors = self.ha_client.get_power_readings()
+        self._record_sparklines(power_sensors)
+        self._observe(power_sensors)
 
         # Separate bitshake (whole-house meter) from tracked devices
         bitshake_power = 0
         tracked_sensors = []
 
         for sensor in power_sensors:
-            entity_id = sensor['entity_id']
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', entity_id)
-
             # Check if this is a bitshake entity (whole-house meter)
-            if 'bitshake' in entity_id.lower() or 'bitshake' in friendly_name.lower():
-                bitshake_power = self._parse_power(sensor)
+            if self._is_main_meter(sensor):
+                bitshake_power = sensor.power
             else:
                 tracked_sensors.append(sensor)
 
         # Calculate power by room (only tracked devices)
         rooms = {}
         for sensor in tracked_sensors:
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', sensor['entity_id'])
-            entity_id = sensor['entity_id']
-            room = self.ha_client._extract_room(friendly_name, entity_id)
+            sensor.room = self.ha_client._extract_room(sensor.name, sensor.entity_id)
 
-            if room not in rooms:
-                rooms[room] = 0
-            rooms[room] += self._parse_power(sensor)
+            if sensor.room not in rooms:
+                rooms[sensor.room] = 0
+            rooms[sensor.room] += sensor.power
 
         # Calculate tracked vs untracked
         tracked_total = sum(rooms.values())
@@ -154,26 +455,10 @@ class DataProcessor:
         if untracked_power > 0:
             rooms['Untracked'] = untracked_power
 
-        # Format device list with room information (tracked devices only)
-        devices = []
-        for sensor in tracked_sensors:
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', sensor['entity_id'])
-            entity_id = sensor['entity_id']
-            room = self.ha_client._extract_room(friendly_name, entity_id)
-
-            devices.append({
-                'id': entity_id,
-                'name': friendly_name,
-                'room': room,
-                'power': self._parse_power(sensor),
-                'unit': sensor.get('attributes', {}).get('unit_of_measurement', 'W'),
-                'state': sensor['state']
-            })
-
         data = {
             'room_power': rooms,
             'rooms': [{'name': room, 'power': power} for room, power in rooms.items()],
-            'devices': devices,
+            'devices': tracked_sensors,  # room-classified readings, serialized at the edge
             'total_power': bitshake_power if bitshake_power > 0 else tracked_total,  # Use bitshake as true total
             'tracked_power': tracked_total,
             'untracked_power': untracked_power,
@@ -184,6 +469,111 @@ class DataProcessor:
         self._set_cache('realtime', data)
         return data
 
+    def _record_sparklines(self, sensors: List[SensorReading]):
+        """
+        Append the current power of every sensor to the sparkline buffers
+
+        Args:
+            sensors: Power sensor readings of this realtime refresh
+        """
+        self.sparklines.record(time.time(), {sensor.entity_id: sensor.power for sensor in sensors})
+        if self.store is not None:
+            self.store.put('sparklines', self.sparklines)
+
+    def _observe(self, sensors: List[SensorReading]):
+        """
+        Feed the current power of every sensor to the insights engine
+
+        Args:
+            sensors: Power sensor readings just fetched
+        """
+        main_power = 0
+        devices = {}
+        for sensor in sensors:
+            if self._is_main_meter(sensor):
+                main_power = sensor.power
+            else:
+                devices[sensor.entity_id] = (sensor.name, sensor.power)
+
+        now = time.time()
+        total = main_power if main_power > 0 else sum(power for _, power in devices.values())
+        self.insights.observe(now, datetime.fromtimestamp(now).hour, total, devices)
+
+    def get_sparklines(self, entity_ids: Optional[List[str]] = None) -> Dict:
+        """
+        Get the recent power of every sensor from memory
+
+        Points are added at each realtime refresh (every CACHE_TTL while the
+        realtime view is requested), so no history is queried.
+
+        Args:
+            entity_ids: Only these sensors (e.g. the visible table page)
+
+        Returns:
+            Dictionary with epoch 'timestamps' and 'series' mapping entity
+            ID to watts (None for gaps)
+        """
+        if self.read_only:
+            data = self._get_published('sparklines')
+            if entity_ids is None:
+                return data
+            series = data.get('series', {})
+            return {**data, 'series': {key: series[key] for key in entity_ids if key in series}}
+
+        # Adds a point if the realtime entry has expired
+        self.get_realtime_data()
+        return self.sparklines.to_json(entity_ids)
+
+    def get_device_index(self, data: Optional[Dict] = None) -> DeviceIndex:
+        """
+        Get the sorted device index of a realtime snapshot
+
+        The index is built once per snapshot and reused until the realtime
+        view is refreshed.
+
+        Args:
+            data: Realtime view data (defaults to the current snapshot)
+
+        Returns:
+            DeviceIndex of the snapshot's devices
+        """
+        if data is None:
+            data = self.get_realtime_data()
+        devices = data.get('devices', [])
+
+        index = self._device_index
+        if index is None or index.devices is not devices:
+            index = self._device_index = DeviceIndex(devices)
+        return index
+
+    def get_device_listing(self, sort: str = 'power', room: Optional[str] = None,
+                           active: Optional[bool] = None, limit: int = 50, offset: int = 0) -> Dict:
+        """
+        Get one page of the tracked devices of the realtime snapshot
+
+        The orderings are built once per snapshot (see services.device_index),
+        so each request only slices its page.
+
+        Args:
+            sort: 'power' (highest first), 'name' or 'room'
+            room: Only devices in this room
+            active: Only active (True) or idle (False) devices
+            limit: Page size
+            offset: Devices to skip
+
+        Returns:
+            Dictionary with the page of devices, counts and the snapshot timestamp
+
+        Raises:
+            ValueError: If a parameter is invalid
+        """
+        data = self.get_realtime_data()
+        listing = self.get_device_index(data).query(sort, room, active, limit, offset)
+        listing.update(timestamp=data.get('timestamp'), stale=data.get('stale', False))
+        return listing
+
+    @timed('aggregate')
+    @serves_stale
     def get_cost_data(self) -> Dict:
         """
         Get cost analysis data
@@ -195,218 +585,368 @@ class DataProcessor:
         if cached:
             return cached
 
-        energy_sensors = self.ha_client.get_energy_sensors()
-        power_sensors = self.ha_client.get_power_sensors()
+        energy_sensors = self.ha_client.get_energy_readings()
+        power_sensors = self.ha_client.get_power_readings()
 
-        # Get electricity rate from config (should be passed in, but using default for now)
-        rate = 0.26  # € per kWh
+        rate = self.electricity_rate
+        try:
+            tariff = Tariff.from_spec(self.tariff_spec, rate)
+        except ValueError as e:
+            logger.warning("Ignoring tariff, using flat rate: %s", e)
+            tariff = Tariff(rate)
 
         # Separate bitshake from tracked devices
         bitshake_power = 0
         tracked_sensors = []
 
         for sensor in power_sensors:
-            entity_id = sensor['entity_id']
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', entity_id)
-
-            if 'bitshake' in entity_id.lower() or 'bitshake' in friendly_name.lower():
-                bitshake_power = self._parse_power(sensor)
+            if self._is_main_meter(sensor):
+                bitshake_power = sensor.power
             else:
                 tracked_sensors.append(sensor)
 
         # Use bitshake for calculations if available, otherwise tracked total
         current_power = bitshake_power if bitshake_power > 0 else self._calculate_total_power(tracked_sensors)
 
-        # Calculate daily cost
-        daily_energy = self._calculate_daily_energy(energy_sensors)
-        daily_cost = daily_energy * rate
-
-        # Calculate current power cost per hour
-        hourly_cost = (current_power / 1000) * rate
+        # Price the main meter's hourly energy for the last 30 days
+        priced = None
+        main_sensor = self._find_main_sensor(power_sensors)
+        if main_sensor:
+            try:
+                priced = self._price_hourly_energy(main_sensor, tariff, days=30)
+            except Exception as e:
+                logger.warning("Hourly tariff pricing unavailable, using flat estimate: %s", e)
 
-        # Project monthly cost
-        monthly_projection = daily_cost * 30
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        dates = [(now - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(29, -1, -1)]
+
+        if priced:
+            by_day = priced['by_day']
+            daily_cost = by_day.get(today, {}).get('cost', 0.0)
+            weekly_cost = sum(by_day.get(date, {}).get('cost', 0.0) for date in dates[-7:])
+            monthly_cost = sum(by_day.get(date, {}).get('cost', 0.0) for date in dates)
+
+            # Project from complete days; fall back to extrapolating today
+            complete_days = [by_day[date]['cost'] for date in dates[:-1] if date in by_day]
+            if complete_days:
+                monthly_projection = sum(complete_days) / len(complete_days) * 30
+            else:
+                hours_today = max(now.hour + now.minute / 60.0, 1.0)
+                monthly_projection = daily_cost / hours_today * 24 * 30
+
+            projection_data = [
+                {'date': date, 'cost': by_day.get(date, {}).get('cost', 0.0)}
+                for date in dates[:-1]
+            ]
+            effective_rate = priced['effective_rate']
+            tariff_breakdown = [
+                {'name': name, 'kwh': totals['kwh'], 'cost': totals['cost']}
+                for name, totals in sorted(priced['by_window'].items(), key=lambda item: -item[1]['cost'])
+            ]
+        else:
+            # Flat estimate from today's energy
+            daily_energy = self._calculate_daily_energy(energy_sensors, power_sensors)
+            daily_cost = daily_energy * rate
+            weekly_cost = daily_cost * 7
+            monthly_cost = daily_cost * 30
+            monthly_projection = daily_cost * 30
+            projection_data = [{'date': date, 'cost': daily_cost} for date in dates[:-1]]
+            effective_rate = rate
+            tariff_breakdown = []
+
+        # Calculate current power cost per hour at the current tariff rate
+        hourly_cost = (current_power / 1000) * tariff.rate_at(now, priced['month_kwh'] if priced else 0.0)[1]
 
         # Calculate cost by device (tracked devices only, not bitshake)
         device_costs = []
         for sensor in tracked_sensors:
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', sensor['entity_id'])
-            entity_id = sensor['entity_id']
-            power = self._parse_power(sensor)
+            power = sensor.power
 
             if power > 0:
-                room = self.ha_client._extract_room(friendly_name, entity_id)
-                device_costs.append({
-                    'name': friendly_name,
-                    'room': room,
-                    'power': power,
-                    'daily_cost': (power / 1000) * 24 * rate,
-                    'monthly_cost': (power / 1000) * 24 * 30 * rate
-                })
+                sensor.room = self.ha_client._extract_room(sensor.name, sensor.entity_id)
+                device_costs.append(DeviceCost(
+                    sensor,
+                    (power / 1000) * 24 * effective_rate,
+                    (power / 1000) * 24 * 30 * effective_rate
+                ))
 
         # Sort by monthly cost
-        device_costs.sort(key=lambda x: x['monthly_cost'], reverse=True)
-
-        # Generate projection data (last 30 days estimate)
-        projection_data = []
-        for i in range(30, 0, -1):
-            date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
-            projection_data.append({
-                'date': date,
-                'cost': daily_cost  # Using average daily cost as estimate
-            })
+        device_costs.sort(key=lambda x: x.monthly_cost, reverse=True)
 
         data = {
             'daily_cost': daily_cost,
-            'weekly_cost': daily_cost * 7,
-            'monthly_cost': daily_cost * 30,
+            'weekly_cost': weekly_cost,
+            'monthly_cost': monthly_cost,
             'hourly_cost': hourly_cost,
             'monthly_projection': monthly_projection,
             'device_costs': device_costs[:10],  # Top 10
             'projection_data': projection_data,
             'rate': rate,
+            'effective_rate': effective_rate,
+            'tariff_breakdown': tariff_breakdown,
             'timestamp': datetime.now().isoformat()
         }
 
         self._set_cache('costs', data)
         return data
 
-    def get_history_data(self, period: str = '24h') -> Dict:
+    @timed('aggregate')
+    @serves_stale
+    def get_history_data(self, period: str = '24h', start: Optional[str] = None,
+                         end: Optional[str] = None) -> Dict:
         """
         Get historical trend data
 
+        The bucket size is picked so the response stays under max_points
+        buckets, and the data comes from the cheapest source that can serve
+        the range (see _history_summaries).
+
         Args:
-            period: Time period ('24h', '7d', '30d')
+            period: Duration ending now ('24h', '7d', '90d', '6h', ...);
+                ignored when start is given
+            start: Range start in ISO format (optional)
+            end: Range end in ISO format (optional, defaults to now)
 
         Returns:
             Dictionary with historical data
+
+        Raises:
+            ValueError: If the period or range is invalid
         """
-        cache_key = f'history_{period}'
+        cache_key, period, range_start, range_end = self._range_view('history', period, start, end)
         cached = self._get_cached(cache_key)
         if cached:
             return cached
 
-        # Parse period
-        hours = self._parse_period(period)
-        start_time = datetime.now() - timedelta(hours=hours)
+        span = range_end - range_start
+        step = self._choose_step(span, self.history_max_points)
+        data = {
+            'history': [],
+            'labels': [],
+            'values': [],
+            'period': period,
+            'start': datetime.fromtimestamp(range_start).isoformat(),
+            'end': datetime.fromtimestamp(range_end).isoformat(),
+            'step': step,
+            'insights': [],
+            'timestamp': datetime.now().isoformat()
+        }
 
-        power_sensors = self.ha_client.get_power_sensors()
+        power_sensors = self.ha_client.get_power_readings()
+        self._observe(power_sensors)
+        data['insights'] = self.insights.insights(time.time())
 
         # Prioritize bitshake sensor for history (whole-house meter)
         if not power_sensors:
-            return {
-                'history': [],
-                'labels': [],
-                'values': [],
-                'period': period,
-                'insights': [],
-                'timestamp': datetime.now().isoformat()
-            }
+            return data
 
         # Find bitshake sensor first, otherwise use first sensor
-        main_sensor = None
-        for sensor in power_sensors:
-            entity_id = sensor['entity_id']
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', entity_id)
-            if 'bitshake' in entity_id.lower() or 'bitshake' in friendly_name.lower():
-                main_sensor = sensor
-                logger.info(f"Using bitshake sensor for history: {entity_id}")
-                break
+        main_sensor = self._find_main_sensor(power_sensors)
+
+        summaries, source = self._history_summaries(main_sensor, range_start, range_end, step)
+        label_format = self._label_format(step, span)
+
+        history = []
+        for slot, summary in summaries:
+            history.append({
+                'timestamp': datetime.fromtimestamp(slot).strftime(label_format),
+                'power': summary['mean'],
+                'min': summary['min'],
+                'max': summary['max'],
+                'p95': summary['p95'],
+                'p99': summary['p99']
+            })
 
-        if not main_sensor:
-            main_sensor = power_sensors[0]
-            logger.info(f"Using first power sensor for history: {main_sensor['entity_id']}")
+        data.update({
+            'history': history,
+            'labels': [h['timestamp'] for h in history],
+            'values': [h['power'] for h in history],
+            'sensor_name': main_sensor.name,
+            'source': source
+        })
+
+        self._set_cache(cache_key, data)
+        return data
+
+    def _history_summaries(self, sensor: SensorReading, start: float, end: float,
+                           step: float) -> Tuple[List[Tuple[float, Dict]], str]:
+        """
+        Summarize a power sensor into regular slots from the cheapest source
+
+        In order of preference: the local hourly rollups when they already
+        cover the range (overlapping queries share them), HA long-term
+        statistics for long ranges, the rollups extended by fetching only the
+        missing history, and finally raw state history for fine resolutions
+        or ranges detached from the rollups.
 
-        history_raw = self.ha_client.get_history(
-            main_sensor['entity_id'],
-            start_time.isoformat()
+        Args:
+            sensor: Power sensor reading
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            step: Slot length in seconds
+
+        Returns:
+            Tuple of (slot-ordered list of (slot start, summary), source name)
+
+        Raises:
+            ValueError: If the range can only be served from raw history and is too long
+        """
+        entity_id = sensor.entity_id
+        scale = sensor.scale
+        origin = self._local_midnight(start)
+
+        def group(ts: float) -> float:
+            return origin + ((ts - origin) // step) * step
+
+        def summarize(sketch: QuantileSketch, mean: Optional[float]) -> Dict:
+            # Sketches count samples; the mean is weighted by time instead
+            summary = sketch.summary()
+            if mean is not None:
+                summary['mean'] = round(mean, 1)
+            return summary
+
+        def from_rollups() -> List[Tuple[float, Dict]]:
+            self.energy_buckets.ensure(entity_id, start, end, scale)
+            means = self.energy_buckets.mean_power(entity_id, start, end, group=group)
+            return [
+                (slot, summarize(sketch, means.get(slot)))
+                for slot, sketch in self.energy_buckets.stats(entity_id, start, end, group=group)
+            ]
+
+        # Hourly rollups can only serve slots made of whole hours
+        whole_hours = step % 3600 == 0
+        coverage = self.energy_buckets.coverage(entity_id)
+        if whole_hours and coverage and coverage[0] <= start + 3600 and start <= coverage[1]:
+            return from_rollups(), 'rollups'
+
+        if self.statistics_min_hours and end - start >= self.statistics_min_hours * 3600:
+            summaries = self._statistics_history(sensor, start, end, group)
+            if summaries is not None:
+                return summaries, 'statistics'
+
+        # Extending the rollups is fine as long as the range stays contiguous
+        # with what they cover (a detached range would replace them)
+        contiguous = coverage is None or (start <= coverage[1] and end >= coverage[0])
+        if whole_hours and contiguous and end - start <= self.energy_buckets.retention_hours * 3600:
+            return from_rollups(), 'rollups'
+
+        if end - start > RAW_HISTORY_MAX_HOURS * 3600:
+            raise ValueError(
+                f"Ranges over {RAW_HISTORY_MAX_HOURS // 24} days need Home Assistant long-term statistics"
+            )
+
+        history = self.ha_client.get_history(
+            entity_id,
+            datetime.fromtimestamp(start).astimezone().isoformat(),
+            datetime.fromtimestamp(end).astimezone().isoformat()
         )
+        samples = parse_samples(history, scale)
+        sketches = slot_sketches(samples, origin, step, start, end)
+        first = group(start)
+        means = resample(samples, first, step, math.ceil((end - first) / step), end)
+        return [(slot, summarize(sketches[slot], means[int((slot - first) // step)]))
+                for slot in sorted(sketches)], 'history'
+
+    @timed('aggregate')
+    @serves_stale
+    def get_breakdown_history(self, period: str = '24h', start: Optional[str] = None,
+                              end: Optional[str] = None) -> Dict:
+        """
+        Get power history per room and per tracked device
 
-        # Process history data - aggregate based on period
-        if period == '24h':
-            # For 24h view, aggregate by hour
-            hourly_data = {}
+        All tracked sensors are fetched together in a batched history
+        request, resampled onto one time grid and summed per room with the
+        same classification as the real-time view. The whole breakdown is
+        cached as one entry.
 
-            for entry in history_raw:
-                try:
-                    timestamp = parser.parse(entry['last_changed'])
-                    power = float(entry['state'])
-
-                    # Group by hour
-                    hour_key = timestamp.strftime('%Y-%m-%d %H:00')
-
-                    if hour_key not in hourly_data:
-                        hourly_data[hour_key] = {
-                            'count': 0,
-                            'total': 0,
-                            'max': 0
-                        }
-
-                    hourly_data[hour_key]['count'] += 1
-                    hourly_data[hour_key]['total'] += power
-                    hourly_data[hour_key]['max'] = max(hourly_data[hour_key]['max'], power)
-
-                except (ValueError, KeyError):
-                    continue
-
-            # Calculate hourly averages
-            history = []
-            for hour_key in sorted(hourly_data.keys()):
-                avg_power = hourly_data[hour_key]['total'] / hourly_data[hour_key]['count']
-                # Format as HH:00 for display
-                display_time = datetime.strptime(hour_key, '%Y-%m-%d %H:00').strftime('%H:%M')
-                history.append({
-                    'timestamp': display_time,
-                    'power': round(avg_power, 1)
-                })
-        else:
-            # For 7d and 30d views, aggregate by day
-            daily_data = {}
+        Args:
+            period: Duration ending now ('24h', '7d', '30d', ...); ignored
+                when start is given
+            start: Range start in ISO format (optional)
+            end: Range end in ISO format (optional, defaults to now)
 
-            for entry in history_raw:
-                try:
-                    timestamp = parser.parse(entry['last_changed'])
-                    power = float(entry['state'])
-
-                    # Group by date only (ignore time)
-                    date_key = timestamp.strftime('%Y-%m-%d')
-
-                    if date_key not in daily_data:
-                        daily_data[date_key] = {
-                            'count': 0,
-                            'total': 0,
-                            'max': 0
-                        }
-
-                    daily_data[date_key]['count'] += 1
-                    daily_data[date_key]['total'] += power
-                    daily_data[date_key]['max'] = max(daily_data[date_key]['max'], power)
-
-                except (ValueError, KeyError):
-                    continue
-
-            # Calculate daily averages
-            history = []
-            for date_key in sorted(daily_data.keys()):
-                avg_power = daily_data[date_key]['total'] / daily_data[date_key]['count']
-                history.append({
-                    'timestamp': date_key,
-                    'power': round(avg_power, 1)
-                })
+        Returns:
+            Dictionary with grid labels and per-room/per-device series
+
+        Raises:
+            ValueError: If the period or range is invalid
+        """
+        cache_key, period, range_start, range_end = self._range_view('breakdown', period, start, end)
+        cached = self._get_cached(cache_key)
+        if cached:
+            return cached
 
+        span = range_end - range_start
+        step = self._choose_step(span, BREAKDOWN_MAX_POINTS)
+
+        # Grid aligned to local midnight so daily slots match calendar days
+        midnight = self._local_midnight(range_start)
+        grid_start = midnight + ((range_start - midnight) // step) * step
+        count = int((range_end - grid_start) // step) + 1
+
+        power_sensors = self.ha_client.get_power_readings()
+        main_meter = next((sensor for sensor in power_sensors if self._is_main_meter(sensor)), None)
+        tracked = [sensor for sensor in power_sensors if sensor is not main_meter]
+
+        histories = self.ha_client.get_history_batch(
+            [sensor.entity_id for sensor in power_sensors],
+            datetime.fromtimestamp(grid_start).astimezone().isoformat(),
+            datetime.fromtimestamp(range_end).astimezone().isoformat()
+        ) if power_sensors else {}
+
+        def series(sensor: SensorReading) -> List[float]:
+            samples = parse_samples(histories.get(sensor.entity_id, []), sensor.scale)
+            return resample(samples, grid_start, step, count, end=range_end)
+
+        devices = []
+        room_series = {}
+        for sensor in tracked:
+            room = self.ha_client._extract_room(sensor.name, sensor.entity_id)
+            values = series(sensor)
+
+            devices.append({
+                'id': sensor.entity_id,
+                'name': sensor.name,
+                'room': room,
+                'values': [round(value, 1) for value in values]
+            })
+            if room in room_series:
+                room_series[room] = [a + b for a, b in zip(room_series[room], values)]
+            else:
+                room_series[room] = values
+
+        tracked_total = [sum(slot) for slot in zip(*room_series.values())] or [0.0] * count
+        if main_meter:
+            total = series(main_meter)
+            untracked = [max(0.0, a - b) for a, b in zip(total, tracked_total)]
+            if any(untracked):
+                room_series['Untracked'] = untracked
+        else:
+            total = tracked_total
+
+        label_format = self._label_format(step, span)
         data = {
-            'history': history,
-            'labels': [h['timestamp'] for h in history],
-            'values': [h['power'] for h in history],
             'period': period,
-            'sensor_name': main_sensor.get('attributes', {}).get('friendly_name', 'Power'),
-            'timestamp': datetime.now().isoformat(),
-            'insights': []
+            'step': step,
+            'labels': [
+                datetime.fromtimestamp(grid_start + i * step).strftime(label_format)
+                for i in range(count)
+            ],
+            'rooms': [
+                {'name': room, 'values': [round(value, 1) for value in values]}
+                for room, values in sorted(room_series.items())
+            ],
+            'devices': devices,
+            'total': [round(value, 1) for value in total],
+            'timestamp': datetime.now().isoformat()
         }
 
         self._set_cache(cache_key, data)
         return data
 
+    @timed('aggregate')
+    @serves_stale
     def get_device_data(self, device_id: str) -> Dict:
         """
         Get detailed data for a specific device
@@ -427,78 +967,185 @@ class DataProcessor:
 
         if not state:
             raise ValueError(f"Device not found: {device_id}")
+        reading = SensorReading.from_state(state)
 
         # Get 24h history
+        now = time.time()
         start_time = datetime.now() - timedelta(hours=24)
         history = self.ha_client.get_history(device_id, start_time.isoformat())
 
         # Process history
-        labels = []
-        values = []
+        series = Series()
+        samples = []
+        scale = reading.scale
 
         for entry in history:
             try:
-                timestamp = parser.parse(entry['last_changed'])
-                power = float(entry['state'])
-                labels.append(timestamp.strftime('%H:%M'))
-                values.append(power)
+                timestamp = parse_datetime(entry['last_changed'])
             except (ValueError, KeyError):
                 continue
+            try:
+                power = float(entry['state'])
+            except (ValueError, TypeError, KeyError):
+                # Unavailable: contributes no energy until the next reading
+                samples.append((timestamp.timestamp(), 0.0))
+                continue
+            series.append(timestamp.timestamp(), power)
+            samples.append((timestamp.timestamp(), power * scale))
+
+        # Time-weighted energy: each reading holds until the next one
+        energy_24h = integrate_kwh(samples, start_time.timestamp(), now)
+        self.energy_buckets.ingest(device_id, samples, start_time.timestamp(), now)
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        daily_energy = self.energy_buckets.total(device_id, midnight, now)
 
         # Calculate statistics
-        current_power = self._parse_power(state)
-        avg_power = sum(values) / len(values) if values else 0
-        max_power = max(values) if values else 0
-        daily_energy = (avg_power / 1000) * 24  # kWh
+        current_power = reading.power
+        # Time-weighted, in the sensor's unit, over the span the history
+        # covers (a sensor added three hours ago has three hours of it)
+        covered = now - max(samples[0][0], start_time.timestamp()) if samples else 0
+        avg_power = energy_24h * 1000 * 3600 / covered / scale if covered > 0 else 0.0
+        max_power = series.max()
 
         data = {
             'device_id': device_id,
-            'name': state.get('attributes', {}).get('friendly_name', device_id),
+            'name': reading.name,
             'current_power': current_power,
             'average_power': avg_power,
             'max_power': max_power,
             'daily_energy': daily_energy,
-            'unit': state.get('attributes', {}).get('unit_of_measurement', 'W'),
-            'state': state['state'],
-            'labels': labels,
-            'values': values,
+            'energy_24h': energy_24h,
+            'unit': reading.unit or 'W',
+            'state': reading.state,
+            'labels': series.labels('%H:%M'),
+            'values': series.values,
             'timestamp': datetime.now().isoformat()
         }
 
         self._set_cache(cache_key, data)
         return data
 
-    def _calculate_total_power(self, sensors: List[Dict]) -> float:
-        """Calculate total power from sensors"""
-        return sum(self._parse_power(sensor) for sensor in sensors)
+    def _is_main_meter(self, sensor: SensorReading) -> bool:
+        """Whether a power sensor is the bitshake whole-house meter"""
+        return 'bitshake' in sensor.entity_id.lower() or 'bitshake' in sensor.name.lower()
 
-    def _parse_power(self, sensor: Dict) -> float:
+    def _find_main_sensor(self, power_sensors: List[SensorReading]) -> Optional[SensorReading]:
         """
-        Parse power value from sensor state
+        Pick the whole-house meter (bitshake), or the first power sensor
 
         Args:
-            sensor: Sensor state dictionary
+            power_sensors: List of power sensors
 
         Returns:
-            Power value in watts
+            Main sensor reading, or None if there are no sensors
+        """
+        for sensor in power_sensors:
+            if self._is_main_meter(sensor):
+                logger.debug("Using bitshake sensor as main meter: %s", sensor.entity_id)
+                return sensor
+
+        if power_sensors:
+            logger.debug("Using first power sensor as main meter: %s", power_sensors[0].entity_id)
+            return power_sensors[0]
+        return None
+
+    def _statistics_history(self, sensor: SensorReading, start: float, end: float,
+                            group: Callable[[float], object]) -> Optional[List[Tuple[object, Dict]]]:
         """
+        Summarize a power sensor from the recorder's long-term statistics
+
+        Spans up to a week use the 5-minute statistics, longer ones the hourly
+        statistics (HA purges 5-minute statistics after about ten days).
+        Min and max are exact; p95/p99 are percentiles of the interval means.
+
+        Args:
+            sensor: Power sensor reading
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            group: Maps an interval start to its bucket key
+
+        Returns:
+            Key-ordered list of (bucket key, statistics summary), or None if
+            statistics are unavailable for the sensor
+        """
+        entity_id = sensor.entity_id
+        interval = '5minute' if end - start <= STATISTICS_SHORT_TERM_HOURS * 3600 else 'hour'
+
         try:
-            state = sensor['state']
-            if state in ['unknown', 'unavailable', 'none', None]:
-                return 0.0
+            rows = self.ha_client.get_statistics(
+                [entity_id],
+                datetime.fromtimestamp(start).astimezone().isoformat(),
+                datetime.fromtimestamp(end).astimezone().isoformat(),
+                period=interval
+            ).get(entity_id)
+        except StatisticsUnavailable as e:
+            logger.debug("Falling back to state history for %s: %s", entity_id, e)
+            return None
+
+        if not rows:
+            logger.debug("No long-term statistics for %s, using state history", entity_id)
+            return None
+
+        scale = sensor.scale
+        buckets = {}
+        for row in rows:
+            if row.get('mean') is None:
+                continue
+            row_start = row.get('start')
+            try:
+                ts = row_start / 1000 if isinstance(row_start, (int, float)) else parse_timestamp(row_start)
+            except (TypeError, ValueError):
+                continue
+
+            mean = row['mean'] * scale
+            sketch, extremes = buckets.setdefault(group(ts), (QuantileSketch(), [mean, mean]))
+            sketch.add(mean)
+            extremes[0] = min(extremes[0], (row['min'] if row.get('min') is not None else row['mean']) * scale)
+            extremes[1] = max(extremes[1], (row['max'] if row.get('max') is not None else row['mean']) * scale)
+
+        summaries = []
+        for key in sorted(buckets):
+            sketch, (low, high) = buckets[key]
+            summary = sketch.summary()
+            summary['min'] = round(low, 1)
+            summary['max'] = round(high, 1)
+            summaries.append((key, summary))
+        return summaries
+
+    def _price_hourly_energy(self, sensor: SensorReading, tariff: Tariff, days: int) -> Dict:
+        """
+        Price a power sensor's hourly energy over the last calendar days
 
-            value = float(state)
-            unit = sensor.get('attributes', {}).get('unit_of_measurement', 'W')
+        Buckets are extended incrementally, so only history since the
+        previous call is fetched from Home Assistant. With tiered rates the
+        buckets reach back to the start of the first month, so consumption
+        earlier in that month counts towards its tiers.
 
-            # Convert to watts
-            if unit in ['kW', 'kilowatt']:
-                value *= 1000
+        Args:
+            sensor: Power sensor reading
+            tariff: Tariff used for pricing
+            days: Number of calendar days including today
 
-            return value
-        except (ValueError, KeyError):
-            return 0.0
+        Returns:
+            Result of Tariff.price()
+        """
+        now = time.time()
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = (midnight - timedelta(days=days - 1)).timestamp()
 
-    def _get_top_consumers(self, sensors: List[Dict], limit: int = 5) -> List[Dict]:
+        fetch_start = start
+        if tariff.tiers:
+            fetch_start = (midnight - timedelta(days=days - 1)).replace(day=1).timestamp()
+
+        entity_id = sensor.entity_id
+        self.energy_buckets.ensure(entity_id, fetch_start, now, sensor.scale)
+        return tariff.price(self.energy_buckets.hourly(entity_id, fetch_start, now), priced_from=start)
+
+    def _calculate_total_power(self, sensors: List[SensorReading]) -> float:
+        """Calculate total power from sensors"""
+        return sum(sensor.power for sensor in sensors)
+
+    def _get_top_consumers(self, sensors: List[SensorReading], limit: int = 5) -> List[SensorReading]:
         """
         Get top power consuming devices
 
@@ -509,25 +1156,18 @@ class DataProcessor:
         Returns:
             List of top consuming devices
         """
-        consumers = [
-            {
-                'name': sensor.get('attributes', {}).get('friendly_name', sensor['entity_id']),
-                'power': self._parse_power(sensor),
-                'entity_id': sensor['entity_id']
-            }
-            for sensor in sensors
-            if self._parse_power(sensor) > 0
-        ]
-
-        consumers.sort(key=lambda x: x['power'], reverse=True)
+        consumers = [sensor for sensor in sensors if sensor.power > 0]
+        consumers.sort(key=lambda sensor: sensor.power, reverse=True)
         return consumers[:limit]
 
-    def _calculate_daily_energy(self, sensors: List[Dict]) -> float:
+    def _calculate_daily_energy(self, sensors: List[SensorReading],
+                                power_sensors: Optional[List[SensorReading]] = None) -> float:
         """
         Calculate total daily energy consumption
 
         Args:
             sensors: List of energy sensors
+            power_sensors: Power sensors already fetched by the caller (avoids a refetch)
 
         Returns:
             Daily energy in kWh
@@ -535,23 +1175,21 @@ class DataProcessor:
         # PRIORITY 1: Look for bitshake daily energy sensors first (whole-house meter)
         for sensor in sensors:
             try:
-                entity_id = sensor.get('entity_id', '').lower()
-                friendly_name = sensor.get('attributes', {}).get('friendly_name', '').lower()
+                entity_id = sensor.entity_id.lower()
+                friendly_name = sensor.name.lower()
 
                 # Check if this is a bitshake daily energy sensor
                 if ('bitshake' in entity_id or 'bitshake' in friendly_name) and \
                    any(keyword in entity_id or keyword in friendly_name for keyword in ['daily', 'today', '_day']):
-                    state = sensor['state']
-                    if state not in ['unknown', 'unavailable', 'none', None]:
-                        value = float(state)
-                        unit = sensor.get('attributes', {}).get('unit_of_measurement', 'kWh')
+                    if sensor.value is not None:
+                        value = sensor.value
 
                         # Convert to kWh
-                        if unit == 'Wh':
+                        if sensor.unit == 'Wh':
                             value /= 1000
 
                         if value > 0 and value < 1000:  # Sanity check (not cumulative)
-                            logger.info(f"Using bitshake daily energy sensor: {sensor.get('entity_id')} = {value} kWh")
+                            logger.debug("Using bitshake daily energy sensor: %s = %s kWh", sensor.entity_id, value)
                             return value
             except (ValueError, KeyError):
                 continue
@@ -559,75 +1197,385 @@ class DataProcessor:
         # PRIORITY 2: Try other daily energy sensors
         for sensor in sensors:
             try:
-                entity_id = sensor.get('entity_id', '').lower()
-                friendly_name = sensor.get('attributes', {}).get('friendly_name', '').lower()
+                entity_id = sensor.entity_id.lower()
+                friendly_name = sensor.name.lower()
 
                 # Check for daily energy sensors (excluding bitshake, already checked above)
                 if ('bitshake' not in entity_id and 'bitshake' not in friendly_name) and \
                    any(keyword in entity_id or keyword in friendly_name for keyword in ['daily', 'today', '_day']):
-                    state = sensor['state']
-                    if state not in ['unknown', 'unavailable', 'none', None]:
-                        value = float(state)
-                        unit = sensor.get('attributes', {}).get('unit_of_measurement', 'kWh')
+                    if sensor.value is not None:
+                        value = sensor.value
 
                         # Convert to kWh
-                        if unit == 'Wh':
+                        if sensor.unit == 'Wh':
                             value /= 1000
 
                         if value > 0 and value < 1000:  # Sanity check (not cumulative)
-                            logger.info(f"Using daily energy sensor: {sensor.get('entity_id')} = {value} kWh")
+                            logger.debug("Using daily energy sensor: %s = %s kWh", sensor.entity_id, value)
                             return value
             except (ValueError, KeyError):
                 continue
 
-        # PRIORITY 3: Fallback - estimate from current power usage (bitshake preferred)
-        power_sensors = self.ha_client.get_power_sensors()
+        # PRIORITY 3: Integrate the main meter's power history since midnight
+        if power_sensors is None:
+            power_sensors = self.ha_client.get_power_readings()
 
-        bitshake_power = 0
-        tracked_power = 0
+        main_sensor = self._find_main_sensor(power_sensors)
+        if not main_sensor:
+            return 0.0
 
-        for sensor in power_sensors:
-            entity_id = sensor['entity_id']
-            friendly_name = sensor.get('attributes', {}).get('friendly_name', entity_id)
+        now = time.time()
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        entity_id = main_sensor.entity_id
+        self.energy_buckets.ensure(entity_id, midnight, now, main_sensor.scale)
+        energy_kwh = self.energy_buckets.total(entity_id, midnight, now)
 
-            if 'bitshake' in entity_id.lower() or 'bitshake' in friendly_name.lower():
-                bitshake_power = self._parse_power(sensor)
-            else:
-                tracked_power += self._parse_power(sensor)
+        logger.debug("Integrated daily energy from %s: %.2f kWh", entity_id, energy_kwh)
+        return energy_kwh
+
+    def _range_view(self, prefix: str, period: str, start: Optional[str],
+                    end: Optional[str]) -> Tuple[str, str, float, float]:
+        """
+        Cache key and time range of a history view
 
-        # Use bitshake if available, otherwise tracked
-        current_power = bitshake_power if bitshake_power > 0 else tracked_power
+        Equal periods share one key ('1d' and '24h'), and a range without an
+        end (or ending in the future) follows now instead of adding a key per
+        second. Views other than the preset periods are counted in the LRU of
+        ad-hoc entries.
 
-        # Estimate today's energy based on time of day and current power
-        now = datetime.now()
-        hours_today = now.hour + now.minute / 60.0
+        Args:
+            prefix: View key prefix ('history', 'breakdown')
+            period: Duration ending now; ignored when start is given
+            start: Range start in ISO format (optional)
+            end: Range end in ISO format (optional, defaults to now)
+
+        Returns:
+            Tuple of (cache key, period label or 'custom', start, end epoch seconds)
 
-        # Estimate: assume current power for all hours so far today
-        estimated_kwh = (current_power / 1000) * hours_today
+        Raises:
+            ValueError: If the period or range is invalid
+        """
+        if start:
+            range_start, range_end = self.resolve_range(period, start, end)
+            closed = end and parse_timestamp(end) <= range_end
+            cache_key = f"{prefix}_range_{int(range_start)}_{int(range_end) if closed else 'now'}"
+            period = 'custom'
+        else:
+            period = self._normalize_period(period)
+            range_start, range_end = self.resolve_range(period)
+            cache_key = f'{prefix}_{period}'
 
-        logger.warning(f"Using estimated daily energy from {'bitshake' if bitshake_power > 0 else 'tracked devices'}: {estimated_kwh:.2f} kWh")
-        return estimated_kwh
+        if self._is_adhoc(cache_key):
+            self._track_adhoc(cache_key)
+        return cache_key, period, range_start, range_end
 
-    def _parse_period(self, period: str) -> int:
+    def _normalize_period(self, period: str) -> str:
         """
-        Parse period string to hours
+        Canonical spelling of a duration, in whole minutes
 
         Args:
-            period: Period string ('24h', '7d', '30d')
+            period: Duration such as '1d', '24h' or '90m'
+
+        Returns:
+            Days above one day when whole ('7d'), else hours ('24h', '6h'),
+            else minutes ('90m')
+
+        Raises:
+            ValueError: If the duration is malformed or not positive
+        """
+        minutes = max(1, round(self._parse_period(period) * 60))
+        if minutes > 1440 and minutes % 1440 == 0:
+            return f'{minutes // 1440}d'
+        if minutes % 60 == 0:
+            return f'{minutes // 60}h'
+        return f'{minutes}m'
+
+    @staticmethod
+    def _is_adhoc(key: str) -> bool:
+        """Whether a cache key is a history view of a custom range or a non-preset period"""
+        for prefix in ('history_', 'breakdown_'):
+            if key.startswith(prefix):
+                return key[len(prefix):] not in PRESET_PERIODS
+        return False
+
+    def _track_adhoc(self, key: str):
+        """
+        Mark an ad-hoc history view as used, dropping the least recently used
+        ones beyond ADHOC_HISTORY_ENTRIES from the cache and the shared store
+
+        Args:
+            key: Cache key
+        """
+        if self.read_only:
+            # The collector owns the published entries
+            return
+        with self._adhoc_lock:
+            self._adhoc[key] = True
+            self._adhoc.move_to_end(key)
+            evicted = []
+            while len(self._adhoc) > ADHOC_HISTORY_ENTRIES:
+                evicted.append(self._adhoc.popitem(last=False)[0])
+
+        for old in evicted:
+            self._drop(old)
+            if self.store is not None:
+                self.store.delete(old)
+            logger.debug("Evicted ad-hoc history view: %s", old)
+
+    def resolve_range(self, period: str = '24h', start: Optional[str] = None,
+                      end: Optional[str] = None) -> Tuple[float, float]:
+        """
+        Resolve a duration or an ISO start/end pair to epoch seconds
+
+        Args:
+            period: Duration ending now ('24h', '7d', '90d', ...); ignored when start is given
+            start: Range start in ISO format (optional)
+            end: Range end in ISO format (optional, defaults to now)
+
+        Returns:
+            Tuple of (start, end) epoch seconds
+
+        Raises:
+            ValueError: If the period or range is invalid
+        """
+        now = time.time()
+        if start:
+            return self._parse_range(start, end, now)
+        return now - self._parse_period(period) * 3600, now
+
+    def _parse_period(self, period: str) -> float:
+        """
+        Parse a duration string to hours
+
+        Args:
+            period: Duration such as '30m', '6h', '7d', '90d' or '2w'
 
         Returns:
             Number of hours
+
+        Raises:
+            ValueError: If the duration is malformed or not positive
+        """
+        match = re.fullmatch(r'(\d+(?:\.\d+)?)([mhdw])', (period or '').strip().lower())
+        if not match or float(match.group(1)) <= 0:
+            raise ValueError(f"Invalid period: {period!r} (expected e.g. '6h', '7d' or '90d')")
+        return float(match.group(1)) * PERIOD_UNITS[match.group(2)]
+
+    def _parse_range(self, start: str, end: Optional[str], now: float) -> Tuple[float, float]:
+        """
+        Parse an ISO start/end pair to epoch seconds
+
+        Times without a UTC offset are local. The end is capped at now.
+
+        Args:
+            start: Range start in ISO format
+            end: Range end in ISO format (optional, defaults to now)
+            now: Current time (epoch seconds)
+
+        Returns:
+            Tuple of (start, end) epoch seconds
+
+        Raises:
+            ValueError: If a time is malformed or the range is empty
+        """
+        try:
+            range_start = parse_timestamp(start)
+            range_end = min(parse_timestamp(end), now) if end else now
+        except (ValueError, OverflowError):
+            raise ValueError(f"Invalid time range: start={start!r}, end={end!r}")
+
+        if range_start >= range_end:
+            raise ValueError("Range start must be before its end (and in the past)")
+        return range_start, range_end
+
+    def _choose_step(self, span: float, max_points: int) -> int:
+        """
+        Smallest standard bucket size keeping a span under max_points buckets
+
+        Args:
+            span: Range length in seconds
+            max_points: Target maximum number of buckets
+
+        Returns:
+            Bucket size in seconds
+        """
+        for step in HISTORY_STEPS:
+            if span / step <= max_points:
+                return step
+        week = HISTORY_STEPS[-1]
+        return math.ceil(span / max_points / week) * week
+
+    def _label_format(self, step: float, span: float) -> str:
+        """strftime format for bucket labels at a resolution"""
+        if step >= 86400:
+            return '%Y-%m-%d'
+        if span <= 86400:
+            return '%H:%M'
+        return '%m-%d %H:%M'
+
+    def _local_midnight(self, ts: float) -> float:
+        """Epoch seconds of local midnight on the day containing ts"""
+        return datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+    def warm_up(self, max_workers: int = 4) -> Dict:
+        """
+        Populate the cache for the common views concurrently
+
+        Args:
+            max_workers: Number of parallel Home Assistant fetches
+
+        Returns:
+            Dictionary mapping view name to 'ok' or an error message
+        """
+        views = {
+            'overview': self.get_overview_data,
+            'realtime': self.get_realtime_data,
+            'costs': self.get_cost_data,
+            'history_24h': lambda: self.get_history_data('24h'),
+        }
+
+        started = time.time()
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warmup') as pool:
+            futures = {name: pool.submit(view) for name, view in views.items()}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                    results[name] = 'ok'
+                except Exception as e:
+                    logger.warning("Warm-up of %s failed: %s", name, e)
+                    results[name] = str(e)
+
+        logger.info("Cache warm-up finished in %.2fs", time.time() - started)
+        return results
+
+    def save_snapshot(self, path: str):
+        """
+        Write the cache and the insights state to a gzip-compressed JSON snapshot
+
+        The file is written to a temporary name and renamed into place, so
+        readers never see a partial snapshot.
+
+        Args:
+            path: Snapshot file path
         """
-        period_map = {
-            '24h': 24,
-            '7d': 168,
-            '30d': 720
+        entries = {
+            key: {'ts': self._cache_timestamps.get(key, 0), 'data': data}
+            for key, data in list(self._cache.items())
+            # Ad-hoc ranges are rarely requested again after a restart
+            if not self._is_adhoc(key)
         }
+        snapshot = {'version': 1, 'saved': time.time(), 'entries': entries,
+                    'insights': self.insights.state()}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'), default=to_json)
+        os.replace(tmp_path, path)
+        logger.debug("Cache snapshot saved: %s entries", len(entries))
+
+    def load_snapshot(self, path: str, max_age: float = 86400) -> int:
+        """
+        Restore cache entries from a snapshot, keeping their original timestamps
+
+        Restored entries that have outlived the TTL are still served, but
+        trigger a background refresh on first access. The insights engine
+        continues from the saved running statistics.
+
+        Args:
+            path: Snapshot file path
+            max_age: Ignore entries older than this many seconds
+
+        Returns:
+            Number of entries restored
+        """
+        if not os.path.exists(path):
+            return 0
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read cache snapshot %s: %s", path, e)
+            return 0
+
+        if snapshot.get('version') != 1:
+            return 0
+
+        if 'insights' in snapshot and not self.insights.devices:
+            try:
+                self.insights.restore(snapshot['insights'])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("Could not restore insights state: %s", e)
+
+        now = time.time()
+        restored = 0
+        for key, entry in snapshot.get('entries', {}).items():
+            if key in self._cache or now - entry['ts'] > max_age or self._is_adhoc(key):
+                continue
+            self._cache[key] = entry['data']
+            self._cache_timestamps[key] = entry['ts']
+            self._restored.add(key)
+            restored += 1
+            # Cache hits are not republished, so restored views go out now
+            if self.store is not None:
+                self.store.put(key, entry['data'], entry['ts'])
+
+        logger.info("Restored %s cache entries from snapshot", restored)
+        return restored
+
+    def apply_settings(self, changed: Dict):
+        """
+        Apply changed runtime settings and drop the cache entries depending on them
+
+        Args:
+            changed: Mapping of setting name to new value
+        """
+        if 'CACHE_TTL' in changed:
+            self.cache_ttl = changed['CACHE_TTL']
+        if 'ELECTRICITY_RATE' in changed:
+            self.electricity_rate = changed['ELECTRICITY_RATE']
+
+        prefixes = tuple(
+            prefix
+            for key in changed
+            for prefix in SETTING_DEPENDENCIES.get(key, ())
+        )
+        if prefixes:
+            self.invalidate(prefixes)
+
+    def invalidate(self, prefixes: tuple) -> int:
+        """
+        Drop cache entries whose key starts with one of the prefixes
+
+        Args:
+            prefixes: Cache key prefixes (e.g. ('costs', 'device_'))
+
+        Returns:
+            Number of entries removed
+        """
+        keys = [key for key in list(self._cache) if key.startswith(prefixes)]
+        for key in keys:
+            self._drop(key)
+
+        logger.info("Invalidated %s cache entries for %s", len(keys), ', '.join(prefixes))
+        return len(keys)
 
-        return period_map.get(period, 24)
+    def _drop(self, key: str):
+        """
+        Remove one cache entry
+
+        Args:
+            key: Cache key
+        """
+        self._cache.pop(key, None)
+        self._cache_timestamps.pop(key, None)
+        self._restored.discard(key)
 
     def clear_cache(self):
         """Clear all cached data"""
         self._cache.clear()
         self._cache_timestamps.clear()
+        self._restored.clear()
         logger.info("Cache cleared")
@@ -0,0 +1,110 @@
+"""
+Device Listing Index
+
+Orderings of the tracked devices of one realtime snapshot, built once when
+the snapshot changes: by power (highest first), by name and by room, each
+for all, active and idle devices, overall and per room. Listing requests
+then only slice the page they need instead of sorting every device.
+"""
+from typing import Dict, List, Optional
+
+# Orderings a listing can be requested in
+SORTS = ('power', 'name', 'room')
+
+# Largest page a listing request may ask for
+MAX_LIMIT = 500
+
+
+def _entry(device) -> tuple:
+    """(power, name, room, device) of a reading or of its JSON form from a snapshot or store"""
+    if isinstance(device, dict):
+        return device.get('power') or 0.0, device.get('name', ''), device.get('room') or 'Unknown', device
+    return device.power, device.name, device.room or 'Unknown', device
+
+
+class _Orderings:
+    """Devices of one scope (all or one room) in every supported order"""
+
+    def __init__(self, entries: List[tuple], by_room: bool = True):
+        by_power = sorted(entries, key=lambda entry: (-entry[0], entry[1].lower()))
+        by_name = sorted(entries, key=lambda entry: entry[1].lower())
+        orders = {'power': by_power, 'name': by_name}
+        if by_room:
+            orders['room'] = sorted(by_power, key=lambda entry: entry[2].lower())
+        else:
+            orders['room'] = by_power
+
+        # Sorting by power puts active devices (power > 0) first
+        self.active_count = sum(1 for entry in entries if entry[0] > 0)
+        self.lists = {}
+        for sort, ordered in orders.items():
+            self.lists[sort, None] = ordered
+            if sort == 'power':
+                self.lists[sort, True] = ordered[:self.active_count]
+                self.lists[sort, False] = ordered[self.active_count:]
+            else:
+                self.lists[sort, True] = [entry for entry in ordered if entry[0] > 0]
+                self.lists[sort, False] = [entry for entry in ordered if entry[0] <= 0]
+
+    @property
+    def count(self) -> int:
+        return len(self.lists['power', None])
+
+
+class DeviceIndex:
+    """Sorted, filterable view of one realtime snapshot's devices"""
+
+    def __init__(self, devices: List):
+        """
+        Build all orderings
+
+        Args:
+            devices: Tracked device readings (SensorReading or their JSON form)
+        """
+        self.devices = devices
+        entries = [_entry(device) for device in devices]
+        self.all = _Orderings(entries)
+
+        rooms = {}
+        for entry in entries:
+            rooms.setdefault(entry[2], []).append(entry)
+        self.rooms = {room: _Orderings(room_entries, by_room=False) for room, room_entries in rooms.items()}
+
+    def query(self, sort: str = 'power', room: Optional[str] = None, active: Optional[bool] = None,
+              limit: int = 50, offset: int = 0) -> Dict:
+        """
+        Get one page of devices
+
+        Args:
+            sort: 'power' (highest first), 'name' or 'room' (then power)
+            room: Only devices in this room
+            active: Only active (True) or idle (False) devices
+            limit: Page size (1 to MAX_LIMIT)
+            offset: Devices to skip
+
+        Returns:
+            Dictionary with the page of 'devices', the number of matching
+            devices ('total'), active/idle counts of the room (or all devices)
+            and the device count of every room
+
+        Raises:
+            ValueError: If a parameter is out of range
+        """
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort '{sort}' (use {', '.join(SORTS)})")
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+
+        scope = self.all if room is None else self.rooms.get(room)
+        matching = scope.lists[sort, active] if scope is not None else []
+        return {
+            'devices': [entry[3] for entry in matching[offset:offset + limit]],
+            'total': len(matching),
+            'offset': offset,
+            'limit': limit,
+            'active_count': scope.active_count if scope is not None else 0,
+            'idle_count': scope.count - scope.active_count if scope is not None else 0,
+            'rooms': {name: orderings.count for name, orderings in sorted(self.rooms.items())}
+        }
@@ -0,0 +1,529 @@
+"""
+Hourly Energy Buckets
+
+Turns a power sensor's state history into kWh per hour. Each reading is held
+until the next one (Home Assistant only records a new state when the value
+changes), and the held power is split across hour boundaries. The buckets are
+kept per entity and extended incrementally: each update only fetches the
+history since the last covered time, so a 30-day query touches O(hours) data
+after the first fetch.
+
+Alongside the energy, every hour keeps a quantile sketch of the power
+readings seen in it. Coarser views (days) merge the hourly sketches instead
+of rescanning raw history.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+from dateutil import parser
+import math
+import threading
+import time
+import logging
+
+from services.sketch import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+
+# States that mean "no reading" rather than zero power
+INVALID_STATES = ('unknown', 'unavailable', 'none', None)
+
+
+def parse_datetime(value: str) -> datetime:
+    """
+    Parse a Home Assistant ISO timestamp
+
+    datetime.fromisoformat handles Home Assistant's format and is much faster
+    than dateutil, which is kept as a fallback for anything unusual.
+
+    Args:
+        value: ISO 8601 timestamp
+
+    Returns:
+        Parsed datetime
+    """
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parser.parse(value)
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Parse a Home Assistant ISO timestamp to epoch seconds
+
+    Args:
+        value: ISO 8601 timestamp
+
+    Returns:
+        Seconds since the epoch
+    """
+    return parse_datetime(value).timestamp()
+
+
+def parse_samples(history: List[Dict], scale: float = 1.0) -> List[Tuple[float, float]]:
+    """
+    Convert raw history entries to (timestamp, watts) pairs
+
+    Unavailable readings become 0 W so that a dropped sensor doesn't keep
+    its last value forever.
+
+    Args:
+        history: State history entries ('state', 'last_changed')
+        scale: Multiplier converting the sensor unit to watts
+
+    Returns:
+        Time-ordered list of (epoch seconds, watts)
+    """
+    samples = []
+    for entry in history:
+        try:
+            ts = parse_timestamp(entry['last_changed'])
+        except (KeyError, ValueError):
+            continue
+
+        state = entry.get('state')
+        if state in INVALID_STATES:
+            watts = 0.0
+        else:
+            try:
+                watts = float(state) * scale
+            except ValueError:
+                watts = 0.0
+        samples.append((ts, watts))
+
+    samples.sort(key=lambda sample: sample[0])
+    return samples
+
+
+def integrate_hourly(samples: List[Tuple[float, float]], start: float, end: float,
+                     buckets: Dict[int, float], initial: Optional[float] = None,
+                     sketches: Optional[Dict[int, QuantileSketch]] = None) -> Optional[float]:
+    """
+    Step-integrate power samples into hourly kWh buckets
+
+    Args:
+        samples: Time-ordered (epoch seconds, watts) pairs
+        start: Integrate from this time (epoch seconds)
+        end: Integrate up to this time (epoch seconds)
+        buckets: Mapping of hour start (epoch seconds) to kWh, updated in place
+        initial: Power held from before the first sample, if known
+        sketches: Mapping of hour start to a power sketch, updated in place.
+            Each sample is added to its hour, and a held reading is added
+            once more at every hour boundary in [start, end) it spans, so
+            quiet hours still report the power they ran at. A sample at
+            `start` repeating the held reading (Home Assistant restates the
+            current state at the start of every history query) is not added
+            again, so extending the buckets in several steps adds the same
+            values as a single pass.
+
+    Returns:
+        Power of the last sample at `end` (to carry into the next update)
+    """
+    current = initial
+    position = start
+    # Whether the reading held from `position` was added as a sample there
+    added = False
+
+    def observe(hour: int, watts: float):
+        sketch = sketches.get(hour)
+        if sketch is None:
+            sketch = sketches[hour] = QuantileSketch()
+        sketch.add(watts)
+
+    def hold(watts: float, t0: float, t1: float, added: bool):
+        while t0 < t1:
+            hour = int(t0 // HOUR) * HOUR
+            if sketches is not None and t0 == hour and not added:
+                observe(hour, watts)
+            segment_end = min(hour + HOUR, t1)
+            buckets[hour] = buckets.get(hour, 0.0) + watts * (segment_end - t0) / HOUR / 1000
+            t0 = segment_end
+            added = False
+
+    for ts, watts in samples:
+        if ts >= end:
+            break
+        if ts > position:
+            if current is not None:
+                hold(current, position, ts, added)
+            position = ts
+            added = False
+        if sketches is not None and ts >= start and not (ts == start and watts == current):
+            observe(int(ts // HOUR) * HOUR, watts)
+            added = True
+        current = watts
+
+    if current is not None and end > position:
+        hold(current, position, end, added)
+    return current
+
+
+def integrate_kwh(samples: List[Tuple[float, float]], start: float, end: float,
+                  initial: Optional[float] = None) -> float:
+    """
+    Step-integrate power samples into total energy
+
+    Args:
+        samples: Time-ordered (epoch seconds, watts) pairs
+        start: Integrate from this time (epoch seconds)
+        end: Integrate up to this time (epoch seconds)
+        initial: Power held from before the first sample, if known
+
+    Returns:
+        Energy in kWh
+    """
+    buckets = {}
+    integrate_hourly(samples, start, end, buckets, initial)
+    return sum(buckets.values())
+
+
+def resample(samples: List[Tuple[float, float]], start: float, step: float, count: int,
+             end: Optional[float] = None) -> List[float]:
+    """
+    Resample power samples onto a regular time grid
+
+    Each slot gets the time-weighted mean of the held power over the part of
+    the slot that is covered (a slot cut off by `end` is averaged over the
+    covered time only). Slots before the first sample are 0.
+
+    Args:
+        samples: Time-ordered (epoch seconds, watts) pairs
+        start: Start of the first slot (epoch seconds)
+        step: Slot length in seconds
+        count: Number of slots
+        end: Stop holding the last sample here (defaults to the grid end)
+
+    Returns:
+        Mean watts per slot
+    """
+    grid_end = start + step * count
+    end = min(end or grid_end, grid_end)
+    watt_seconds = [0.0] * count
+    covered = [0.0] * count
+
+    def hold(watts: float, t0: float, t1: float):
+        while t0 < t1:
+            slot = int((t0 - start) // step)
+            segment_end = min(start + (slot + 1) * step, t1)
+            watt_seconds[slot] += watts * (segment_end - t0)
+            covered[slot] += segment_end - t0
+            t0 = segment_end
+
+    current = None
+    position = start
+    for ts, watts in samples:
+        if ts >= end:
+            break
+        if ts > position:
+            if current is not None:
+                hold(current, position, ts)
+            position = ts
+        current = watts
+
+    if current is not None and end > position:
+        hold(current, position, end)
+
+    return [ws / seconds if seconds else 0.0 for ws, seconds in zip(watt_seconds, covered)]
+
+
+def slot_sketches(samples: List[Tuple[float, float]], origin: float, step: float,
+                  start: float, end: float) -> Dict[float, QuantileSketch]:
+    """
+    Build power sketches for regular time slots directly from samples
+
+    Used for resolutions finer than the hourly rollups. Follows the same
+    convention as integrate_hourly(): every sample is added to its slot and
+    the held reading is added again at each slot boundary it spans.
+
+    Args:
+        samples: Time-ordered (epoch seconds, watts) pairs
+        origin: Any slot boundary (epoch seconds)
+        step: Slot length in seconds
+        start: Range start (epoch seconds)
+        end: Range end (epoch seconds)
+
+    Returns:
+        Mapping of slot start (epoch seconds) to sketch
+    """
+    sketches = {}
+
+    def observe(slot: float, watts: float):
+        sketch = sketches.get(slot)
+        if sketch is None:
+            sketch = sketches[slot] = QuantileSketch()
+        sketch.add(watts)
+
+    boundary = origin + math.ceil((start - origin) / step) * step
+    current = None
+    for ts, watts in samples:
+        if ts >= end:
+            break
+        while boundary <= ts and boundary < end:
+            if current is not None and boundary < ts:
+                observe(boundary, current)
+            boundary += step
+        if ts >= start:
+            observe(origin + ((ts - origin) // step) * step, watts)
+        current = watts
+
+    while current is not None and boundary < end:
+        observe(boundary, current)
+        boundary += step
+    return sketches
+
+
+class _EntityBuckets:
+    """Hourly kWh buckets and power sketches covering one contiguous time range"""
+
+    __slots__ = ('hours', 'sketches', 'start', 'end', 'last_power', 'lock')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hours = {}
+        self.sketches = {}
+        self.start = None
+        self.end = None
+        self.last_power = None
+
+
+class HourlyEnergyBuckets:
+    """Incrementally maintained kWh-per-hour buckets for power sensors"""
+
+    def __init__(self, ha_client, retention_hours: int = 24 * 62):
+        """
+        Initialize bucket store
+
+        Args:
+            ha_client: HomeAssistantClient instance
+            retention_hours: Buckets older than this are dropped
+        """
+        self.ha_client = ha_client
+        self.retention_hours = retention_hours
+        self._entities = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, entity_id: str, start: float, end: float, scale: float) -> List[Tuple[float, float]]:
+        history = self.ha_client.get_history(
+            entity_id,
+            datetime.fromtimestamp(start).astimezone().isoformat(),
+            datetime.fromtimestamp(end).astimezone().isoformat()
+        )
+        return parse_samples(history, scale)
+
+    def ensure(self, entity_id: str, start: float, end: Optional[float] = None, scale: float = 1.0):
+        """
+        Make sure buckets cover [start, end), fetching only the missing parts
+
+        Args:
+            entity_id: Power sensor entity ID
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds, defaults to now)
+            scale: Multiplier converting the sensor unit to watts
+        """
+        end = end or time.time()
+        entry = self._entry(entity_id)
+
+        with entry.lock:
+            if entry.start is None or start > entry.end:
+                self._ingest(entry, self._fetch(entity_id, start, end, scale), start, end)
+            else:
+                if start < entry.start:
+                    self._ingest(entry, self._fetch(entity_id, start, entry.start, scale), start, entry.start)
+                if end > entry.end:
+                    self._ingest(entry, self._fetch(entity_id, entry.end, end, scale), entry.end, end)
+            self._expire(entry, end)
+
+    def ingest(self, entity_id: str, samples: List[Tuple[float, float]], start: float, end: float):
+        """
+        Add samples that were fetched elsewhere (e.g. for a device page)
+
+        Only the part of [start, end) not already covered is integrated.
+
+        Args:
+            entity_id: Power sensor entity ID
+            samples: Time-ordered (epoch seconds, watts) pairs covering [start, end)
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+        """
+        entry = self._entry(entity_id)
+        with entry.lock:
+            self._ingest(entry, samples, start, end)
+            self._expire(entry, end)
+
+    def coverage(self, entity_id: str) -> Optional[Tuple[float, float]]:
+        """
+        Time range currently covered for an entity
+
+        Args:
+            entity_id: Power sensor entity ID
+
+        Returns:
+            Tuple of (start, end) epoch seconds, or None if nothing is covered
+        """
+        entry = self._entities.get(entity_id)
+        if entry is None or entry.start is None:
+            return None
+        return entry.start, entry.end
+
+    def _entry(self, entity_id: str) -> '_EntityBuckets':
+        with self._lock:
+            return self._entities.setdefault(entity_id, _EntityBuckets())
+
+    def _ingest(self, entry: '_EntityBuckets', samples: List[Tuple[float, float]], start: float, end: float):
+        """Integrate samples into the entry's uncovered part of [start, end)"""
+        if entry.start is None or start > entry.end or end < entry.start:
+            # Disjoint from what we have: start a new contiguous range
+            entry.hours.clear()
+            entry.sketches.clear()
+            entry.last_power = integrate_hourly(samples, start, end, entry.hours,
+                                                sketches=entry.sketches)
+            entry.start, entry.end = start, end
+            return
+
+        # Extend backwards: the older slice is integrated up to the
+        # existing coverage, where the known samples take over
+        if start < entry.start:
+            integrate_hourly(samples, start, entry.start, entry.hours, sketches=entry.sketches)
+            entry.start = start
+
+        # Extend forwards; samples before the covered end only update the held power
+        if end > entry.end:
+            entry.last_power = integrate_hourly(samples, entry.end, end, entry.hours,
+                                                initial=entry.last_power,
+                                                sketches=entry.sketches)
+            entry.end = end
+
+    def _expire(self, entry: _EntityBuckets, now: float):
+        cutoff = now - self.retention_hours * HOUR
+        if entry.start is not None and entry.start < cutoff:
+            cutoff_hour = int(cutoff // HOUR) * HOUR
+            for hour in [h for h in entry.hours if h < cutoff_hour]:
+                del entry.hours[hour]
+            for hour in [h for h in entry.sketches if h < cutoff_hour]:
+                del entry.sketches[hour]
+            entry.start = cutoff_hour
+
+    def total(self, entity_id: str, start: float, end: float) -> float:
+        """
+        Energy in kWh over the hours overlapping [start, end)
+
+        Args:
+            entity_id: Power sensor entity ID
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+
+        Returns:
+            Energy in kWh
+        """
+        return sum(kwh for _, kwh in self.hourly(entity_id, start, end))
+
+    def daily(self, entity_id: str, start: float, end: float) -> Dict[str, float]:
+        """
+        Energy in kWh per local calendar day
+
+        Args:
+            entity_id: Power sensor entity ID
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+
+        Returns:
+            Dictionary mapping 'YYYY-MM-DD' to kWh
+        """
+        days = {}
+        for hour, kwh in self.hourly(entity_id, start, end):
+            day = datetime.fromtimestamp(hour).strftime('%Y-%m-%d')
+            days[day] = days.get(day, 0.0) + kwh
+        return days
+
+    def hourly(self, entity_id: str, start: float, end: float) -> List[Tuple[int, float]]:
+        """
+        Hourly kWh for a time range
+
+        Args:
+            entity_id: Power sensor entity ID
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+
+        Returns:
+            Time-ordered list of (hour start epoch seconds, kWh)
+        """
+        first_hour = int(start // HOUR) * HOUR
+        entry = self._entities.get(entity_id)
+        if entry is None:
+            return []
+        with entry.lock:
+            return sorted(
+                (hour, kwh) for hour, kwh in entry.hours.items()
+                if first_hour <= hour < end
+            )
+
+    def mean_power(self, entity_id: str, start: float, end: float,
+                   group: Optional[Callable[[int], object]] = None) -> Dict[object, float]:
+        """
+        Time-weighted mean power per hour, optionally per coarser group
+
+        Derived from the integrated energy over the covered part of each
+        hour, so it does not depend on how often the sensor reported or how
+        often the buckets were extended (the sketches count samples).
+
+        Args:
+            entity_id: Power sensor entity ID
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            group: Maps an hour start to its group key, as for stats()
+
+        Returns:
+            Dictionary mapping group key to watts
+        """
+        first_hour = int(start // HOUR) * HOUR
+        entry = self._entities.get(entity_id)
+        if entry is None:
+            return {}
+
+        group = group or (lambda hour: hour)
+        energy = {}
+        seconds = {}
+        with entry.lock:
+            for hour, kwh in entry.hours.items():
+                if not first_hour <= hour < end:
+                    continue
+                covered = min(hour + HOUR, entry.end) - max(hour, entry.start)
+                if covered > 0:
+                    key = group(hour)
+                    energy[key] = energy.get(key, 0.0) + kwh
+                    seconds[key] = seconds.get(key, 0.0) + covered
+        return {key: energy[key] * 1000 * HOUR / seconds[key] for key in energy}
+
+    def stats(self, entity_id: str, start: float, end: float,
+              group: Optional[Callable[[int], object]] = None) -> List[Tuple[object, QuantileSketch]]:
+        """
+        Power sketches per hour, optionally merged into coarser groups
+
+        Args:
+            entity_id: Power sensor entity ID
+            start: Range start (epoch seconds)
+            end: Range end (epoch seconds)
+            group: Maps an hour start to its group key (e.g. the local date);
+                defaults to one group per hour
+
+        Returns:
+            Key-ordered list of (group key, merged sketch). The sketches are
+            copies and safe to use without locking.
+        """
+        first_hour = int(start // HOUR) * HOUR
+        entry = self._entities.get(entity_id)
+        if entry is None:
+            return []
+
+        group = group or (lambda hour: hour)
+        merged = {}
+        with entry.lock:
+            for hour, sketch in entry.sketches.items():
+                if first_hour <= hour < end:
+                    key = group(hour)
+                    if key not in merged:
+                        merged[key] = QuantileSketch(sketch.relative_accuracy, sketch.max_bins)
+                    merged[key].merge(sketch)
+        return sorted(merged.items(), key=lambda item: item[0])
@@ -0,0 +1,267 @@
+"""
+Streaming History Export
+
+Exports raw state history for any number of entities as CSV, NDJSON,
+Parquet or Arrow. The time range is fetched from Home Assistant in slices and
+every stage is a generator, so memory stays bounded by one slice no matter
+how long the range is.
+
+Parquet and Arrow output need pyarrow, which is optional.
+"""
+from typing import Dict, Iterable, Iterator, List
+from datetime import datetime, timedelta, timezone
+import csv
+import heapq
+import io
+import json
+import logging
+
+from services.energy import INVALID_STATES, parse_datetime, parse_timestamp
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Parquet/Arrow export is optional
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('entity_id', 'timestamp', 'state', 'value')
+
+# Export formats: (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrow'),
+}
+
+
+class ExportError(Exception):
+    """Raised when an export cannot be produced"""
+
+
+def _row(entity_id: str, entry: Dict) -> Dict:
+    state = entry.get('state')
+    try:
+        value = None if state in INVALID_STATES else float(state)
+    except ValueError:
+        value = None
+    return {
+        'entity_id': entity_id,
+        'timestamp': entry['last_changed'],
+        'state': state,
+        'value': value
+    }
+
+
+def iter_history(ha_client, entity_ids: List[str], start: float, end: float,
+                 slice_hours: float = 6) -> Iterator[Dict]:
+    """
+    Yield state changes for several entities, fetching the range in slices
+
+    Each slice is one batched history request. Home Assistant repeats every
+    entity's current state at the start of a slice; those repeats are dropped
+    so the output contains each change once.
+
+    Args:
+        ha_client: HomeAssistantClient instance
+        entity_ids: Entity IDs to export
+        start: Range start (epoch seconds)
+        end: Range end (epoch seconds)
+        slice_hours: Length of each fetched slice
+
+    Yields:
+        Rows with entity_id, timestamp (ISO), state and value (float or None),
+        in time order
+    """
+    step = timedelta(hours=slice_hours)
+    slice_start = datetime.fromtimestamp(start, timezone.utc)
+    range_end = datetime.fromtimestamp(end, timezone.utc)
+    last_state = {}
+
+    while slice_start < range_end:
+        slice_end = min(slice_start + step, range_end)
+        logger.debug("Exporting %d entities from %s to %s", len(entity_ids), slice_start, slice_end)
+        histories = ha_client.get_history_batch(entity_ids, slice_start.isoformat(), slice_end.isoformat())
+        boundary = slice_start.timestamp()
+
+        def entity_rows(entity_id: str, history: List[Dict]) -> Iterator[tuple]:
+            for entry in history:
+                try:
+                    ts = parse_timestamp(entry['last_changed'])
+                except (KeyError, ValueError):
+                    continue
+                if ts < boundary or ts >= slice_end.timestamp():
+                    continue
+                if ts == boundary and last_state.get(entity_id) == entry.get('state'):
+                    continue
+                yield ts, entity_id, entry
+
+        for _, entity_id, entry in heapq.merge(
+            *(entity_rows(entity_id, history) for entity_id, history in histories.items()),
+            key=lambda item: item[0]
+        ):
+            last_state[entity_id] = entry.get('state')
+            yield _row(entity_id, entry)
+
+        slice_start = slice_end
+
+
+def _batched(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def csv_stream(rows: Iterable[Dict], batch_size: int = 1000) -> Iterator[str]:
+    """
+    Encode rows as CSV chunks
+
+    Args:
+        rows: Export rows
+        batch_size: Rows per yielded chunk
+
+    Yields:
+        CSV text, starting with the header line
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+
+    for batch in _batched(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (row['entity_id'], row['timestamp'], row['state'], '' if row['value'] is None else row['value'])
+            for row in batch
+        )
+        yield buffer.getvalue()
+
+
+def ndjson_stream(rows: Iterable[Dict], batch_size: int = 1000) -> Iterator[str]:
+    """
+    Encode rows as newline-delimited JSON chunks
+
+    Args:
+        rows: Export rows
+        batch_size: Rows per yielded chunk
+
+    Yields:
+        NDJSON text, one object per line
+    """
+    for batch in _batched(rows, batch_size):
+        yield ''.join(json.dumps(row) + '\n' for row in batch)
+
+
+class _ChunkSink:
+    """Write-only file object collecting bytes until they are drained"""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def arrow_stream(rows: Iterable[Dict], file_format: str = 'parquet',
+                 batch_size: int = 10000) -> Iterator[bytes]:
+    """
+    Encode rows as Parquet (one row group per batch) or an Arrow IPC stream
+
+    Args:
+        rows: Export rows
+        file_format: 'parquet' or 'arrow'
+        batch_size: Rows per row group / record batch
+
+    Yields:
+        Encoded bytes as each batch is written
+
+    Raises:
+        ExportError: If pyarrow is not installed
+    """
+    if pyarrow is None:
+        raise ExportError("Parquet and Arrow export require pyarrow")
+
+    schema = pyarrow.schema([
+        ('entity_id', pyarrow.string()),
+        ('timestamp', pyarrow.timestamp('us', tz='UTC')),
+        ('state', pyarrow.string()),
+        ('value', pyarrow.float64()),
+    ])
+    sink = _ChunkSink()
+    if file_format == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+
+    for batch in _batched(rows, batch_size):
+        writer.write_table(pyarrow.Table.from_pydict({
+            'entity_id': [row['entity_id'] for row in batch],
+            'timestamp': [parse_datetime(row['timestamp']) for row in batch],
+            'state': [row['state'] for row in batch],
+            'value': [row['value'] for row in batch],
+        }, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(ha_client, entity_ids: List[str], start: float, end: float,
+                  file_format: str = 'csv', slice_hours: float = 6) -> Iterator:
+    """
+    Stream an export of raw state history
+
+    Args:
+        ha_client: HomeAssistantClient instance
+        entity_ids: Entity IDs to export
+        start: Range start (epoch seconds)
+        end: Range end (epoch seconds)
+        file_format: One of FORMATS
+        slice_hours: Length of each history slice fetched from Home Assistant
+
+    Returns:
+        Generator of str (CSV/NDJSON) or bytes (Parquet/Arrow) chunks
+
+    Raises:
+        ExportError: If the format is unknown or unavailable
+    """
+    if file_format not in FORMATS:
+        raise ExportError(f"Unknown export format: {file_format} (expected one of {', '.join(FORMATS)})")
+    if file_format in ('parquet', 'arrow') and pyarrow is None:
+        raise ExportError("Parquet and Arrow export require pyarrow")
+
+    rows = iter_history(ha_client, entity_ids, start, end, slice_hours)
+    if file_format == 'csv':
+        return csv_stream(rows)
+    if file_format == 'ndjson':
+        return ndjson_stream(rows)
+    return arrow_stream(rows, file_format)
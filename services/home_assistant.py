@@ -2,56 +2,191 @@
 Home Assistant REST API Client
 """
 import requests
+from datetime import datetime
 from typing import Dict, List, Optional
+import json
+import random
+import time
 import logging
 
+from services.circuit_breaker import AdaptiveTimeout, CircuitBreaker
+from services.models import SensorReading
+from utils.timing import stage
+
+try:
+    import websocket
+except ImportError:  # websocket-client is optional; statistics queries need it
+    websocket = None
+
 logger = logging.getLogger(__name__)
 
+# Lower bound of the adaptive request timeout (seconds)
+MIN_TIMEOUT = 1.0
+
+# History spans (hours) timed by separate latency estimators, so a 30 day
+# backfill does not inherit the timeout learnt from short incremental fetches
+HISTORY_SPAN_CLASSES = (1, 6, 24, 24 * 7)
+
+
+def _latency_class(endpoint: str, params: Optional[Dict]) -> str:
+    """
+    Name of the latency estimator timing a request
+
+    Args:
+        endpoint: API endpoint path
+        params: Query parameters
+
+    Returns:
+        Endpoint kind ('states', 'services', ...); history requests are also
+        classed by the span they query ('history<=24h', 'history>168h')
+    """
+    parts = endpoint.lstrip('/').split('/')
+    if parts[0] != 'history' or len(parts) < 3:
+        return parts[0]
+    try:
+        start = datetime.fromisoformat(parts[2].replace('Z', '+00:00'))
+        end_time = (params or {}).get('end_time')
+        end = datetime.fromisoformat(end_time.replace('Z', '+00:00')) if end_time else datetime.now(start.tzinfo)
+        hours = (end - start).total_seconds() / 3600
+    except (TypeError, ValueError):
+        return 'history'
+    for limit in HISTORY_SPAN_CLASSES:
+        if hours <= limit:
+            return f'history<={limit}h'
+    return f'history>{HISTORY_SPAN_CLASSES[-1]}h'
+
+
+class StatisticsUnavailable(Exception):
+    """Raised when long-term statistics cannot be queried"""
+
 
 class HomeAssistantClient:
     """Client for interacting with Home Assistant REST API"""
 
-    def __init__(self, base_url: str, token: str):
+    def __init__(self, base_url: str, token: str, timeout: float = 10, retries: int = 2,
+                 failure_threshold: int = 5, reset_timeout: float = 30, retry_backoff: float = 0.25,
+                 transport=None):
         """
         Initialize Home Assistant client
 
         Args:
             base_url: Base URL of Home Assistant instance
             token: Long-lived access token
+            timeout: Longest request timeout in seconds; the effective timeout
+                adapts to the observed latency below it
+            retries: Extra attempts for failed GET requests
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds calls are refused once the circuit is open
+            retry_backoff: Base delay before a retry, doubled per attempt and jittered
+            transport: Function sending requests in place of requests.request,
+                e.g. a RecordingTransport or ReplayTransport (services.recording)
         """
         self.base_url = base_url.rstrip('/')
+        self.token = token
         self.headers = {
             'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
         }
-        self.timeout = 10
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.transport = transport
+        # Latency estimators per endpoint kind and history span (see _latency_class)
+        self._timeouts = {}
 
     def _request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
         """
         Make HTTP request to Home Assistant API
 
+        Calls go through the circuit breaker. Connection errors, timeouts and
+        5xx responses count as failures; idempotent GETs are retried with
+        jittered exponential backoff while the circuit stays closed. A timeout
+        shorter than the configured one is the client's own guess, so it only
+        counts as a failure on the last attempt.
+
         Args:
             method: HTTP method (GET, POST, etc.)
             endpoint: API endpoint path
-            **kwargs: Additional request parameters
+            **kwargs: Additional request parameters (an explicit timeout
+                overrides the adaptive one)
 
         Returns:
             Response object
 
         Raises:
+            CircuitOpenError: If the circuit is open
             requests.RequestException: If request fails
         """
         url = f"{self.base_url}/api/{endpoint.lstrip('/')}"
         kwargs.setdefault('headers', self.headers)
-        kwargs.setdefault('timeout', self.timeout)
+        fixed_timeout = kwargs.pop('timeout', None)
+        kind = _latency_class(endpoint, kwargs.get('params'))
+        estimator = self._timeouts.setdefault(kind, AdaptiveTimeout(MIN_TIMEOUT, self.timeout))
+        attempts = 1 + (self.retries if method == 'GET' else 0)
+
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            timeout = fixed_timeout or min(self.timeout, estimator.timeout * 2 ** attempt)
+            last_attempt = attempt + 1 == attempts
+            started = time.monotonic()
+            # Outcome for the breaker; anything escaping below counts as a
+            # failure, so a half-open probe is never left in flight
+            outcome = 'failure'
+            try:
+                with stage('ha'):
+                    response = (self.transport or requests.request)(method, url, timeout=timeout, **kwargs)
+                estimator.observe(time.monotonic() - started)
+                response.raise_for_status()
+                outcome = 'success'
+                return response
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    # Home Assistant answered; the request itself was wrong
+                    outcome = 'success'
+                    logger.error("Home Assistant API request failed: %s", e)
+                    raise
+                error = e
+            except requests.Timeout as e:
+                estimator.observe(timeout)
+                if timeout < self.timeout and not last_attempt:
+                    outcome = 'released'
+                error = e
+            except requests.ConnectionError as e:
+                error = e
+            except requests.RequestException as e:
+                logger.error("Home Assistant API request failed: %s", e)
+                raise
+            finally:
+                if outcome == 'success':
+                    self.breaker.record_success()
+                elif outcome == 'released':
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+
+            if last_attempt or self.breaker.is_open:
+                break
+            delay = self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning("Home Assistant request failed (%s); retrying in %.2fs", error, delay)
+            time.sleep(delay)
+
+        logger.error("Home Assistant API request failed: %s", error)
+        raise error
+
+    @staticmethod
+    def _json(response: requests.Response):
+        """
+        Decode a JSON response body
 
-        try:
-            response = requests.request(method, url, **kwargs)
-            response.raise_for_status()
-            return response
-        except requests.RequestException as e:
-            logger.error(f"Home Assistant API request failed: {e}")
-            raise
+        Args:
+            response: Response object
+
+        Returns:
+            Decoded JSON data
+        """
+        with stage('json'):
+            return response.json()
 
     def get_states(self) -> List[Dict]:
         """
@@ -61,7 +196,7 @@ class HomeAssistantClient:
             List of entity state dictionaries
         """
         response = self._request('GET', 'states')
-        return response.json()
+        return self._json(response)
 
     def get_state(self, entity_id: str) -> Optional[Dict]:
         """
@@ -75,10 +210,10 @@ class HomeAssistantClient:
         """
         try:
             response = self._request('GET', f'states/{entity_id}')
-            return response.json()
+            return self._json(response)
         except requests.HTTPError as e:
             if e.response.status_code == 404:
-                logger.warning(f"Entity not found: {entity_id}")
+                logger.warning("Entity not found: %s", entity_id)
                 return None
             raise
 
@@ -101,11 +236,121 @@ class HomeAssistantClient:
             params['end_time'] = end_time
 
         response = self._request('GET', endpoint, params=params)
-        data = response.json()
+        data = self._json(response)
 
         # History API returns list of lists, one per entity
         return data[0] if data else []
 
+    def get_history_batch(self, entity_ids: List[str], start_time: str, end_time: Optional[str] = None,
+                          chunk_size: int = 50) -> Dict[str, List[Dict]]:
+        """
+        Get historical data for several entities in as few requests as possible
+
+        Entities are requested together through a comma-separated filter,
+        with attributes and repeated entity IDs stripped from the response.
+
+        Args:
+            entity_ids: Entity IDs
+            start_time: Start time in ISO format
+            end_time: End time in ISO format (optional, defaults to now)
+            chunk_size: Maximum entities per request (keeps the URL short)
+
+        Returns:
+            Dictionary mapping entity ID to its state history ('state',
+            'last_changed'); entities without history are missing
+        """
+        endpoint = f'history/period/{start_time}'
+        histories = {}
+
+        for i in range(0, len(entity_ids), chunk_size):
+            params = {
+                'filter_entity_id': ','.join(entity_ids[i:i + chunk_size]),
+                'minimal_response': '',
+                'no_attributes': ''
+            }
+            if end_time:
+                params['end_time'] = end_time
+
+            response = self._request('GET', endpoint, params=params)
+            # One list per entity; with minimal_response only the first
+            # entry of each list carries the entity ID
+            for entity_history in self._json(response) or []:
+                if entity_history and 'entity_id' in entity_history[0]:
+                    histories[entity_history[0]['entity_id']] = entity_history
+
+        return histories
+
+    def get_statistics(self, statistic_ids: List[str], start_time: str, end_time: Optional[str] = None,
+                       period: str = 'hour', types: tuple = ('mean', 'min', 'max')) -> Dict[str, List[Dict]]:
+        """
+        Get pre-aggregated long-term statistics from the recorder
+
+        Home Assistant only exposes statistics over its WebSocket API, so this
+        opens a short-lived connection for the query.
+
+        Args:
+            statistic_ids: Entity IDs to query
+            start_time: Start time in ISO format
+            end_time: End time in ISO format (optional, defaults to now)
+            period: Aggregation period ('5minute', 'hour', 'day', 'week', 'month')
+            types: Statistic types to return
+
+        Returns:
+            Dictionary mapping entity ID to rows with 'start' (epoch
+            milliseconds or ISO string, depending on the HA version) and the
+            requested types. Entities without statistics are missing.
+
+        Raises:
+            StatisticsUnavailable: If websocket-client is not installed or the query fails
+        """
+        if websocket is None:
+            raise StatisticsUnavailable("websocket-client is not installed")
+        if not getattr(self.transport, 'supports_statistics', True):
+            raise StatisticsUnavailable("statistics are not recorded or replayed")
+        if self.breaker.is_open:
+            raise StatisticsUnavailable("Home Assistant unavailable (circuit open)")
+
+        url = self.base_url.replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+        query = {
+            'id': 1,
+            'type': 'recorder/statistics_during_period',
+            'start_time': start_time,
+            'statistic_ids': list(statistic_ids),
+            'period': period,
+            'types': list(types)
+        }
+        if end_time:
+            query['end_time'] = end_time
+
+        try:
+            with stage('ha'):
+                ws = websocket.create_connection(f"{url}/api/websocket", timeout=self.timeout)
+                try:
+                    ws.recv()  # auth_required
+                    ws.send(json.dumps({'type': 'auth', 'access_token': self.token}))
+                    auth = json.loads(ws.recv())
+                    if auth.get('type') != 'auth_ok':
+                        raise StatisticsUnavailable(f"WebSocket authentication failed: {auth.get('message')}")
+
+                    ws.send(json.dumps(query))
+                    while True:
+                        message = ws.recv()
+                        with stage('json'):
+                            reply = json.loads(message)
+                        if reply.get('id') == 1 and reply.get('type') == 'result':
+                            break
+                finally:
+                    ws.close()
+        except StatisticsUnavailable:
+            raise
+        except (websocket.WebSocketException, OSError, ValueError) as e:
+            logger.warning("Statistics query failed: %s", e)
+            raise StatisticsUnavailable(str(e))
+
+        if not reply.get('success'):
+            raise StatisticsUnavailable(reply.get('error', {}).get('message', 'statistics query failed'))
+        return reply.get('result') or {}
+
     def get_power_sensors(self) -> List[Dict]:
         """
         Get all power monitoring sensors
@@ -142,6 +387,24 @@ class HomeAssistantClient:
 
         return energy_sensors
 
+    def get_power_readings(self) -> List[SensorReading]:
+        """
+        Get all power monitoring sensors as compact readings
+
+        Returns:
+            List of SensorReading objects
+        """
+        return [SensorReading.from_state(state) for state in self.get_power_sensors()]
+
+    def get_energy_readings(self) -> List[SensorReading]:
+        """
+        Get all energy monitoring sensors as compact readings
+
+        Returns:
+            List of SensorReading objects
+        """
+        return [SensorReading.from_state(state) for state in self.get_energy_sensors()]
+
     def get_devices_by_room(self) -> Dict[str, List[Dict]]:
         """
         Organize power sensors by room/area
@@ -247,7 +510,7 @@ class HomeAssistantClient:
         }
 
         response = self._request('POST', f'services/{domain}/{service}', json=data)
-        return response.json()
+        return self._json(response)
 
     def test_connection(self) -> bool:
         """
@@ -258,7 +521,7 @@ class HomeAssistantClient:
         """
         try:
             response = self._request('GET', '')
-            return response.json().get('message') == 'API running.'
+            return self._json(response).get('message') == 'API running.'
         except Exception as e:
-            logger.error(f"Connection test failed: {e}")
+            logger.error("Connection test failed: %s", e)
             return False
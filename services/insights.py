@@ -0,0 +1,290 @@
+"""
+Usage Insights
+
+Running statistics per device, updated in O(1) for every power sample the
+dashboard fetches anyway (overview, realtime and history refreshes):
+
+- Welford mean and variance, to flag readings far above a device's norm
+- a time-weighted EWMA, the device's recent level
+- a slowly rising minimum, the standby draw a device never goes below
+
+plus a running mean of the total power per hour of day for peak hours.
+Insights are read off this state; history is never rescanned for them.
+"""
+from array import array
+from typing import Dict, List, Optional
+import math
+import threading
+
+# Samples closer together than this (seconds) are one observation
+MIN_INTERVAL = 5
+
+# Time constant (seconds) of the recent-level EWMA
+EWMA_TAU = 3600
+
+# Time constant (seconds) with which the standby floor follows a higher draw
+FLOOR_TAU = 7 * 86400
+
+# Samples a device needs before its readings are judged
+MIN_SAMPLES = 30
+
+# Readings this many standard deviations above the mean are unusual...
+ANOMALY_Z = 4.0
+# ...if they are also at least this many watts above it
+ANOMALY_MIN_WATTS = 50.0
+
+# Seconds an unusual reading stays in the insights
+ANOMALY_HOLD = 3600
+
+# Devices whose standby floor stays above this many watts are always on...
+ALWAYS_ON_WATTS = 5.0
+# ...once they have been observed for this many hours
+ALWAYS_ON_HOURS = 12
+
+# Hours of day with samples needed before peak hours are reported
+PEAK_MIN_HOURS = 12
+
+# Neighbouring hours within this fraction of the peak belong to the peak window
+PEAK_WINDOW = 0.9
+
+# Insights of one kind listed at most
+MAX_LISTED = 3
+
+
+class RunningStats:
+    """Welford mean/variance, EWMA and standby floor of one power series"""
+
+    __slots__ = ('name', 'count', 'mean', 'm2', 'ewma', 'floor', 'first_seen', 'last_seen')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = 0.0
+        self.floor = 0.0
+        self.first_seen = 0.0
+        self.last_seen = 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def update(self, timestamp: float, value: float):
+        """
+        Add one sample
+
+        Args:
+            timestamp: Epoch seconds
+            value: Power in watts
+        """
+        if self.count == 0:
+            self.ewma = self.floor = value
+            self.first_seen = timestamp
+        else:
+            dt = max(0.0, timestamp - self.last_seen)
+            self.ewma += (value - self.ewma) * (1 - math.exp(-dt / EWMA_TAU))
+            if value < self.floor:
+                self.floor = value
+            else:
+                self.floor += (value - self.floor) * (1 - math.exp(-dt / FLOOR_TAU))
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.last_seen = timestamp
+
+    def zscore(self, value: float) -> Optional[float]:
+        """Standard deviations a reading lies above the mean, None while learning"""
+        std = self.std
+        if self.count < MIN_SAMPLES or std <= 0:
+            return None
+        return (value - self.mean) / std
+
+    def state(self) -> list:
+        return [self.name, self.count, self.mean, self.m2, self.ewma, self.floor,
+                self.first_seen, self.last_seen]
+
+    @classmethod
+    def from_state(cls, state: list) -> 'RunningStats':
+        stats = cls(state[0])
+        (stats.count, stats.mean, stats.m2, stats.ewma, stats.floor,
+         stats.first_seen, stats.last_seen) = state[1:]
+        return stats
+
+
+class InsightsEngine:
+    """Incremental anomaly, standby and peak-hour detection over power samples"""
+
+    def __init__(self):
+        self.devices = {}
+        self.total = RunningStats('Total')
+        # Running mean of the total power per local hour of day
+        self.hour_count = array('L', [0] * 24)
+        self.hour_mean = array('d', [0.0] * 24)
+        # Unusual readings: entity ID -> (timestamp, watts, mean, std)
+        self.anomalies = {}
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, timestamp: float, hour: int, total: float, devices: Dict[str, tuple]):
+        """
+        Add the power of every device at one point in time
+
+        Args:
+            timestamp: Epoch seconds
+            hour: Local hour of day of the timestamp
+            total: Whole-house power in watts
+            devices: Mapping of entity ID to (name, watts) for tracked devices
+        """
+        with self._lock:
+            if timestamp - self._last < MIN_INTERVAL:
+                return
+            self._last = timestamp
+
+            for entity_id, (name, power) in devices.items():
+                stats = self.devices.get(entity_id)
+                if stats is None:
+                    stats = self.devices[entity_id] = RunningStats(name)
+                z = stats.zscore(power)
+                if z is not None and z >= ANOMALY_Z and power - stats.mean >= ANOMALY_MIN_WATTS:
+                    self.anomalies[entity_id] = (timestamp, power, stats.mean, stats.std)
+                stats.update(timestamp, power)
+
+            self.total.update(timestamp, total)
+            self.hour_count[hour] += 1
+            self.hour_mean[hour] += (total - self.hour_mean[hour]) / self.hour_count[hour]
+
+    def insights(self, now: float) -> List[Dict]:
+        """
+        Current insights, from the running state only
+
+        Args:
+            now: Epoch seconds, for expiring old anomalies
+
+        Returns:
+            List of dictionaries with 'type', 'title' and 'message'
+        """
+        with self._lock:
+            for entity_id, (ts, *_) in list(self.anomalies.items()):
+                if now - ts > ANOMALY_HOLD:
+                    del self.anomalies[entity_id]
+
+            insights = self._anomaly_insights()
+            for build in (self._always_on_insight, self._base_load_insight, self._peak_hours_insight):
+                insight = build()
+                if insight:
+                    insights.append(insight)
+            return insights
+
+    def _anomaly_insights(self) -> List[Dict]:
+        insights = []
+        recent = sorted(self.anomalies.items(), key=lambda item: item[1][0], reverse=True)
+        for entity_id, (_, power, mean, std) in recent[:MAX_LISTED]:
+            name = self.devices[entity_id].name
+            insights.append({
+                'type': 'anomaly',
+                'entity_id': entity_id,
+                'title': f"Unusual consumption: {name}",
+                'message': f"{name} drew {power:,.0f} W, well above its usual {mean:,.0f} ± {std:,.0f} W."
+            })
+
+        # Devices whose recent level has moved well above their long-run norm
+        for entity_id, stats in self.devices.items():
+            if len(insights) >= MAX_LISTED or entity_id in self.anomalies:
+                continue
+            z = stats.zscore(stats.ewma)
+            if z is not None and z >= 2 and stats.ewma - stats.mean >= ANOMALY_MIN_WATTS:
+                insights.append({
+                    'type': 'above_usual',
+                    'entity_id': entity_id,
+                    'title': f"Higher than usual: {stats.name}",
+                    'message': f"{stats.name} has averaged {stats.ewma:,.0f} W over the last hour, "
+                               f"against {stats.mean:,.0f} W normally."
+                })
+        return insights
+
+    def _always_on_insight(self) -> Optional[Dict]:
+        always_on = sorted(
+            (stats for stats in self.devices.values()
+             if stats.floor >= ALWAYS_ON_WATTS
+             and stats.last_seen - stats.first_seen >= ALWAYS_ON_HOURS * 3600),
+            key=lambda stats: stats.floor, reverse=True
+        )
+        if not always_on:
+            return None
+
+        listed = ', '.join(f"{stats.name} ({stats.floor:,.0f} W)" for stats in always_on[:MAX_LISTED])
+        more = f" and {len(always_on) - MAX_LISTED} more" if len(always_on) > MAX_LISTED else ''
+        yearly = sum(stats.floor for stats in always_on) * 8.76
+        return {
+            'type': 'always_on',
+            'title': "Always-on devices",
+            'message': f"{listed}{more} never switch off completely. Their standby draw adds up to "
+                       f"about {yearly:,.0f} kWh per year."
+        }
+
+    def _base_load_insight(self) -> Optional[Dict]:
+        total = self.total
+        if total.count < MIN_SAMPLES or total.last_seen - total.first_seen < ALWAYS_ON_HOURS * 3600:
+            return None
+        share = total.floor / total.mean * 100 if total.mean > 0 else 0
+        return {
+            'type': 'base_load',
+            'title': "Base load",
+            'message': f"Your home never drops below about {total.floor:,.0f} W ({share:.0f}% of the "
+                       f"average draw), which is {total.floor * 8.76:,.0f} kWh per year."
+        }
+
+    def _peak_hours_insight(self) -> Optional[Dict]:
+        hours = [hour for hour in range(24) if self.hour_count[hour]]
+        if len(hours) < PEAK_MIN_HOURS:
+            return None
+
+        average = sum(self.hour_mean[hour] for hour in hours) / len(hours)
+        peak = max(hours, key=lambda hour: self.hour_mean[hour])
+        if average <= 0 or self.hour_mean[peak] <= average:
+            return None
+
+        # Widen the peak to neighbouring hours that are nearly as high
+        threshold = self.hour_mean[peak] * PEAK_WINDOW
+        first = last = peak
+        while (first - 1) % 24 != last and self.hour_count[(first - 1) % 24] \
+                and self.hour_mean[(first - 1) % 24] >= threshold:
+            first = (first - 1) % 24
+        while (last + 1) % 24 != first and self.hour_count[(last + 1) % 24] \
+                and self.hour_mean[(last + 1) % 24] >= threshold:
+            last = (last + 1) % 24
+
+        above = (self.hour_mean[peak] / average - 1) * 100
+        return {
+            'type': 'peak_hours',
+            'title': "Peak hours",
+            'message': f"Consumption peaks between {first:02d}:00 and {(last + 1) % 24:02d}:00 at "
+                       f"{self.hour_mean[peak]:,.0f} W on average, {above:.0f}% above the daily average."
+        }
+
+    def state(self) -> Dict:
+        """Running state as JSON-compatible data, for cache snapshots"""
+        with self._lock:
+            return {
+                'devices': {entity_id: stats.state() for entity_id, stats in self.devices.items()},
+                'total': self.total.state(),
+                'hour_count': self.hour_count.tolist(),
+                'hour_mean': self.hour_mean.tolist()
+            }
+
+    def restore(self, state: Dict):
+        """
+        Continue from a state saved by state()
+
+        Args:
+            state: Saved running state
+        """
+        with self._lock:
+            self.devices = {entity_id: RunningStats.from_state(stats)
+                            for entity_id, stats in state['devices'].items()}
+            self.total = RunningStats.from_state(state['total'])
+            self.hour_count = array('L', state['hour_count'])
+            self.hour_mean = array('d', state['hour_mean'])
@@ -0,0 +1,294 @@
+"""
+Compact Data Types
+
+Slotted and array-backed types used inside the data processor and its
+cache. Home Assistant states are reduced to the few fields the dashboard
+uses, and time series are stored as typed arrays (8-byte epoch seconds,
+4-byte values) instead of lists of per-point dicts. Conversion to JSON only
+happens at the edge, through to_json().
+"""
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+import math
+import threading
+
+from services.energy import INVALID_STATES
+
+
+class SensorReading:
+    """Current state of one sensor, reduced to the fields the dashboard uses"""
+
+    __slots__ = ('entity_id', 'name', 'unit', 'state', 'value', 'room')
+
+    def __init__(self, entity_id: str, name: str, unit: Optional[str], state: Optional[str],
+                 value: Optional[float], room: Optional[str] = None):
+        """
+        Initialize reading
+
+        Args:
+            entity_id: Entity ID
+            name: Friendly name (the entity ID if there is none)
+            unit: Unit of measurement
+            state: Raw state string
+            value: Numeric state in the sensor's unit, None if not numeric
+            room: Room name, once classified
+        """
+        self.entity_id = entity_id
+        self.name = name
+        self.unit = unit
+        self.state = state
+        self.value = value
+        self.room = room
+
+    @classmethod
+    def from_state(cls, state: Dict) -> 'SensorReading':
+        """
+        Build a reading from a Home Assistant state dictionary
+
+        Args:
+            state: Entity state as returned by the REST API
+
+        Returns:
+            SensorReading instance
+        """
+        attributes = state.get('attributes', {})
+        raw = state.get('state')
+        try:
+            value = None if raw in INVALID_STATES else float(raw)
+        except (TypeError, ValueError):
+            value = None
+        return cls(
+            state['entity_id'],
+            attributes.get('friendly_name', state['entity_id']),
+            attributes.get('unit_of_measurement'),
+            raw,
+            value
+        )
+
+    @property
+    def id(self) -> str:
+        return self.entity_id
+
+    @property
+    def scale(self) -> float:
+        """Multiplier converting the sensor's power unit to watts"""
+        return 1000.0 if self.unit in ('kW', 'kilowatt') else 1.0
+
+    @property
+    def power(self) -> float:
+        """Power in watts (0 when unavailable)"""
+        return self.value * self.scale if self.value is not None else 0.0
+
+    def to_json(self) -> Dict:
+        return {
+            'id': self.entity_id,
+            'entity_id': self.entity_id,
+            'name': self.name,
+            'room': self.room,
+            'power': self.power,
+            'unit': self.unit or 'W',
+            'state': self.state
+        }
+
+
+class DeviceCost:
+    """Running cost estimate of one device"""
+
+    __slots__ = ('reading', 'daily_cost', 'monthly_cost')
+
+    def __init__(self, reading: SensorReading, daily_cost: float, monthly_cost: float):
+        self.reading = reading
+        self.daily_cost = daily_cost
+        self.monthly_cost = monthly_cost
+
+    @property
+    def name(self) -> str:
+        return self.reading.name
+
+    @property
+    def room(self) -> Optional[str]:
+        return self.reading.room
+
+    @property
+    def power(self) -> float:
+        return self.reading.power
+
+    def to_json(self) -> Dict:
+        return {
+            'name': self.name,
+            'room': self.room,
+            'power': self.power,
+            'daily_cost': self.daily_cost,
+            'monthly_cost': self.monthly_cost
+        }
+
+
+class Series:
+    """Time series stored as typed arrays of epoch seconds and float32 values"""
+
+    __slots__ = ('timestamps', 'values')
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.values = array('f')
+
+    def append(self, timestamp: float, value: float):
+        """
+        Add a point
+
+        Args:
+            timestamp: Epoch seconds
+            value: Value
+        """
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        return zip(self.timestamps, self.values)
+
+    def max(self, default: float = 0.0) -> float:
+        return max(self.values) if self.values else default
+
+    def labels(self, fmt: str = '%H:%M') -> 'TimeLabels':
+        """
+        Time labels for the points, formatted when converted to JSON
+
+        Args:
+            fmt: strftime format
+
+        Returns:
+            TimeLabels view sharing this series' timestamps
+        """
+        return TimeLabels(self.timestamps, fmt)
+
+    def to_json(self) -> Dict:
+        return {'timestamps': self.timestamps.tolist(), 'values': _floats(self.values)}
+
+
+class TimeLabels:
+    """Lazily formatted local-time labels for an array of epoch seconds"""
+
+    __slots__ = ('timestamps', 'fmt')
+
+    def __init__(self, timestamps: array, fmt: str):
+        self.timestamps = timestamps
+        self.fmt = fmt
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def to_json(self) -> List[str]:
+        return [datetime.fromtimestamp(ts).strftime(self.fmt) for ts in self.timestamps]
+
+
+class RingSeries:
+    """Rolling window of the last samples of many keys, in preallocated typed arrays"""
+
+    def __init__(self, capacity: int):
+        """
+        Initialize ring buffers
+
+        Args:
+            capacity: Number of samples kept per key
+        """
+        self.capacity = max(1, capacity)
+        self.timestamps = array('d', bytes(8 * self.capacity))
+        self.values = {}
+        self._last_seen = {}
+        self._next = 0
+        self._count = 0
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def record(self, timestamp: float, samples: Dict[str, float]):
+        """
+        Append one sample for every key, overwriting the oldest slot
+
+        Keys missing from samples get a gap; keys missing for a whole window
+        are dropped.
+
+        Args:
+            timestamp: Epoch seconds shared by all samples
+            samples: Mapping of key (e.g. entity ID) to value
+        """
+        with self._lock:
+            slot = self._next
+            self.timestamps[slot] = timestamp
+
+            for key, values in list(self.values.items()):
+                if key in samples:
+                    continue
+                if self._total - self._last_seen[key] >= self.capacity:
+                    del self.values[key]
+                    del self._last_seen[key]
+                else:
+                    values[slot] = math.nan
+
+            for key, value in samples.items():
+                values = self.values.get(key)
+                if values is None:
+                    values = self.values[key] = array('f', [math.nan]) * self.capacity
+                values[slot] = value
+                self._last_seen[key] = self._total
+
+            self._next = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._total += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def to_json(self, keys: Optional[List[str]] = None) -> Dict:
+        """
+        Samples in time order
+
+        Args:
+            keys: Only these keys (default all)
+
+        Returns:
+            Dictionary with 'timestamps' and 'series' mapping key to values (None for gaps)
+        """
+        with self._lock:
+            order = [(self._next - self._count + i) % self.capacity for i in range(self._count)]
+            selected = self.values.items() if keys is None else \
+                [(key, self.values[key]) for key in keys if key in self.values]
+            return {
+                'timestamps': [int(self.timestamps[i]) for i in order],
+                'series': {
+                    key: [None if math.isnan(values[i]) else round(values[i], 1) for i in order]
+                    for key, values in selected
+                }
+            }
+
+
+def _floats(values: array) -> List[float]:
+    if values.typecode == 'f':
+        # Drop the float32 -> float64 widening noise (e.g. 230.10000610351562)
+        return [float(f'{value:.7g}') for value in values]
+    return values.tolist()
+
+
+def to_json(obj):
+    """
+    Convert a compact type to JSON-compatible data
+
+    Usable as the `default` hook of json.dumps.
+
+    Args:
+        obj: SensorReading, DeviceCost, Series, TimeLabels, RingSeries or array
+
+    Returns:
+        JSON-compatible value
+
+    Raises:
+        TypeError: If the object is not a known compact type
+    """
+    if isinstance(obj, array):
+        return _floats(obj)
+    if isinstance(obj, (SensorReading, DeviceCost, Series, TimeLabels, RingSeries)):
+        return obj.to_json()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
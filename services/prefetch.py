@@ -0,0 +1,207 @@
+"""
+Device Page Prefetching
+
+Visits from the overview almost always go to one of its top consumers, and
+people come back to the devices they looked at recently. The prefetcher keeps
+the device views of those devices warm in the background, so /device/<id>
+opens from the cache instead of waiting for get_state plus a 24h history.
+
+Prefetching spends Home Assistant requests nobody asked for yet, so it runs
+within a token bucket budget of requests per minute: top consumers go first,
+then recently viewed devices, and whatever does not fit waits for the next
+cycle. Views are forgotten after a while, and nothing is prefetched while
+nobody is using the dashboard.
+"""
+from collections import OrderedDict
+from typing import Dict, List
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Home Assistant requests one device view costs (get_state and get_history)
+DEVICE_VIEW_REQUESTS = 2
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously up to its capacity"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        """
+        Initialize bucket, full
+
+        Args:
+            rate_per_minute: Tokens added per minute
+            capacity: Most tokens held (defaults to one minute's worth)
+        """
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, count: float = 1) -> bool:
+        """
+        Take tokens if enough are available
+
+        Args:
+            count: Tokens needed
+
+        Returns:
+            Whether the tokens were taken
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens < count:
+                return False
+            self.tokens -= count
+            return True
+
+
+def _field(item, name: str):
+    """Read a field of a reading, or of its JSON form restored from a snapshot"""
+    return item.get(name) if isinstance(item, dict) else getattr(item, name, None)
+
+
+class Prefetcher:
+    """Keep the device views of likely next clicks warm within a request budget"""
+
+    def __init__(self, processor, budget: float = 30, top_n: int = 5, recent: int = 10,
+                 interval: float = 15, recent_window: float = 1800, idle_after: float = 300):
+        """
+        Initialize prefetcher
+
+        Args:
+            processor: DataProcessor querying Home Assistant (not read-only)
+            budget: Home Assistant requests per minute prefetching may use
+            top_n: Top consumers of the overview to keep warm
+            recent: Recently viewed devices to keep warm
+            interval: Seconds between prefetch cycles
+            recent_window: Seconds a viewed device stays a prefetch candidate
+            idle_after: Seconds without dashboard requests after which
+                prefetching pauses
+        """
+        self.processor = processor
+        self.bucket = TokenBucket(budget)
+        self.top_n = top_n
+        self.recent_size = recent
+        self.interval = interval
+        self.recent_window = recent_window
+        self.idle_after = idle_after
+        self.stats = {'prefetched': 0, 'deferred': 0, 'failed': 0, 'idle': 0}
+        self._recent = OrderedDict()
+        self._last_activity = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def note_activity(self):
+        """Record a dashboard request; prefetching only runs while they keep coming"""
+        self._last_activity = time.time()
+
+    def note_view(self, device_id: str):
+        """
+        Remember a device whose page was opened
+
+        Args:
+            device_id: Device entity ID
+        """
+        if self.recent_size <= 0:
+            return
+        with self._lock:
+            self._recent[device_id] = time.time()
+            self._recent.move_to_end(device_id)
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+
+    def candidates(self) -> List[str]:
+        """
+        Devices to keep warm, most likely next click first
+
+        Returns:
+            Entity IDs: the overview's top consumers, then recently viewed
+            devices (most recent first)
+        """
+        devices = []
+        overview = self.processor.peek('overview')
+        if overview:
+            for consumer in overview.get('top_consumers', [])[:self.top_n]:
+                entity_id = _field(consumer, 'entity_id')
+                if entity_id and entity_id not in devices:
+                    devices.append(entity_id)
+
+        cutoff = time.time() - self.recent_window
+        with self._lock:
+            while self._recent and next(iter(self._recent.values())) < cutoff:
+                self._recent.popitem(last=False)
+            recent = list(reversed(self._recent))
+        devices.extend(device_id for device_id in recent if device_id not in devices)
+        return devices
+
+    def run_once(self) -> Dict:
+        """
+        Refresh the device views that are missing or expire before the next cycle
+
+        Returns:
+            Dictionary mapping entity ID to 'ok', 'warm', 'deferred' (no
+            budget left this cycle), 'stale' (Home Assistant failed and the
+            old entry was kept) or an error message
+        """
+        results = {}
+        if time.time() - self._last_activity > self.idle_after:
+            self.stats['idle'] += 1
+            return results
+        if self.processor.ha_client.breaker.is_open:
+            return results
+
+        # Refresh early enough that no entry expires between two cycles
+        lead = self.interval * 1.5
+        for device_id in self.candidates():
+            key = f'device_{device_id}'
+            remaining = self.processor.expires_in(key)
+            if remaining is not None and remaining > lead:
+                results[device_id] = 'warm'
+                continue
+
+            if not self.bucket.take(DEVICE_VIEW_REQUESTS):
+                results[device_id] = 'deferred'
+                self.stats['deferred'] += 1
+                continue
+
+            try:
+                self.processor.refresh(key, force=True)
+                # A failed refresh falls back to the old entry without renewing it
+                renewed = self.processor.expires_in(key)
+                if renewed is not None and (remaining is None or renewed > remaining):
+                    results[device_id] = 'ok'
+                    self.stats['prefetched'] += 1
+                else:
+                    results[device_id] = 'stale'
+                    self.stats['failed'] += 1
+            except Exception as e:
+                logger.debug("Prefetching %s failed: %s", device_id, e)
+                results[device_id] = str(e)
+                self.stats['failed'] += 1
+                # Deleted or renamed devices stop being prefetched
+                if isinstance(e, ValueError):
+                    with self._lock:
+                        self._recent.pop(device_id, None)
+        return results
+
+    def run(self):
+        """Run prefetch cycles until stop() is called"""
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning("Prefetch cycle failed: %s", e)
+
+    def start(self):
+        """Run prefetch cycles in a background thread"""
+        threading.Thread(target=self.run, name='device-prefetch', daemon=True).start()
+
+    def stop(self):
+        """Stop the loop after the current cycle"""
+        self._stop.set()
@@ -0,0 +1,214 @@
+"""
+Recorded Home Assistant Traffic
+
+Transports for HomeAssistantClient that record REST responses (states,
+single states, history) with their latency into a gzip-compressed JSON Lines
+archive, and serve them back without a Home Assistant instance:
+
+    {"version": 1, "recorded": 1760000000.0, "base_url": "http://ha:8123"}
+    {"method": "GET", "endpoint": "states", "params": null, "status": 200,
+     "elapsed": 0.084, "content_type": "application/json", "body": "[...]"}
+
+Replayed bodies have their ISO timestamps moved forward by the time since
+the recording, so time-relative views (last 24 hours, today) see the
+recorded data shapes as if they had just been fetched. Long-term statistics
+go over the WebSocket API and are not recorded; both transports make the
+client fall back to raw history, so a recording covers what a replay asks for.
+"""
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import gzip
+import json
+import re
+import threading
+import time
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+
+# ISO 8601 timestamps in endpoints, parameters and response bodies
+ISO_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:\d{2})?')
+
+
+class ReplayMiss(requests.ConnectionError):
+    """Raised when a replayed request has no recorded response"""
+
+
+def _endpoint(url: str) -> str:
+    """API path of a request URL ('history/period/...')"""
+    return urlsplit(url).path.split('/api/', 1)[-1]
+
+
+def _parse_iso(text: str) -> datetime:
+    return datetime.fromisoformat(text.replace('Z', '+00:00'))
+
+
+def request_key(method: str, endpoint: str, params: Optional[Dict]) -> Tuple[str, tuple]:
+    """
+    Key a request is matched by
+
+    Timestamps in the endpoint and parameters change with every request, so
+    they are replaced by placeholders in the request shape. The distances
+    between them (the queried span, in minutes) are kept separately.
+
+    Args:
+        method: HTTP method
+        endpoint: API path
+        params: Query parameters
+
+    Returns:
+        Tuple of (request shape, spans)
+    """
+    text = endpoint + '?' + '&'.join(f'{key}={value}' for key, value in sorted((params or {}).items()))
+    shape = f"{method} {ISO_TIMESTAMP.sub('*', text)}"
+    try:
+        times = [_parse_iso(stamp) for stamp in ISO_TIMESTAMP.findall(text)]
+        spans = tuple(round((t - times[0]).total_seconds() / 60) for t in times[1:])
+    except (TypeError, ValueError):
+        # Mixed naive and aware timestamps
+        spans = ()
+    return shape, spans
+
+
+class RecordingTransport:
+    """Passes requests to Home Assistant and appends every response to an archive"""
+
+    # Record the raw history fallback instead of WebSocket statistics
+    supports_statistics = False
+
+    def __init__(self, path: str, base_url: str = '', transport: Optional[Callable] = None):
+        """
+        Initialize recorder
+
+        Args:
+            path: Archive to write (replaced if it exists)
+            base_url: Home Assistant URL, kept in the archive header
+            transport: Function sending the request (defaults to requests.request)
+        """
+        self.path = path
+        self.transport = transport
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._write({'version': ARCHIVE_VERSION, 'recorded': time.time(), 'base_url': base_url})
+
+    def _write(self, record: Dict):
+        with self._lock:
+            self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+            self._file.flush()
+
+    def __call__(self, method: str, url: str, **kwargs) -> requests.Response:
+        started = time.monotonic()
+        response = (self.transport or requests.request)(method, url, **kwargs)
+        elapsed = time.monotonic() - started
+
+        self._write({
+            'method': method,
+            'endpoint': _endpoint(url),
+            'params': kwargs.get('params'),
+            'status': response.status_code,
+            'elapsed': round(elapsed, 4),
+            'content_type': response.headers.get('Content-Type', 'application/json'),
+            'body': response.content.decode('utf-8', errors='replace')
+        })
+        self.count += 1
+        return response
+
+    def close(self):
+        """Finish the archive"""
+        with self._lock:
+            self._file.close()
+        logger.info("Recorded %s Home Assistant responses to %s", self.count, self.path)
+
+
+class ReplayTransport:
+    """Answers requests from a recorded archive instead of Home Assistant"""
+
+    supports_statistics = False
+
+    def __init__(self, path: str, latency: float = 0.0, shift_time: bool = True):
+        """
+        Load a recorded archive
+
+        Args:
+            path: Archive written by RecordingTransport
+            latency: Factor applied to the recorded response times (0 answers
+                immediately, 1 at recorded speed, 2 at half speed)
+            shift_time: Move timestamps in the responses forward by the time
+                elapsed since the recording
+
+        Raises:
+            ValueError: If the archive is missing its header or has another version
+        """
+        self.path = path
+        self.latency = latency
+        self.calls = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Recorded responses per request shape and spans, served in recorded order and cycled
+        self._responses = defaultdict(deque)
+        # Recorded spans per request shape, for requests whose span was not recorded
+        self._spans = defaultdict(list)
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('version') != ARCHIVE_VERSION:
+                raise ValueError(f"{path} is not a version {ARCHIVE_VERSION} recording")
+            self.base_url = header.get('base_url', '')
+            offset = timedelta(seconds=time.time() - header['recorded']) if shift_time else None
+
+            count = 0
+            for line in f:
+                record = json.loads(line)
+                if offset:
+                    record['body'] = ISO_TIMESTAMP.sub(
+                        lambda match: (_parse_iso(match.group()) + offset).isoformat(), record['body'])
+                shape, spans = request_key(record['method'], record['endpoint'], record['params'])
+                if not self._responses[shape, spans]:
+                    self._spans[shape].append(spans)
+                self._responses[shape, spans].append(record)
+                count += 1
+        logger.info("Loaded %s recorded responses from %s", count, path)
+
+    def __call__(self, method: str, url: str, **kwargs) -> requests.Response:
+        endpoint = _endpoint(url)
+        shape, spans = request_key(method, endpoint, kwargs.get('params'))
+        with self._lock:
+            self.calls += 1
+            if (shape, spans) not in self._responses:
+                if not self._spans[shape]:
+                    self.misses += 1
+                    raise ReplayMiss(f"No recorded response for {method} {endpoint}")
+                # The same request over the nearest recorded span (e.g. since
+                # midnight, recorded at another time of day)
+                spans = min(self._spans[shape],
+                            key=lambda recorded: sum(abs(a - b) for a, b in zip(recorded, spans)))
+            queue = self._responses[shape, spans]
+            record = queue[0]
+            queue.rotate(-1)
+
+        if self.latency:
+            time.sleep(record['elapsed'] * self.latency)
+        return self._response(url, record)
+
+    @staticmethod
+    def _response(url: str, record: Dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = record['status']
+        try:
+            response.reason = HTTPStatus(record['status']).phrase
+        except ValueError:
+            response.reason = ''
+        response.url = url
+        response.headers['Content-Type'] = record['content_type']
+        response.encoding = 'utf-8'
+        response._content = record['body'].encode('utf-8')
+        response.elapsed = timedelta(seconds=record['elapsed'])
+        return response
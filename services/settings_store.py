@@ -0,0 +1,194 @@
+"""
+Runtime Settings Store
+
+Holds the settings that can be changed from the settings page without a
+restart. Overrides are kept in a small JSON file shared by all workers; each
+worker checks the file's modification time at most once per check interval
+and notifies its listeners about the keys that changed.
+"""
+from typing import Callable, Dict
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Settings that can be changed at runtime, with their parsers
+RUNTIME_SETTINGS = {
+    'ELECTRICITY_RATE': float,
+    'CURRENCY_SYMBOL': str,
+    'CACHE_TTL': int,
+}
+
+
+class SettingsStore:
+    """File-backed runtime settings shared across worker processes"""
+
+    def __init__(self, path: str, defaults: Dict, check_interval: float = 1.0):
+        """
+        Initialize settings store
+
+        Args:
+            path: JSON file holding the overrides
+            defaults: Values used for settings without an override
+            check_interval: Minimum seconds between file change checks
+        """
+        self.path = path
+        self.defaults = {key: defaults[key] for key in RUNTIME_SETTINGS if key in defaults}
+        self.check_interval = check_interval
+        self._values = dict(self.defaults)
+        self._mtime = None
+        self._last_check = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.version = 0
+        # Hash of the current values, the same in every worker holding them
+        self.fingerprint = None
+
+        self._reload()
+
+    def subscribe(self, callback: Callable[[Dict], None]):
+        """
+        Register a callback receiving {key: new_value} for changed settings
+
+        Args:
+            callback: Listener function
+        """
+        self._listeners.append(callback)
+
+    def get(self, key: str):
+        """
+        Get the current value of a setting
+
+        Args:
+            key: Setting name (e.g. 'ELECTRICITY_RATE')
+
+        Returns:
+            Current value
+        """
+        self.refresh()
+        return self._values[key]
+
+    def values(self) -> Dict:
+        """Current values of all runtime settings"""
+        self.refresh()
+        return dict(self._values)
+
+    def refresh(self):
+        """Reload the settings file if another worker changed it"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime != self._mtime:
+            self._reload()
+
+    def update(self, changes: Dict) -> Dict:
+        """
+        Validate, persist and apply new setting values
+
+        Args:
+            changes: Mapping of setting name to new value (strings accepted)
+
+        Returns:
+            Dictionary of settings whose value actually changed
+
+        Raises:
+            ValueError: If a setting is unknown or its value is invalid
+        """
+        parsed = {key: self._parse(key, value) for key, value in changes.items()}
+
+        with self._lock:
+            overrides = self._read_file()
+            overrides.update(parsed)
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(overrides, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+        return self._reload()
+
+    def _parse(self, key: str, value):
+        if key not in RUNTIME_SETTINGS:
+            raise ValueError(f"Unknown setting: {key}")
+
+        try:
+            parsed = RUNTIME_SETTINGS[key](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {key}: {value!r}")
+
+        if key == 'ELECTRICITY_RATE' and parsed < 0:
+            raise ValueError("ELECTRICITY_RATE must not be negative")
+        if key == 'CACHE_TTL' and parsed <= 0:
+            raise ValueError("CACHE_TTL must be positive")
+        if key == 'CURRENCY_SYMBOL' and not parsed.strip():
+            raise ValueError("CURRENCY_SYMBOL must not be empty")
+        return parsed
+
+    def _read_file(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read settings file %s: %s", self.path, e)
+            return {}
+
+    def _reload(self) -> Dict:
+        """Load the file, notify listeners and return the changed settings"""
+        with self._lock:
+            try:
+                self._mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                self._mtime = None
+
+            values = dict(self.defaults)
+            for key, value in self._read_file().items():
+                try:
+                    values[key] = self._parse(key, value)
+                except ValueError as e:
+                    logger.warning("Ignoring runtime setting: %s", e)
+
+            changed = {key: value for key, value in values.items() if self._values.get(key) != value}
+            self._values = values
+            if changed or self.fingerprint is None:
+                self.fingerprint = hashlib.blake2b(repr(sorted(values.items())).encode(),
+                                                   digest_size=8).hexdigest()
+            if changed:
+                self.version += 1
+
+        if changed:
+            logger.info("Runtime settings changed: %s", ', '.join(sorted(changed)))
+            for callback in self._listeners:
+                try:
+                    callback(changed)
+                except Exception as e:
+                    logger.error("Settings listener failed: %s", e)
+        return changed
+
+
+class SettingsView:
+    """Read-only config object with runtime settings layered over the static config"""
+
+    def __init__(self, config, store: SettingsStore):
+        self._config = config
+        self._values = store.values()
+
+    def __getattr__(self, name: str):
+        if name in self._values:
+            return self._values[name]
+        return getattr(self._config, name)
@@ -0,0 +1,248 @@
+"""
+Multi-Site Registry
+
+One Home Assistant client and data processor per site (building), so every
+site keeps its own cache and circuit breaker. Portfolio views fetch all sites
+concurrently and merge the per-site overview and cost data; a slow or failing
+site delays the result by at most the site timeout and only its own row.
+A site's views are never fetched twice at once, so a hung site holds at most
+its own two pool threads and never delays the other sites' fetches.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _field(item, name: str):
+    """Read a field of a reading, or of its JSON form restored from a snapshot or store"""
+    return item[name] if isinstance(item, dict) else getattr(item, name)
+
+
+class Site:
+    """One Home Assistant instance and its data processor"""
+
+    def __init__(self, site_id: str, name: str, ha_client, data_processor):
+        """
+        Initialize site
+
+        Args:
+            site_id: Short identifier used in URLs and API responses
+            name: Display name
+            ha_client: HomeAssistantClient for this site
+            data_processor: DataProcessor for this site
+        """
+        self.id = site_id
+        self.name = name
+        self.ha_client = ha_client
+        self.data_processor = data_processor
+
+
+def parse_sites(spec: str) -> List[Dict]:
+    """
+    Parse the SITES setting
+
+    A JSON list of objects with 'id', 'url' and optionally 'name', 'token'
+    and 'rate'. Without 'token', the token is read from the environment
+    variable HA_TOKEN_<ID> (ID upper-cased, non-alphanumerics as '_').
+
+    Args:
+        spec: JSON text (empty for none)
+
+    Returns:
+        List of site dictionaries with id, name, url, token and rate (or None)
+
+    Raises:
+        ValueError: If the setting is malformed
+    """
+    if not spec or not spec.strip():
+        return []
+
+    try:
+        entries = json.loads(spec)
+    except ValueError as e:
+        raise ValueError(f"SITES is not valid JSON: {e}")
+    if not isinstance(entries, list):
+        raise ValueError("SITES must be a JSON list of sites")
+
+    sites = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('id') or not entry.get('url'):
+            raise ValueError(f"Every site needs an 'id' and a 'url': {entry!r}")
+        site_id = str(entry['id'])
+        token_env = 'HA_TOKEN_' + re.sub(r'\W', '_', site_id).upper()
+        token = entry.get('token') or os.environ.get(token_env, '')
+        if not token:
+            raise ValueError(f"Site '{site_id}' has no token (set 'token' or {token_env})")
+        sites.append({
+            'id': site_id,
+            'name': entry.get('name', site_id),
+            'url': entry['url'],
+            'token': token,
+            'rate': float(entry['rate']) if entry.get('rate') is not None else None
+        })
+
+    ids = [site['id'] for site in sites]
+    if len(set(ids)) != len(ids):
+        raise ValueError("Site IDs in SITES must be unique")
+    return sites
+
+
+class SiteRegistry:
+    """All configured sites, with concurrent portfolio aggregation"""
+
+    def __init__(self, sites: List[Site], timeout: float = 15):
+        """
+        Initialize registry
+
+        Args:
+            sites: Sites, the primary one first
+            timeout: Seconds a portfolio request waits for a site
+        """
+        self.sites = sites
+        self.timeout = timeout
+        # One thread per site and view: with at most one fetch in flight per
+        # pair (see _fetch), no fetch ever waits in the queue
+        self._pool = ThreadPoolExecutor(max_workers=2 * max(1, len(sites)), thread_name_prefix='site')
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        # Last merged portfolio and the per-site data objects it was built from
+        self._merged = None
+
+    def get(self, site_id: str) -> Site:
+        """
+        Look up a site
+
+        Args:
+            site_id: Site identifier
+
+        Returns:
+            Site
+
+        Raises:
+            KeyError: If there is no such site
+        """
+        for site in self.sites:
+            if site.id == site_id:
+                return site
+        raise KeyError(site_id)
+
+    def get_portfolio_data(self) -> Dict:
+        """
+        Get overview and cost totals across all sites
+
+        Each site's overview and cost views are fetched concurrently from its
+        own (cached) data processor. Views that fail or do not answer within
+        the timeout are reported in their site's row and left out of the totals.
+
+        Returns:
+            Dictionary with per-site rows, portfolio totals and the top
+            consumers across all sites
+        """
+        started = time.monotonic()
+        futures = {
+            (site.id, view): self._fetch(site, view, method)
+            for site in self.sites
+            for view, method in (('overview', 'get_overview_data'), ('costs', 'get_cost_data'))
+        }
+        wait(futures.values(), timeout=self.timeout)
+
+        results = {}
+        for (site_id, view), future in futures.items():
+            if not future.done():
+                results[site_id, view] = TimeoutError(f"No answer within {self.timeout:.0f}s")
+            elif future.exception() is not None:
+                results[site_id, view] = future.exception()
+            else:
+                results[site_id, view] = future.result()
+
+        # Reuse the merged result while no site produced new data, which
+        # keeps the portfolio page in the render cache
+        sources = tuple(results.values())
+        if self._merged is not None and len(self._merged[0]) == len(sources) and \
+                all(a is b for a, b in zip(self._merged[0], sources)):
+            return self._merged[1]
+
+        data = self._merge(results)
+        data['duration'] = round(time.monotonic() - started, 3)
+        self._merged = (sources, data)
+        return data
+
+    def _fetch(self, site: Site, view: str, method: str) -> Future:
+        """
+        Start fetching a site view, or join the fetch still running for it
+
+        Args:
+            site: Site
+            view: View name ('overview', 'costs')
+            method: DataProcessor method producing the view
+
+        Returns:
+            Future of the view data
+        """
+        with self._inflight_lock:
+            future = self._inflight.get((site.id, view))
+            if future is None or future.done():
+                future = self._pool.submit(getattr(site.data_processor, method))
+                self._inflight[site.id, view] = future
+            return future
+
+    def _merge(self, results: Dict) -> Dict:
+        """
+        Combine per-site overview and cost data
+
+        Args:
+            results: Mapping of (site ID, view) to view data or the exception raised
+
+        Returns:
+            Portfolio data
+        """
+        rows = []
+        top_consumers = []
+        totals = {'total_power': 0.0, 'daily_energy': 0.0, 'daily_cost': 0.0,
+                  'monthly_cost': 0.0, 'monthly_projection': 0.0, 'device_count': 0}
+
+        for site in self.sites:
+            overview = results[site.id, 'overview']
+            costs = results[site.id, 'costs']
+            errors = [str(result) for result in (overview, costs) if isinstance(result, Exception)]
+            for error in errors:
+                logger.warning("Portfolio: site %s failed: %s", site.id, error)
+
+            row = {'id': site.id, 'name': site.name, 'status': 'error' if errors else 'ok',
+                   'error': '; '.join(errors) or None, 'stale': False}
+            if not isinstance(overview, Exception):
+                row.update(total_power=overview.get('total_power', 0.0),
+                           daily_energy=overview.get('daily_energy', 0.0),
+                           device_count=overview.get('device_count', 0))
+                row['stale'] = bool(overview.get('stale'))
+                top_consumers.extend(
+                    {'site': site.name, 'name': _field(consumer, 'name'), 'power': _field(consumer, 'power')}
+                    for consumer in overview.get('top_consumers', [])
+                )
+            if not isinstance(costs, Exception):
+                row.update(daily_cost=costs.get('daily_cost', 0.0),
+                           monthly_cost=costs.get('monthly_cost', 0.0),
+                           monthly_projection=costs.get('monthly_projection', 0.0))
+                row['stale'] = row['stale'] or bool(costs.get('stale'))
+
+            for key in totals:
+                totals[key] += row.get(key, 0)
+            rows.append(row)
+
+        top_consumers.sort(key=lambda consumer: consumer['power'], reverse=True)
+        return {
+            'sites': rows,
+            **totals,
+            'top_consumers': top_consumers[:10],
+            'sites_ok': sum(1 for row in rows if row['status'] == 'ok'),
+            'sites_failed': sum(1 for row in rows if row['status'] != 'ok'),
+            'timestamp': datetime.now().isoformat()
+        }
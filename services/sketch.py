@@ -0,0 +1,172 @@
+"""
+Streaming Quantile Sketch
+
+A DDSketch-style sketch: values are counted in logarithmically spaced bins,
+so any quantile is answered within a fixed relative error using memory that
+grows with the logarithm of the value range, not with the number of samples.
+Two sketches with the same accuracy merge by adding their bin counts, which
+lets hourly sketches roll up into daily ones without touching raw samples.
+"""
+from typing import Dict, Optional
+import math
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error"""
+
+    __slots__ = ('relative_accuracy', 'max_bins', '_gamma', '_log_gamma',
+                 'positive', 'negative', 'zero_count', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, relative_accuracy: float = 0.02, max_bins: int = 256):
+        """
+        Initialize sketch
+
+        Args:
+            relative_accuracy: Maximum relative error of quantile estimates
+            max_bins: Upper bound on bins per sign; the smallest magnitudes
+                are collapsed together when exceeded
+        """
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, magnitude: float) -> int:
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Midpoint (in relative terms) of the bin (gamma^(k-1), gamma^k]
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        """
+        Add a value to the sketch
+
+        Args:
+            value: Observed value
+            weight: Number of times the value was observed
+        """
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + weight
+            if len(self.positive) > self.max_bins:
+                self._collapse(self.positive)
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + weight
+            if len(self.negative) > self.max_bins:
+                self._collapse(self.negative)
+        else:
+            self.zero_count += weight
+
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        Merge another sketch with the same accuracy into this one
+
+        Args:
+            other: Sketch to merge
+        """
+        if other.count == 0:
+            return
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        if len(self.positive) > self.max_bins:
+            self._collapse(self.positive)
+        if len(self.negative) > self.max_bins:
+            self._collapse(self.negative)
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def _collapse(self, bins: Dict[int, int]):
+        """Fold the lowest-magnitude bins together until max_bins remain"""
+        keys = sorted(bins)
+        excess = len(keys) - self.max_bins + 1
+        target = keys[excess]
+        for key in keys[:excess]:
+            bins[target] += bins.pop(key)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile
+
+        Args:
+            q: Quantile between 0 and 1 (e.g. 0.95)
+
+        Returns:
+            Estimated value, or None if the sketch is empty
+        """
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        seen = 0
+        estimate = self.max
+
+        # Most negative values first: largest magnitudes of the negative bins
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                estimate = -self._value(key)
+                break
+        else:
+            seen += self.zero_count
+            if seen > rank:
+                estimate = 0.0
+            else:
+                for key in sorted(self.positive):
+                    seen += self.positive[key]
+                    if seen > rank:
+                        estimate = self._value(key)
+                        break
+
+        # Bin midpoints can fall outside the exact extremes
+        return min(max(estimate, self.min), self.max)
+
+    def summary(self, digits: int = 1) -> Dict:
+        """
+        Min, max, mean, p95 and p99 of the sketch
+
+        Args:
+            digits: Decimal places to round to
+
+        Returns:
+            Dictionary of statistics (values are None for an empty sketch)
+        """
+        if self.count == 0:
+            return {'min': None, 'max': None, 'mean': None, 'p95': None, 'p99': None, 'count': 0}
+        return {
+            'min': round(self.min, digits),
+            'max': round(self.max, digits),
+            'mean': round(self.mean, digits),
+            'p95': round(self.quantile(0.95), digits),
+            'p99': round(self.quantile(0.99), digits),
+            'count': self.count
+        }
@@ -0,0 +1,165 @@
+"""
+Shared View Store
+
+SQLite file through which the collector process publishes the computed
+views (realtime snapshot, overview, costs, history, ...) to the web workers.
+The database runs in WAL mode, so any number of reader processes can query
+it while the collector writes. Readers also record which views they asked
+for, so the collector keeps on-demand views (device pages, custom history
+ranges) fresh while somebody is looking at them.
+"""
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+from services.models import to_json
+
+logger = logging.getLogger(__name__)
+
+# Key of the entry the collector updates after every cycle
+HEARTBEAT_KEY = '_collector'
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS views (key TEXT PRIMARY KEY, ts REAL NOT NULL, data TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS demand (key TEXT PRIMARY KEY, requested REAL NOT NULL)',
+)
+
+
+class CollectorUnavailable(RuntimeError):
+    """Raised when a web worker needs a view the collector has not published"""
+
+
+class SharedStore:
+    """SQLite-backed key/value store shared by the collector and the web workers"""
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        """
+        Initialize shared store
+
+        Args:
+            path: SQLite database file (created if missing)
+            timeout: Seconds to wait for a lock held by another process
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+        # Decoded views by key, reused while the stored timestamp is unchanged
+        self._decoded = {}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connection of the calling thread, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def put(self, key: str, data, ts: Optional[float] = None):
+        """
+        Publish a view
+
+        Args:
+            key: View cache key (e.g. 'realtime', 'history_24h')
+            data: View data; compact types are converted with to_json()
+            ts: Time the data was computed (defaults to now)
+        """
+        payload = json.dumps(data, separators=(',', ':'), default=to_json)
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO views (key, ts, data) VALUES (?, ?, ?)',
+                         (key, ts or time.time(), payload))
+
+    def get(self, key: str) -> Optional[Tuple[float, Dict]]:
+        """
+        Read a published view
+
+        Args:
+            key: View cache key
+
+        Returns:
+            (timestamp, data) tuple, or None if the view was never published
+        """
+        row = self._connection().execute('SELECT ts, data FROM views WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+
+        ts, payload = row
+        decoded = self._decoded.get(key)
+        if decoded is None or decoded[0] != ts:
+            decoded = (ts, json.loads(payload))
+            self._decoded[key] = decoded
+        return decoded
+
+    def delete(self, key: str):
+        """
+        Withdraw a published view
+
+        Args:
+            key: View cache key
+        """
+        with self._connection() as conn:
+            conn.execute('DELETE FROM views WHERE key = ?', (key,))
+        self._decoded.pop(key, None)
+
+    def keys(self) -> List[str]:
+        """Keys of all published views"""
+        rows = self._connection().execute('SELECT key FROM views WHERE key != ?', (HEARTBEAT_KEY,))
+        return [key for key, in rows]
+
+    def request(self, key: str):
+        """
+        Record that a web worker needs a view
+
+        Args:
+            key: View cache key
+        """
+        with self._connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO demand (key, requested) VALUES (?, ?)', (key, time.time()))
+
+    def demanded(self, since: float) -> List[str]:
+        """
+        Views requested since a point in time; older requests are dropped
+
+        Args:
+            since: Epoch seconds
+
+        Returns:
+            List of view cache keys
+        """
+        with self._connection() as conn:
+            conn.execute('DELETE FROM demand WHERE requested < ?', (since,))
+            return [key for key, in conn.execute('SELECT key FROM demand')]
+
+    def heartbeat(self, info: Dict):
+        """
+        Record that the collector finished a cycle
+
+        Args:
+            info: Cycle details reported by the readiness endpoint
+        """
+        self.put(HEARTBEAT_KEY, info)
+
+    def collector_status(self) -> Optional[Dict]:
+        """
+        Last heartbeat of the collector
+
+        Returns:
+            Heartbeat details with its 'age' in seconds, or None if the
+            collector never ran
+        """
+        entry = self.get(HEARTBEAT_KEY)
+        if entry is None:
+            return None
+        ts, info = entry
+        return {**info, 'age': round(time.time() - ts, 1)}
@@ -0,0 +1,195 @@
+"""
+Electricity Tariff Engine
+
+Prices hourly energy buckets with time-of-use windows and tiered rates.
+Time-of-use windows are resolved into a 168-entry hour-of-week table up
+front, so pricing N hours of energy is a single O(N) pass.
+
+Tariff specification (TARIFF setting, JSON):
+
+    {
+        "windows": [
+            {"name": "Off-peak", "days": [0, 1, 2, 3, 4, 5, 6], "start": 0, "end": 7, "rate": 0.08},
+            {"name": "Peak", "days": [0, 1, 2, 3, 4], "start": 17, "end": 21, "rate": 0.35}
+        ],
+        "tiers": [
+            {"up_to": 300, "rate": 0.10},
+            {"up_to": null, "rate": 0.14}
+        ]
+    }
+
+Days are weekday numbers (Monday = 0); `end` is exclusive and may be smaller
+than `start` for windows crossing midnight. Hours outside every window are
+priced by the tier matching the month's cumulative consumption, or by the
+flat electricity rate when no tiers are configured. An hour crossing a tier
+boundary is split at the boundary. Energy in window hours counts towards the
+month's consumption but is priced at the window rate.
+"""
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+STANDARD = 'Standard'
+
+
+class Tariff:
+    """Time-of-use and tiered electricity pricing"""
+
+    def __init__(self, base_rate: float, windows: Optional[List[Dict]] = None,
+                 tiers: Optional[List[Dict]] = None):
+        """
+        Initialize tariff
+
+        Args:
+            base_rate: Flat price per kWh for hours outside any window
+            windows: Time-of-use windows (name, days, start, end, rate)
+            tiers: Monthly consumption tiers (up_to kWh or None, rate), ascending
+        """
+        self.base_rate = base_rate
+        self.windows = windows or []
+        self.tiers = sorted(
+            tiers or [],
+            key=lambda tier: float('inf') if tier.get('up_to') is None else tier['up_to']
+        )
+
+        # Window (name, rate) for every hour of the week, Monday 00:00 first
+        self._hour_of_week = [None] * 168
+        for window in self.windows:
+            name = window.get('name', 'Window')
+            rate = float(window['rate'])
+            start, end = int(window['start']) % 24, int(window['end']) % 24
+            hours = [h % 24 for h in range(start, start + ((end - start) % 24 or 24))]
+            for day in window.get('days', range(7)):
+                for hour in hours:
+                    # Hours after midnight of an overnight window belong to the next day
+                    offset = day * 24 + hour + (24 if hour < start else 0)
+                    self._hour_of_week[offset % 168] = (name, rate)
+
+    @classmethod
+    def from_spec(cls, spec, base_rate: float) -> 'Tariff':
+        """
+        Build a tariff from a JSON string or dictionary
+
+        Args:
+            spec: Tariff specification (empty for a flat rate)
+            base_rate: Flat price per kWh
+
+        Returns:
+            Tariff instance
+
+        Raises:
+            ValueError: If the specification is invalid
+        """
+        if not spec:
+            return cls(base_rate)
+        if isinstance(spec, str):
+            spec = json.loads(spec)
+
+        try:
+            return cls(base_rate, spec.get('windows'), spec.get('tiers'))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid tariff specification: {e}")
+
+    def _tier_rate(self, month_kwh: float) -> float:
+        for tier in self.tiers:
+            if tier.get('up_to') is None or month_kwh < tier['up_to']:
+                return float(tier['rate'])
+        return self.base_rate
+
+    def _tiered_cost(self, month_kwh: float, kwh: float) -> float:
+        """Cost of kwh consumed on top of month_kwh, split at the tier boundaries"""
+        cost = 0.0
+        for tier in self.tiers:
+            up_to = tier.get('up_to')
+            if up_to is not None and month_kwh >= up_to:
+                continue
+            portion = kwh if up_to is None else min(kwh, up_to - month_kwh)
+            cost += portion * float(tier['rate'])
+            kwh -= portion
+            month_kwh += portion
+            if kwh <= 0:
+                return cost
+        # Beyond the last tier
+        return cost + kwh * self.base_rate
+
+    def rate_at(self, moment: datetime, month_kwh: float = 0.0) -> Tuple[str, float]:
+        """
+        Price per kWh at a point in time
+
+        Args:
+            moment: Local time
+            month_kwh: Energy already consumed this calendar month (for tiers)
+
+        Returns:
+            Tuple of (window name, rate)
+        """
+        window = self._hour_of_week[moment.weekday() * 24 + moment.hour]
+        if window:
+            return window
+        return STANDARD, self._tier_rate(month_kwh) if self.tiers else self.base_rate
+
+    def price(self, hourly: List[Tuple[int, float]], priced_from: Optional[float] = None) -> Dict:
+        """
+        Price hourly energy buckets
+
+        With tiers, the buckets should start at the beginning of the first
+        priced month; the ones before priced_from only count towards the
+        month's consumption.
+
+        Args:
+            hourly: Time-ordered (hour start epoch seconds, kWh) pairs
+            priced_from: First hour to price (defaults to the first bucket)
+
+        Returns:
+            Dictionary with total cost/energy, per-day costs, per-window
+            breakdown and the consumption of the last bucket's month ('month_kwh')
+        """
+        total_cost = 0.0
+        total_kwh = 0.0
+        by_day = {}
+        by_window = {}
+        month = None
+        month_kwh = 0.0
+
+        for hour, kwh in hourly:
+            moment = datetime.fromtimestamp(hour)
+
+            # Tier consumption restarts every calendar month
+            if (moment.year, moment.month) != month:
+                month = (moment.year, moment.month)
+                month_kwh = 0.0
+
+            window = self._hour_of_week[moment.weekday() * 24 + moment.hour]
+            if window:
+                name, cost = window[0], kwh * window[1]
+            elif self.tiers:
+                name, cost = STANDARD, self._tiered_cost(month_kwh, kwh)
+            else:
+                name, cost = STANDARD, kwh * self.base_rate
+            month_kwh += kwh
+            if priced_from is not None and hour < priced_from:
+                continue
+
+            total_kwh += kwh
+            total_cost += cost
+
+            day = moment.strftime('%Y-%m-%d')
+            day_totals = by_day.setdefault(day, {'kwh': 0.0, 'cost': 0.0})
+            day_totals['kwh'] += kwh
+            day_totals['cost'] += cost
+
+            window_totals = by_window.setdefault(name, {'kwh': 0.0, 'cost': 0.0})
+            window_totals['kwh'] += kwh
+            window_totals['cost'] += cost
+
+        return {
+            'cost': total_cost,
+            'kwh': total_kwh,
+            'effective_rate': total_cost / total_kwh if total_kwh else self.base_rate,
+            'by_day': by_day,
+            'by_window': by_window,
+            'month_kwh': month_kwh
+        }
@@ -14,40 +14,133 @@ function stopAutoRefresh() {
     }
 }
 
+// Visible page of the device table; sorting and filtering happen on the server
+let deviceOffset = 0;
+
 async function refreshData() {
+    const params = new URLSearchParams({
+        sort: document.getElementById('deviceSort').value,
+        limit: DEVICE_PAGE_SIZE,
+        offset: deviceOffset
+    });
+    const room = document.getElementById('deviceRoom').value;
+    const active = document.getElementById('deviceActive').value;
+    if (room) params.set('room', room);
+    if (active) params.set('active', active);
+
     try {
-        const response = await fetch('/api/realtime');
+        const response = await fetch(`/api/devices?${params}`);
         const data = await response.json();
 
         if (data.success) {
+            // The page may have emptied (devices went idle, filters changed)
+            if (data.devices.length === 0 && data.total > 0 && deviceOffset > 0) {
+                deviceOffset = Math.max(0, Math.floor((data.total - 1) / DEVICE_PAGE_SIZE) * DEVICE_PAGE_SIZE);
+                return refreshData();
+            }
             updateDeviceTable(data.devices);
+            updatePager(data.total);
         }
     } catch (error) {
         console.error('Failed to refresh data:', error);
     }
+    await loadSparklines();
+}
+
+function changeListing() {
+    deviceOffset = 0;
+    refreshData();
+}
+
+function changePage(direction) {
+    deviceOffset = Math.max(0, deviceOffset + direction * DEVICE_PAGE_SIZE);
+    refreshData();
+}
+
+function updatePager(total) {
+    const last = Math.min(deviceOffset + DEVICE_PAGE_SIZE, total);
+    document.getElementById('devicePageInfo').textContent =
+        total ? `${deviceOffset + 1}–${last} of ${total}` : '';
+    document.getElementById('devicePrev').disabled = deviceOffset === 0;
+    document.getElementById('deviceNext').disabled = last >= total;
+}
+
+// Recent power per device, kept in memory by the server (no history queries)
+let sparklines = {};
+
+async function loadSparklines() {
+    // Only the devices on the visible page
+    const ids = Array.from(document.querySelectorAll('#deviceTableBody tr[data-entity-id]'),
+                           row => row.dataset.entityId);
+    if (ids.length === 0) return;
+
+    try {
+        const response = await fetch(`/api/sparklines?${new URLSearchParams({entity_id: ids.join(',')})}`);
+        const data = await response.json();
+
+        if (data.success) {
+            sparklines = data.series;
+            drawSparklines();
+        }
+    } catch (error) {
+        console.error('Failed to load sparklines:', error);
+    }
+}
+
+function drawSparklines() {
+    document.querySelectorAll('#deviceTableBody tr[data-entity-id]').forEach(row => {
+        const cell = row.querySelector('.sparkline');
+        if (cell) {
+            cell.innerHTML = renderSparkline(sparklines[row.dataset.entityId] || []);
+        }
+    });
+}
+
+function renderSparkline(values, width = 120, height = 24) {
+    const points = values.filter(value => value !== null);
+    if (points.length < 2) return '';
+
+    const max = Math.max(...points);
+    const min = Math.min(...points);
+    const range = max - min || 1;
+    const x = i => (i / (values.length - 1) * width).toFixed(1);
+    const y = value => (height - 1 - (value - min) / range * (height - 2)).toFixed(1);
+
+    // One polyline per run of values, leaving gaps where a device was unavailable
+    const runs = [[]];
+    values.forEach((value, i) => {
+        if (value === null) {
+            if (runs[runs.length - 1].length) runs.push([]);
+        } else {
+            runs[runs.length - 1].push(`${x(i)},${y(value)}`);
+        }
+    });
+
+    return `<svg width="${width}" height="${height}" viewBox="0 0 ${width} ${height}" aria-hidden="true">
+        ${runs.filter(run => run.length).map(run => `<polyline points="${run.join(' ')}" />`).join('')}
+    </svg>`;
 }
 
 function updateDeviceTable(devices) {
     const tbody = document.getElementById('deviceTableBody');
     if (!tbody || !devices) return;
 
-    // Sort devices: active devices by power (high to low), then idle devices
-    const sortedDevices = devices.sort((a, b) => {
-        // Both idle or both active - sort by power
-        if ((a.power === 0 && b.power === 0) || (a.power > 0 && b.power > 0)) {
-            return b.power - a.power; // High to low
-        }
-        // Active devices come before idle
-        if (a.power > 0 && b.power === 0) return -1;
-        if (a.power === 0 && b.power > 0) return 1;
-        return 0;
-    });
+    if (devices.length === 0) {
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="5" style="text-align: center; color: var(--text-muted);">
+                    No matching devices
+                </td>
+            </tr>`;
+        return;
+    }
 
-    tbody.innerHTML = sortedDevices.map(device => `
-        <tr>
+    tbody.innerHTML = devices.map(device => `
+        <tr data-entity-id="${device.entity_id}">
             <td>${device.name}</td>
             <td>${device.room || 'Unknown'}</td>
             <td class="number">${device.power.toFixed(1)}</td>
+            <td class="sparkline">${renderSparkline(sparklines[device.entity_id] || [])}</td>
             <td>
                 ${device.power > 0
                     ? '<span class="badge badge-success">Active</span>'
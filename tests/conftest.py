@@ -0,0 +1,137 @@
+"""Shared fixtures: a fake Home Assistant and applications built against it"""
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit
+import json
+
+import pytest
+import requests
+
+import config as default_config
+from services.home_assistant import HomeAssistantClient
+
+# entity_id: (friendly name, unit, state)
+ENTITIES = {
+    'sensor.heater_power': ('Heater Power', 'W', '1500'),
+    'sensor.kitchen_fridge_power': ('Kitchen Fridge Power', 'W', '120'),
+    'sensor.office_pc_power': ('Office PC Power', 'kW', '0.25'),
+    'sensor.living_room_tv_power': ('Living Room TV', 'W', '0'),
+}
+
+# Spacing of the state changes in fake history
+HISTORY_STEP = timedelta(minutes=10)
+
+
+class FakeHomeAssistant:
+    """Transport answering the Home Assistant REST calls of the dashboard
+
+    Every entity holds its state; history repeats the current state every
+    HISTORY_STEP, so energy over a range is the state times its length.
+    Entities listed in `added` have no history before that time.
+    """
+
+    supports_statistics = False
+
+    def __init__(self):
+        self.states = {entity_id: state for entity_id, (_, _, state) in ENTITIES.items()}
+        self.added = {}
+        self.calls = []
+
+    def __call__(self, method, url, timeout=None, **kwargs):
+        endpoint = urlsplit(url).path.split('/api/', 1)[-1]
+        params = kwargs.get('params') or {}
+        self.calls.append((method, endpoint))
+
+        if endpoint == 'states':
+            return self._response([self._state(entity_id) for entity_id in ENTITIES])
+        if endpoint.startswith('states/'):
+            entity_id = endpoint[len('states/'):]
+            if entity_id not in ENTITIES:
+                return self._response({'message': 'Entity not found.'}, 404)
+            return self._response(self._state(entity_id))
+        if endpoint.startswith('history/period/'):
+            start = _parse(endpoint[len('history/period/'):])
+            end = _parse(params['end_time']) if params.get('end_time') else datetime.now(timezone.utc)
+            entity_ids = params['filter_entity_id'].split(',')
+            return self._response([self._history(entity_id, start, end) for entity_id in entity_ids])
+        if endpoint == '':
+            return self._response({'message': 'API running.'})
+        return self._response({'message': 'Not found'}, 404)
+
+    def _state(self, entity_id):
+        name, unit, _ = ENTITIES[entity_id]
+        return {
+            'entity_id': entity_id,
+            'state': self.states[entity_id],
+            'attributes': {'friendly_name': name, 'unit_of_measurement': unit},
+            'last_changed': datetime.now(timezone.utc).isoformat()
+        }
+
+    def _history(self, entity_id, start, end):
+        entries = []
+        moment = max(start, self.added.get(entity_id, start))
+        while moment < end:
+            entries.append({'entity_id': entity_id, 'state': self.states[entity_id],
+                            'last_changed': moment.isoformat()})
+            moment += HISTORY_STEP
+        return entries
+
+    @staticmethod
+    def _response(data, status=200):
+        response = requests.Response()
+        response.status_code = status
+        response.url = 'http://ha.test/api/'
+        response.headers['Content-Type'] = 'application/json'
+        response.encoding = 'utf-8'
+        response._content = json.dumps(data).encode('utf-8')
+        return response
+
+
+def _parse(text):
+    moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    return moment if moment.tzinfo else moment.astimezone()
+
+
+class AppConfig:
+    """Default settings with the files under a temporary directory and background work off"""
+
+    def __init__(self, tmp_path, **overrides):
+        for name in dir(default_config):
+            if name.isupper():
+                setattr(self, name, getattr(default_config, name))
+        self.HA_URL = 'http://ha.test'
+        self.HA_TOKEN = 'test-token'
+        self.HA_RECORD_PATH = ''
+        self.HA_REPLAY_PATH = ''
+        self.SITES = ''
+        self.SETTINGS_PATH = str(tmp_path / 'settings.json')
+        self.CACHE_SNAPSHOT_PATH = ''
+        self.SHARED_STORE_PATH = ''
+        self.WARMUP_ON_START = False
+        self.PREFETCH_BUDGET = 0
+        self.SERVER_TIMING = False
+        self.DEBUG_TOKEN = ''
+        for name, value in overrides.items():
+            setattr(self, name, value)
+
+
+@pytest.fixture
+def fake_ha():
+    return FakeHomeAssistant()
+
+
+@pytest.fixture
+def make_app(tmp_path, fake_ha):
+    """Factory building the application against the fake Home Assistant"""
+    from app import create_app
+    from utils import timing
+
+    def factory(**overrides):
+        app = create_app(AppConfig(tmp_path, **overrides))
+        app.testing = True
+        services = app.extensions['energy_dashboard']
+        services._ha_client = HomeAssistantClient('http://ha.test', 'test-token', retries=0,
+                                                  transport=fake_ha)
+        return app
+
+    yield factory
+    timing.enable(False)
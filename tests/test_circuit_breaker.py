@@ -0,0 +1,179 @@
+"""Tests for the circuit breaker, adaptive timeouts and their use in the Home Assistant client"""
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from services.circuit_breaker import AdaptiveTimeout, CircuitBreaker, CircuitOpenError
+from services.home_assistant import HomeAssistantClient, _latency_class
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.payload = payload if payload is not None else []
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error", response=self)
+
+    def json(self):
+        return self.payload
+
+
+class FakeTransport:
+    """Answers requests from a list of responses or exceptions, in order"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def __call__(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, timeout))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_client(*outcomes, **kwargs):
+    kwargs.setdefault('retries', 0)
+    kwargs.setdefault('retry_backoff', 0)
+    return HomeAssistantClient('http://ha.local', 'token', transport=FakeTransport(*outcomes), **kwargs)
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_allows_single_probe_when_half_open():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_breaker_release_frees_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()
+
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+    for _ in range(3):
+        breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_adaptive_timeout_starts_at_maximum_and_stays_in_bounds():
+    estimator = AdaptiveTimeout(minimum=1.0, maximum=10.0)
+    assert estimator.timeout == 10.0
+
+    estimator.observe(0.1)
+    assert estimator.timeout == 1.0
+
+    for _ in range(50):
+        estimator.observe(30.0)
+    assert estimator.timeout == 10.0
+
+
+def test_adaptive_timeout_tracks_latency():
+    estimator = AdaptiveTimeout(minimum=0.1, maximum=60.0)
+    for _ in range(100):
+        estimator.observe(2.0)
+    assert estimator.mean == pytest.approx(2.0)
+    assert estimator.timeout == pytest.approx(2.0, abs=0.01)
+
+
+def test_client_success_closes_circuit():
+    client = make_client(FakeResponse(payload=[{'entity_id': 'sensor.a'}]))
+    assert client.get_states() == [{'entity_id': 'sensor.a'}]
+    assert client.breaker.failures == 0
+
+
+def test_client_error_response_does_not_count_as_failure():
+    client = make_client(FakeResponse(404), failure_threshold=1)
+    assert client.get_state('sensor.missing') is None
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_server_errors_open_circuit():
+    client = make_client(FakeResponse(500), FakeResponse(502), failure_threshold=2)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            client.get_states()
+    assert client.breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        client.get_states()
+
+
+def test_unexpected_error_during_probe_does_not_leave_it_in_flight():
+    client = make_client(requests.ConnectionError('down'),
+                         requests.exceptions.ChunkedEncodingError('truncated'),
+                         FakeResponse(),
+                         failure_threshold=1, reset_timeout=0)
+    with pytest.raises(requests.ConnectionError):
+        client.get_states()
+
+    # The probe fails with an error the client does not retry
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        client.get_states()
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # ...and the next call after the cool-down is allowed to probe again
+    client.get_states()
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_short_adaptive_timeout_is_retried_without_counting_as_failure():
+    client = make_client(requests.Timeout('slow'), FakeResponse(), retries=1, failure_threshold=1)
+    client._timeouts['states'] = estimator = AdaptiveTimeout(1.0, client.timeout)
+    estimator.observe(0.1)
+
+    client.get_states()
+    assert client.breaker.failures == 0
+    first, second = client.transport.calls
+    assert first[2] == 1.0
+    assert first[2] < second[2] <= client.timeout
+
+
+def test_timeout_at_configured_limit_counts_as_failure():
+    client = make_client(requests.Timeout('slow'), failure_threshold=1)
+    with pytest.raises(requests.Timeout):
+        client.get_states()
+    assert client.breaker.is_open
+
+
+def test_latency_class_separates_history_spans():
+    start = datetime(2026, 3, 1, 0, 0)
+    assert _latency_class('states', None) == 'states'
+    assert _latency_class('states/sensor.a', None) == 'states'
+
+    def history(hours):
+        params = {'end_time': (start + timedelta(hours=hours)).isoformat()}
+        return _latency_class(f'history/period/{start.isoformat()}', params)
+
+    assert history(1) == 'history<=1h'
+    assert history(12) == 'history<=24h'
+    assert history(24 * 30) == 'history>168h'
+    assert _latency_class('history/period/garbage', None) == 'history'
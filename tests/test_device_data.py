@@ -0,0 +1,36 @@
+"""Tests for the device detail view"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(ETAGS=False).test_client()
+
+
+def test_energy_and_average_over_a_full_day(client):
+    data = client.get('/api/device/sensor.heater_power').get_json()
+    assert data['average_power'] == pytest.approx(1500, rel=0.01)
+    assert data['energy_24h'] == pytest.approx(36.0, rel=0.01)
+
+
+def test_average_over_a_short_history(client, fake_ha):
+    fake_ha.added['sensor.heater_power'] = datetime.now(timezone.utc) - timedelta(hours=3)
+
+    data = client.get('/api/device/sensor.heater_power').get_json()
+    assert data['energy_24h'] == pytest.approx(4.5, rel=0.01)
+    assert data['average_power'] == pytest.approx(1500, rel=0.01)
+
+
+def test_average_in_sensor_unit(client):
+    data = client.get('/api/device/sensor.office_pc_power').get_json()
+    assert data['unit'] == 'kW'
+    assert data['average_power'] == pytest.approx(0.25, rel=0.01)
+    assert data['energy_24h'] == pytest.approx(6.0, rel=0.01)
+
+
+def test_unknown_device(client):
+    response = client.get('/api/device/sensor.missing')
+    assert response.status_code == 500
+    assert 'not found' in response.get_json()['error']
@@ -0,0 +1,68 @@
+"""Tests for the device listing index"""
+import pytest
+
+from services.device_index import MAX_LIMIT, DeviceIndex
+from services.models import SensorReading
+
+DEVICES = [
+    {'entity_id': 'sensor.fridge', 'name': 'Fridge', 'room': 'Kitchen', 'power': 120.0},
+    {'entity_id': 'sensor.oven', 'name': 'oven', 'room': 'Kitchen', 'power': 0.0},
+    {'entity_id': 'sensor.tv', 'name': 'TV', 'room': 'Living room', 'power': 80.0},
+    {'entity_id': 'sensor.lamp', 'name': 'Lamp', 'room': None, 'power': None},
+    {'entity_id': 'sensor.heater', 'name': 'Heater', 'room': 'Bathroom', 'power': 2000.0},
+]
+
+
+def names(page):
+    return [device['name'] for device in page['devices']]
+
+
+def test_sorts():
+    index = DeviceIndex(DEVICES)
+    assert names(index.query('power')) == ['Heater', 'Fridge', 'TV', 'Lamp', 'oven']
+    assert names(index.query('name')) == ['Fridge', 'Heater', 'Lamp', 'oven', 'TV']
+    assert names(index.query('room')) == ['Heater', 'Fridge', 'oven', 'TV', 'Lamp']
+
+
+def test_active_filter_and_counts():
+    index = DeviceIndex(DEVICES)
+    page = index.query('name', active=True)
+    assert names(page) == ['Fridge', 'Heater', 'TV']
+    assert page['total'] == 3
+    assert page['active_count'] == 3 and page['idle_count'] == 2
+    assert names(index.query('power', active=False)) == ['Lamp', 'oven']
+
+
+def test_room_filter():
+    index = DeviceIndex(DEVICES)
+    page = index.query('power', room='Kitchen')
+    assert names(page) == ['Fridge', 'oven']
+    assert page['active_count'] == 1 and page['idle_count'] == 1
+    assert page['rooms'] == {'Bathroom': 1, 'Kitchen': 2, 'Living room': 1, 'Unknown': 1}
+    assert names(index.query(room='Unknown')) == ['Lamp']
+
+    empty = index.query(room='Garage')
+    assert empty['devices'] == [] and empty['total'] == 0
+
+
+def test_pagination():
+    index = DeviceIndex(DEVICES)
+    page = index.query('power', limit=2, offset=1)
+    assert names(page) == ['Fridge', 'TV']
+    assert page['total'] == 5
+    assert index.query(offset=10)['devices'] == []
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'sort': 'watts'}, {'limit': 0}, {'limit': MAX_LIMIT + 1}, {'offset': -1},
+])
+def test_invalid_parameters(kwargs):
+    with pytest.raises(ValueError):
+        DeviceIndex(DEVICES).query(**kwargs)
+
+
+def test_readings_and_json_form_index_alike():
+    readings = [SensorReading('sensor.a', 'A', 'W', '5', 5.0, room='Hall'),
+                SensorReading('sensor.b', 'B', 'kW', '0.05', 0.05, room='Hall')]
+    page = DeviceIndex(readings).query('power')
+    assert [device.name for device in page['devices']] == ['B', 'A']
@@ -0,0 +1,171 @@
+"""Tests for power integration and the hourly energy buckets"""
+from datetime import datetime, timezone
+
+import pytest
+
+from services.energy import (HOUR, HourlyEnergyBuckets, integrate_hourly, integrate_kwh,
+                             parse_samples, resample)
+
+# An hour boundary (epoch seconds)
+T0 = 1_772_323_200
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def test_parse_samples_zeroes_invalid_states_and_sorts():
+    history = [
+        {'state': '250', 'last_changed': iso(T0 + 60)},
+        {'state': 'unavailable', 'last_changed': iso(T0 + 120)},
+        {'state': '1.5', 'last_changed': iso(T0)},
+        {'state': '100'},
+    ]
+    assert parse_samples(history, scale=1000) == [(T0, 1500.0), (T0 + 60, 250000.0), (T0 + 120, 0.0)]
+
+
+def test_integrate_holds_each_reading_until_the_next():
+    samples = [(T0, 1000.0), (T0 + HOUR / 2, 0.0)]
+    assert integrate_kwh(samples, T0, T0 + HOUR) == pytest.approx(0.5)
+
+
+def test_integrate_uses_initial_power_before_first_sample():
+    samples = [(T0 + HOUR / 2, 0.0)]
+    assert integrate_kwh(samples, T0, T0 + HOUR) == 0.0
+    assert integrate_kwh(samples, T0, T0 + HOUR, initial=2000.0) == pytest.approx(1.0)
+
+
+def test_integrate_ignores_samples_after_end():
+    samples = [(T0, 1000.0), (T0 + 2 * HOUR, 5000.0)]
+    assert integrate_kwh(samples, T0, T0 + HOUR) == pytest.approx(1.0)
+
+
+
+
+def test_integrate_hourly_splits_at_hour_boundaries():
+    buckets, sketches = {}, {}
+    last = integrate_hourly([(T0 + HOUR / 2, 1000.0)], T0, T0 + 2 * HOUR, buckets, sketches=sketches)
+    assert last == 1000.0
+    assert buckets == {T0: pytest.approx(0.5), T0 + HOUR: pytest.approx(1.0)}
+    # The held reading is reported for the quiet second hour too
+    assert sketches[T0 + HOUR].count == 1
+    assert sketches[T0 + HOUR].max == 1000.0
+
+
+def test_resample_averages_covered_part_of_slot():
+    samples = [(T0 + 30, 100.0), (T0 + 60, 300.0)]
+    assert resample(samples, T0, 60, 3, end=T0 + 150) == [100.0, 300.0, 300.0]
+
+
+class FakeHistoryClient:
+    """Constant 1 kW sensor that records the ranges it was asked for"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_history(self, entity_id, start_time, end_time=None):
+        self.calls.append((datetime.fromisoformat(start_time).timestamp(),
+                           datetime.fromisoformat(end_time).timestamp()))
+        return [{'state': '1000', 'last_changed': start_time}]
+
+
+def test_buckets_only_fetch_missing_ranges():
+    client = FakeHistoryClient()
+    buckets = HourlyEnergyBuckets(client)
+
+    buckets.ensure('sensor.a', T0 + HOUR, T0 + 2 * HOUR)
+    buckets.ensure('sensor.a', T0 + HOUR, T0 + 2 * HOUR)
+    buckets.ensure('sensor.a', T0, T0 + 3 * HOUR)
+
+    assert client.calls == [(T0 + HOUR, T0 + 2 * HOUR), (T0, T0 + HOUR), (T0 + 2 * HOUR, T0 + 3 * HOUR)]
+    assert buckets.coverage('sensor.a') == (T0, T0 + 3 * HOUR)
+    assert buckets.total('sensor.a', T0, T0 + 3 * HOUR) == pytest.approx(3.0)
+    assert [hour for hour, _ in buckets.hourly('sensor.a', T0 + HOUR, T0 + 3 * HOUR)] == \
+        [T0 + HOUR, T0 + 2 * HOUR]
+
+
+def test_buckets_restart_on_disjoint_range():
+    buckets = HourlyEnergyBuckets(FakeHistoryClient())
+    buckets.ingest('sensor.a', [(T0, 1000.0)], T0, T0 + HOUR)
+    buckets.ingest('sensor.a', [(T0 + 5 * HOUR, 2000.0)], T0 + 5 * HOUR, T0 + 6 * HOUR)
+    assert buckets.coverage('sensor.a') == (T0 + 5 * HOUR, T0 + 6 * HOUR)
+    assert buckets.total('sensor.a', T0, T0 + 6 * HOUR) == pytest.approx(2.0)
+
+
+def test_buckets_expire_after_retention():
+    buckets = HourlyEnergyBuckets(FakeHistoryClient(), retention_hours=2)
+    buckets.ingest('sensor.a', [(T0, 1000.0)], T0, T0 + 4 * HOUR)
+    assert buckets.coverage('sensor.a') == (T0 + 2 * HOUR, T0 + 4 * HOUR)
+    assert buckets.total('sensor.a', T0, T0 + 4 * HOUR) == pytest.approx(2.0)
+
+
+def test_stats_merge_hourly_sketches_into_groups():
+    buckets = HourlyEnergyBuckets(FakeHistoryClient())
+    buckets.ingest('sensor.a', [(T0, 100.0), (T0 + HOUR, 300.0)], T0, T0 + 2 * HOUR)
+    (key, sketch), = buckets.stats('sensor.a', T0, T0 + 2 * HOUR, group=lambda hour: 'all')
+    assert key == 'all'
+    assert sketch.min == 100.0 and sketch.max == 300.0
+    assert buckets.stats('sensor.missing', T0, T0 + HOUR) == []
+
+
+class FakeChangingClient:
+    """Sensor stepping through fixed readings, with the held state restated
+    at the start of every queried range as Home Assistant does"""
+
+    def __init__(self, changes):
+        self.changes = changes
+
+    def get_history(self, entity_id, start_time, end_time=None):
+        start = datetime.fromisoformat(start_time).timestamp()
+        end = datetime.fromisoformat(end_time).timestamp()
+        held = [state for ts, state in self.changes if ts <= start]
+        entries = [{'state': held[-1], 'last_changed': start_time}] if held else []
+        entries += [{'state': state, 'last_changed': iso(ts)} for ts, state in self.changes if start < ts < end]
+        return entries
+
+
+# 1 kW for 50 minutes, then ten 0 W readings in the last 10 minutes of each hour
+CHANGES = [(T0 + hour * HOUR + offset, '1000' if offset == 0 else '0')
+           for hour in range(3) for offset in [0] + list(range(3000, 3600, 60))]
+
+
+def test_mean_power_is_weighted_by_time():
+    buckets = HourlyEnergyBuckets(FakeChangingClient(CHANGES))
+    buckets.ensure('sensor.a', T0, T0 + 3 * HOUR)
+
+    means = buckets.mean_power('sensor.a', T0, T0 + 3 * HOUR)
+    assert means == {T0 + hour * HOUR: pytest.approx(1000 * 50 / 60) for hour in range(3)}
+    # ...while most samples are 0 W
+    assert buckets.stats('sensor.a', T0, T0 + HOUR)[0][1].mean < 100
+
+
+def test_mean_power_of_partly_covered_hour():
+    buckets = HourlyEnergyBuckets(FakeHistoryClient())
+    buckets.ensure('sensor.a', T0 + HOUR / 2, T0 + HOUR)
+    assert buckets.mean_power('sensor.a', T0, T0 + HOUR) == {T0: pytest.approx(1000.0)}
+
+
+def test_incremental_updates_match_a_single_pass():
+    once = HourlyEnergyBuckets(FakeChangingClient(CHANGES))
+    once.ensure('sensor.a', T0, T0 + 3 * HOUR)
+
+    stepwise = HourlyEnergyBuckets(FakeChangingClient(CHANGES))
+    for end in range(T0 + 600, T0 + 3 * HOUR + 1, 600):
+        stepwise.ensure('sensor.a', T0, end)
+
+    def summaries(buckets):
+        return [(hour, sketch.count, sketch.min, sketch.max, sketch.mean)
+                for hour, sketch in buckets.stats('sensor.a', T0, T0 + 3 * HOUR)]
+
+    assert summaries(stepwise) == summaries(once)
+    assert stepwise.mean_power('sensor.a', T0, T0 + 3 * HOUR) == \
+        pytest.approx(once.mean_power('sensor.a', T0, T0 + 3 * HOUR))
+
+
+def test_held_reading_is_added_once_per_hour_boundary():
+    buckets = HourlyEnergyBuckets(FakeHistoryClient())
+    # The constant sensor only reports at the start of the first query
+    for end in (T0 + HOUR / 2, T0 + HOUR, T0 + 3 * HOUR / 2, T0 + 2 * HOUR):
+        buckets.ingest('sensor.a', [(T0, 1000.0)], T0, end)
+    counts = [sketch.count for _, sketch in buckets.stats('sensor.a', T0, T0 + 2 * HOUR)]
+    assert counts == [1, 1]
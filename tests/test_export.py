@@ -0,0 +1,109 @@
+"""Tests for the streaming history export"""
+from datetime import datetime, timezone
+import csv
+import io
+import json
+
+import pytest
+
+from services.export import ExportError, csv_stream, export_stream, iter_history
+
+HOUR = 3600
+T0 = 1_772_323_200
+
+
+def iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+class FakeHistoryClient:
+    """Serves fixed state changes the way Home Assistant does, repeating
+    each entity's current state at the start of every queried range"""
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.calls = 0
+
+    def get_history_batch(self, entity_ids, start_time, end_time):
+        self.calls += 1
+        start = datetime.fromisoformat(start_time).timestamp()
+        end = datetime.fromisoformat(end_time).timestamp()
+        histories = {}
+        for entity_id in entity_ids:
+            changes = self.changes[entity_id]
+            before = [state for ts, state in changes if ts <= start]
+            entries = [{'state': before[-1], 'last_changed': iso(start)}] if before else []
+            entries += [{'state': state, 'last_changed': iso(ts)} for ts, state in changes if start < ts < end]
+            histories[entity_id] = entries
+        return histories
+
+
+CHANGES = {
+    'sensor.a': [(T0, '100'), (T0 + 2 * HOUR, '150')],
+    'sensor.b': [(T0 + HOUR, 'unavailable'), (T0 + 2 * HOUR + 60, '7.5')],
+}
+
+
+def test_rows_are_merged_in_time_order_without_slice_repeats():
+    client = FakeHistoryClient(CHANGES)
+    rows = list(iter_history(client, list(CHANGES), T0, T0 + 4 * HOUR, slice_hours=1))
+
+    assert client.calls == 4
+    assert [(row['entity_id'], row['timestamp'], row['state']) for row in rows] == [
+        ('sensor.a', iso(T0), '100'),
+        ('sensor.b', iso(T0 + HOUR), 'unavailable'),
+        ('sensor.a', iso(T0 + 2 * HOUR), '150'),
+        ('sensor.b', iso(T0 + 2 * HOUR + 60), '7.5'),
+    ]
+    assert [row['value'] for row in rows] == [100.0, None, 150.0, 7.5]
+
+
+def test_export_is_lazy():
+    client = FakeHistoryClient(CHANGES)
+    stream = export_stream(client, list(CHANGES), T0, T0 + 4 * HOUR, 'csv', slice_hours=1)
+    assert client.calls == 0
+    next(stream)
+    assert client.calls == 0
+    next(stream)
+    assert client.calls == 4
+
+
+def test_csv_export():
+    client = FakeHistoryClient(CHANGES)
+    text = ''.join(export_stream(client, ['sensor.b'], T0, T0 + 4 * HOUR, 'csv'))
+    assert list(csv.reader(io.StringIO(text))) == [
+        ['entity_id', 'timestamp', 'state', 'value'],
+        ['sensor.b', iso(T0 + HOUR), 'unavailable', ''],
+        ['sensor.b', iso(T0 + 2 * HOUR + 60), '7.5', '7.5'],
+    ]
+
+
+def test_csv_stream_batches_rows():
+    rows = [{'entity_id': 'sensor.a', 'timestamp': iso(T0 + i), 'state': str(i), 'value': float(i)}
+            for i in range(5)]
+    chunks = list(csv_stream(rows, batch_size=2))
+    assert len(chunks) == 4
+    assert chunks[0] == 'entity_id,timestamp,state,value\r\n'
+
+
+def test_ndjson_export():
+    client = FakeHistoryClient(CHANGES)
+    text = ''.join(export_stream(client, ['sensor.a'], T0, T0 + 4 * HOUR, 'ndjson'))
+    rows = [json.loads(line) for line in text.splitlines()]
+    assert [row['value'] for row in rows] == [100.0, 150.0]
+
+
+def test_parquet_export():
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.parquet
+
+    client = FakeHistoryClient(CHANGES)
+    data = b''.join(export_stream(client, list(CHANGES), T0, T0 + 4 * HOUR, 'parquet'))
+    table = pyarrow.parquet.read_table(pyarrow.BufferReader(data))
+    assert table.column_names == ['entity_id', 'timestamp', 'state', 'value']
+    assert table.num_rows == 4
+
+
+def test_unknown_format():
+    with pytest.raises(ExportError):
+        export_stream(FakeHistoryClient(CHANGES), ['sensor.a'], T0, T0 + HOUR, 'xlsx')
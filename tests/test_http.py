@@ -0,0 +1,113 @@
+"""Tests for ETags, 304 responses and response compression"""
+import gzip
+
+import pytest
+
+import app as dashboard
+from utils import http
+
+
+@pytest.fixture
+def client(make_app, monkeypatch):
+    application = make_app(RENDER_CACHE_SIZE=0, STATIC_FINGERPRINTS=False)
+    rendered = []
+
+    def render_template(template, **context):
+        rendered.append(template)
+        return original(template, **context)
+
+    original = dashboard.render_template
+    monkeypatch.setattr(dashboard, 'render_template', render_template)
+    client = application.test_client()
+    client.rendered = rendered
+    client.services = application.extensions['energy_dashboard']
+    return client
+
+
+def test_data_etag_depends_on_every_part():
+    assert http.data_etag('r1', '/overview?', 't1') == http.data_etag('r1', '/overview?', 't1')
+    assert http.data_etag('r1', '/overview?', 't1') != http.data_etag('r1', '/overview?', 't2')
+    assert http.data_etag('r1', '/overview?', 't1') != http.data_etag('r1', '/costs?', 't1')
+
+
+def test_matching_etag_gets_304_without_rendering(client):
+    response = client.get('/overview')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    assert client.rendered == ['overview.html']
+
+    cached = client.get('/overview', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert cached.data == b''
+    assert client.rendered == ['overview.html']
+
+
+def test_api_etag(client):
+    etag = client.get('/api/realtime').headers['ETag']
+    assert client.get('/api/realtime', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_new_data_changes_etag(client):
+    etag = client.get('/overview').headers['ETag']
+    client.services.data_processor.clear_cache()
+
+    response = client.get('/overview', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_settings_change_changes_etag(client):
+    etag = client.get('/costs').headers['ETag']
+    client.services.settings.update({'CURRENCY_SYMBOL': '€'})
+
+    response = client.get('/costs', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert '€' in response.get_data(as_text=True)
+
+
+def test_responses_without_data_version_hash_the_body(client):
+    etag = client.get('/settings').headers['ETag']
+    assert client.get('/settings', headers={'If-None-Match': etag}).status_code == 304
+
+
+@pytest.mark.parametrize('accept, encoding', [
+    ('gzip', 'gzip'),
+    ('br, gzip', 'br' if http.brotli is not None else 'gzip'),
+    ('identity', None),
+])
+def test_compression_follows_accept_encoding(client, accept, encoding):
+    response = client.get('/overview', headers={'Accept-Encoding': accept})
+    assert response.status_code == 200
+    assert response.headers.get('Content-Encoding') == encoding
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    body = response.data
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'br':
+        body = http.brotli.decompress(body)
+    assert b'</html>' in body
+
+
+def test_small_bodies_are_not_compressed(client):
+    response = client.get('/ready', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streamed_export_is_left_alone(client):
+    response = client.get('/api/export?period=1h&entity_id=sensor.heater_power',
+                          headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert 'Content-Encoding' not in response.headers
+    assert 'ETag' not in response.headers
+    assert response.get_data(as_text=True).startswith('entity_id,timestamp,state,value')
+
+
+def test_static_files_are_passed_through(client):
+    response = client.get('/static/css/custom.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    response.close()
@@ -0,0 +1,123 @@
+"""Tests for the incremental usage insights"""
+import math
+import random
+import statistics
+
+import pytest
+
+from services.insights import (ALWAYS_ON_HOURS, ANOMALY_HOLD, EWMA_TAU, FLOOR_TAU, MIN_SAMPLES,
+                               InsightsEngine, RunningStats)
+
+
+def fixed_series(count=500, seed=7):
+    """Irregularly spaced (epoch seconds, watts) samples, the same on every run"""
+    rng = random.Random(seed)
+    series = []
+    ts = 1_772_323_200.0
+    for _ in range(count):
+        ts += rng.uniform(10, 600)
+        series.append((ts, rng.choice([0.0, 5.0, 60.0, 1200.0]) + rng.gauss(0, 3)))
+    return series
+
+
+SERIES = fixed_series()
+
+
+def running(series):
+    stats = RunningStats('Device')
+    for ts, value in series:
+        stats.update(ts, value)
+    return stats
+
+
+def test_welford_matches_batch_mean_and_variance():
+    stats = running(SERIES)
+    values = [value for _, value in SERIES]
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(statistics.fmean(values), rel=1e-12)
+    assert stats.std == pytest.approx(statistics.stdev(values), rel=1e-12)
+
+
+def test_welford_is_stable_for_large_offsets():
+    values = [1e9 + value for value in (4.0, 7.0, 13.0, 16.0)]
+    stats = running(enumerate(values))
+    assert stats.std == pytest.approx(statistics.stdev(values), rel=1e-9)
+
+
+def test_ewma_matches_batch_weighting():
+    stats = running(SERIES)
+
+    # Every sample's weight decays with the time elapsed after it
+    first_ts, first = SERIES[0]
+    expected = first * math.exp(-(SERIES[-1][0] - first_ts) / EWMA_TAU)
+    for (previous_ts, _), (ts, value) in zip(SERIES, SERIES[1:]):
+        weight = 1 - math.exp(-(ts - previous_ts) / EWMA_TAU)
+        expected += value * weight * math.exp(-(SERIES[-1][0] - ts) / EWMA_TAU)
+    assert stats.ewma == pytest.approx(expected, rel=1e-9)
+
+
+def test_standby_floor_drops_at_once_and_rises_slowly():
+    stats = running([(0, 100.0), (60, 8.0)])
+    assert stats.floor == 8.0
+
+    # Held at 20 W for a day: the floor closes 1 - e^(-1/7) of the gap
+    for minute in range(1, 24 * 60 + 1):
+        stats.update(60 + minute * 60, 20.0)
+    expected = 20.0 - (20.0 - 8.0) * math.exp(-86400 / FLOOR_TAU)
+    assert stats.floor == pytest.approx(expected, rel=1e-9)
+    assert stats.floor < 10
+
+
+def test_zscore_waits_for_enough_samples():
+    stats = running([(i * 60, 100.0 + i % 2) for i in range(MIN_SAMPLES - 1)])
+    assert stats.zscore(500.0) is None
+    stats.update(MIN_SAMPLES * 60, 100.0)
+    assert stats.zscore(500.0) > 100
+
+
+def feed(engine, hours, device_power, start=1_772_323_200.0, step=300):
+    for i in range(int(hours * 3600 / step)):
+        ts = start + i * step
+        hour = int(ts // 3600) % 24
+        power = device_power(i, hour)
+        engine.observe(ts, hour, power + 100, {'sensor.fridge': ('Fridge', power)})
+    return ts
+
+
+def test_anomaly_is_reported_and_expires():
+    engine = InsightsEngine()
+    last = feed(engine, 12, lambda i, hour: 80.0 + i % 3)
+    engine.observe(last + 300, 0, 2100, {'sensor.fridge': ('Fridge', 2000.0)})
+
+    anomalies = [insight for insight in engine.insights(last + 300) if insight['type'] == 'anomaly']
+    assert [insight['entity_id'] for insight in anomalies] == ['sensor.fridge']
+    assert not any(insight['type'] == 'anomaly' for insight in engine.insights(last + 300 + ANOMALY_HOLD + 1))
+
+
+def test_always_on_and_peak_hours():
+    engine = InsightsEngine()
+    feed(engine, ALWAYS_ON_HOURS * 2, lambda i, hour: 30.0 + (500 if 18 <= hour < 20 else 0))
+    by_type = {insight['type']: insight for insight in engine.insights(0)}
+
+    assert 'Fridge (30 W)' in by_type['always_on']['message']
+    assert 'between 18:00 and 20:00' in by_type['peak_hours']['message']
+    assert 'base_load' in by_type
+
+
+def test_samples_closer_than_min_interval_are_one_observation():
+    engine = InsightsEngine()
+    engine.observe(1000, 0, 100, {'sensor.a': ('A', 10.0)})
+    engine.observe(1001, 0, 100, {'sensor.a': ('A', 10.0)})
+    assert engine.devices['sensor.a'].count == 1
+
+
+def test_state_round_trip():
+    engine = InsightsEngine()
+    feed(engine, 6, lambda i, hour: 40.0 + i % 5)
+    restored = InsightsEngine()
+    restored.restore(engine.state())
+
+    original, copy = engine.devices['sensor.fridge'], restored.devices['sensor.fridge']
+    assert (copy.count, copy.mean, copy.m2, copy.ewma, copy.floor) == \
+        (original.count, original.mean, original.m2, original.ewma, original.floor)
+    assert list(restored.hour_mean) == list(engine.hour_mean)
@@ -0,0 +1,108 @@
+"""Tests for the non-blocking logging pipeline"""
+from logging.handlers import QueueListener
+import logging
+import queue
+import threading
+
+import pytest
+
+from utils import logger as logging_setup
+from utils.logger import NonBlockingQueueHandler, RateLimitFilter
+
+
+def record(msg, *args, name='services.test', level=logging.WARNING):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(logging_setup.time, 'monotonic', clock)
+    return clock
+
+
+def test_rate_limit_passes_a_burst_per_interval(clock):
+    limit = RateLimitFilter(burst=3, interval=60)
+    passed = [limit.filter(record('API error: %s', i)) for i in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+
+    clock.now += 60
+    late = record('API error: %s', 'timeout')
+    assert limit.filter(late)
+    assert late.getMessage() == 'API error: timeout (suppressed 7 similar messages)'
+
+
+def test_rate_limit_groups_by_template_logger_and_level(clock):
+    limit = RateLimitFilter(burst=1, interval=60)
+    assert limit.filter(record('API error: %s', 1))
+    assert not limit.filter(record('API error: %s', 2))
+    assert limit.filter(record('Cache miss: %s', 1))
+    assert limit.filter(record('API error: %s', 1, name='app'))
+    assert limit.filter(record('API error: %s', 1, level=logging.ERROR))
+
+
+def test_prepare_formats_in_calling_thread():
+    formatted_in = []
+
+    class Lazy:
+        value = 'before'
+
+        def __str__(self):
+            formatted_in.append(threading.current_thread().name)
+            return self.value
+
+    handler = NonBlockingQueueHandler(queue.Queue())
+    lazy = Lazy()
+    handler.handle(record('value is %s', lazy))
+    lazy.value = 'after'
+
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == 'value is before'
+    assert queued.args is None
+    assert formatted_in == [threading.current_thread().name]
+
+
+def test_prepare_leaves_the_original_record_alone():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    original = record('%s + %s', 1, 2)
+    handler.handle(original)
+    assert original.args == (1, 2)
+    assert handler.queue.get_nowait().msg == '1 + 2'
+
+
+def test_full_queue_drops_records():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    for i in range(3):
+        handler.handle(record('message %s', i))
+    assert handler.dropped == 2
+    assert handler.queue.get_nowait().msg == 'message 0'
+
+
+def test_listener_writes_records_off_thread():
+    written = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            written.append((threading.current_thread().name, self.format(record)))
+
+    log_queue = queue.Queue()
+    capture = Capture()
+    capture.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    listener = QueueListener(log_queue, capture)
+    listener.start()
+    try:
+        NonBlockingQueueHandler(log_queue).handle(record('Opening circuit after %d failures', 5))
+    finally:
+        listener.stop()
+
+    [(thread, line)] = written
+    assert line == 'WARNING: Opening circuit after 5 failures'
+    assert thread != threading.current_thread().name
@@ -0,0 +1,112 @@
+"""Tests for the compact internal data types"""
+from array import array
+from datetime import datetime
+import json
+
+import pytest
+
+from services.models import DeviceCost, RingSeries, SensorReading, Series, TimeLabels, to_json
+
+
+def state(value, unit='W', name='Heater'):
+    return {'entity_id': 'sensor.heater_power', 'state': value,
+            'attributes': {'friendly_name': name, 'unit_of_measurement': unit}}
+
+
+def test_from_state():
+    reading = SensorReading.from_state(state('1500.5'))
+    assert (reading.entity_id, reading.name, reading.unit, reading.state) == \
+        ('sensor.heater_power', 'Heater', 'W', '1500.5')
+    assert reading.power == 1500.5
+
+
+def test_from_state_converts_kilowatts():
+    reading = SensorReading.from_state(state('1.25', unit='kW'))
+    assert reading.value == 1.25
+    assert reading.power == 1250.0
+
+
+@pytest.mark.parametrize('value', ['unavailable', 'unknown', None, 'on', ''])
+def test_from_state_invalid_values(value):
+    reading = SensorReading.from_state(state(value))
+    assert reading.value is None
+    assert reading.power == 0.0
+    assert reading.state == value
+
+
+def test_from_state_without_attributes():
+    reading = SensorReading.from_state({'entity_id': 'sensor.bare', 'state': '5'})
+    assert reading.name == 'sensor.bare'
+    assert reading.unit is None
+    assert reading.to_json()['unit'] == 'W'
+
+
+def test_series_rounds_float32_noise():
+    series = Series()
+    series.append(1000.0, 230.1)
+    series.append(1060.0, 0.1)
+    assert series.values[0] != 230.1
+    assert series.to_json() == {'timestamps': [1000.0, 1060.0], 'values': [230.1, 0.1]}
+    assert series.max() == pytest.approx(230.1)
+    assert Series().max() == 0.0
+
+
+def test_float64_arrays_are_not_rounded():
+    assert to_json(array('d', [0.123456789])) == [0.123456789]
+
+
+def test_time_labels_are_formatted_lazily():
+    ts = datetime(2026, 3, 2, 14, 5).timestamp()
+    labels = TimeLabels(array('d', [ts]), '%H:%M')
+    assert len(labels) == 1
+    assert to_json(labels) == ['14:05']
+
+
+def test_ring_series_wraps_around():
+    ring = RingSeries(3)
+    for i in range(5):
+        ring.record(1000 + i, {'a': float(i)})
+    assert len(ring) == 3
+    assert ring.to_json() == {'timestamps': [1002, 1003, 1004], 'series': {'a': [2.0, 3.0, 4.0]}}
+
+
+def test_ring_series_gaps_and_new_keys():
+    ring = RingSeries(4)
+    ring.record(1000, {'a': 1.0})
+    ring.record(1001, {'a': 2.0, 'b': 10.0})
+    ring.record(1002, {'b': 11.0})
+    assert ring.to_json()['series'] == {'a': [1.0, 2.0, None], 'b': [None, 10.0, 11.0]}
+
+
+def test_ring_series_drops_keys_missing_for_a_window():
+    ring = RingSeries(3)
+    ring.record(1000, {'a': 1.0, 'b': 1.0})
+    for i in range(1, 3):
+        ring.record(1000 + i, {'b': 1.0})
+    assert 'a' in ring.values
+    ring.record(1003, {'b': 1.0})
+    assert 'a' not in ring.values
+    assert list(ring.to_json()['series']) == ['b']
+
+
+def test_ring_series_selected_keys():
+    ring = RingSeries(2)
+    ring.record(1000, {'a': 1.0, 'b': 2.0})
+    assert ring.to_json(keys=['b', 'missing'])['series'] == {'b': [2.0]}
+
+
+def test_to_json_hook():
+    reading = SensorReading('sensor.a', 'A', 'W', '12', 12.0, room='Hall')
+    cost = DeviceCost(reading, 0.5, 15.0)
+    text = json.dumps({'reading': reading, 'cost': cost}, default=to_json)
+    assert json.loads(text) == {
+        'reading': {'id': 'sensor.a', 'entity_id': 'sensor.a', 'name': 'A', 'room': 'Hall',
+                    'power': 12.0, 'unit': 'W', 'state': '12'},
+        'cost': {'name': 'A', 'room': 'Hall', 'power': 12.0, 'daily_cost': 0.5, 'monthly_cost': 15.0}
+    }
+
+
+@pytest.mark.parametrize('obj', [object(), {1, 2}, datetime(2026, 1, 1)])
+def test_to_json_rejects_unknown_types(obj):
+    with pytest.raises(TypeError):
+        to_json(obj)
@@ -0,0 +1,97 @@
+"""Tests for device page prefetching"""
+import time
+
+from services.circuit_breaker import CircuitBreaker
+from services.prefetch import Prefetcher
+
+
+class FakeClient:
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+
+
+class FakeProcessor:
+    """Cache of device views; refresh() renews an entry unless told to fail"""
+
+    def __init__(self, top=(), ttl=60):
+        self.ha_client = FakeClient()
+        self.top = list(top)
+        self.ttl = ttl
+        self.expiry = {}
+        self.failing = set()
+        self.refreshed = []
+
+    def peek(self, key):
+        if key == 'overview' and self.top:
+            return {'top_consumers': [{'entity_id': entity_id} for entity_id in self.top]}
+        return None
+
+    def expires_in(self, key):
+        expiry = self.expiry.get(key)
+        return None if expiry is None else expiry - time.time()
+
+    def refresh(self, key, force=False):
+        self.refreshed.append(key)
+        if key not in self.failing:
+            self.expiry[key] = time.time() + self.ttl
+
+
+def make_prefetcher(processor, **kwargs):
+    prefetcher = Prefetcher(processor, **kwargs)
+    prefetcher.note_activity()
+    return prefetcher
+
+
+def test_candidates_put_top_consumers_before_recent_views():
+    prefetcher = make_prefetcher(FakeProcessor(top=['sensor.a', 'sensor.b']), top_n=1)
+    prefetcher.note_view('sensor.c')
+    prefetcher.note_view('sensor.a')
+    prefetcher.note_view('sensor.d')
+    assert prefetcher.candidates() == ['sensor.a', 'sensor.d', 'sensor.c']
+
+
+def test_recent_views_expire():
+    prefetcher = make_prefetcher(FakeProcessor(), recent_window=60)
+    prefetcher.note_view('sensor.a')
+    prefetcher._recent['sensor.a'] -= 120
+    prefetcher.note_view('sensor.b')
+    assert prefetcher.candidates() == ['sensor.b']
+
+
+def test_refreshes_missing_and_expiring_views_only():
+    processor = FakeProcessor(top=['sensor.a', 'sensor.b'])
+    processor.expiry['device_sensor.b'] = time.time() + 600
+    prefetcher = make_prefetcher(processor)
+
+    assert prefetcher.run_once() == {'sensor.a': 'ok', 'sensor.b': 'warm'}
+    assert processor.refreshed == ['device_sensor.a']
+
+
+def test_failed_refresh_keeping_old_entry_counts_as_stale():
+    processor = FakeProcessor(top=['sensor.a'])
+    processor.failing.add('device_sensor.a')
+    processor.expiry['device_sensor.a'] = time.time() + 5
+    prefetcher = make_prefetcher(processor)
+
+    assert prefetcher.run_once() == {'sensor.a': 'stale'}
+    assert prefetcher.stats['failed'] == 1
+    assert prefetcher.stats['prefetched'] == 0
+
+
+def test_budget_defers_refreshes():
+    processor = FakeProcessor(top=['sensor.a', 'sensor.b', 'sensor.c'])
+    prefetcher = make_prefetcher(processor, budget=4)
+    results = prefetcher.run_once()
+    assert results == {'sensor.a': 'ok', 'sensor.b': 'ok', 'sensor.c': 'deferred'}
+
+
+def test_pauses_while_idle_or_circuit_open():
+    processor = FakeProcessor(top=['sensor.a'])
+    idle = Prefetcher(processor, idle_after=300)
+    assert idle.run_once() == {}
+    assert idle.stats['idle'] == 1
+
+    processor.ha_client.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    processor.ha_client.breaker.record_failure()
+    assert make_prefetcher(processor).run_once() == {}
+    assert processor.refreshed == []
@@ -0,0 +1,98 @@
+"""Tests for the sampling profiler and the /debug/profile endpoint"""
+import threading
+import time
+
+import pytest
+
+from utils import profiler as profiling
+from utils.profiler import ProfilerBusyError, SamplingProfiler
+
+TOKEN = 's3cret-token'
+PROFILE = '/debug/profile?seconds=0.1&interval_ms=5'
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_profiler_samples_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+    worker.start()
+    try:
+        profiler = SamplingProfiler(interval=0.002)
+        stacks = profiler.run(0.1)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profiler.samples > 5
+    busy = [stack for stack in stacks if stack.startswith('busy-worker;')]
+    assert busy and all('test_profiler.py:busy_loop' in stack for stack in busy)
+    for line in profiler.collapsed().splitlines():
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+
+
+def test_idle_threads_are_skipped_by_default():
+    stop = threading.Event()
+    waiter = threading.Thread(target=stop.wait, name='idle-waiter')
+    waiter.start()
+    try:
+        quiet = SamplingProfiler(interval=0.005).run(0.05)
+        everything = SamplingProfiler(interval=0.005, include_idle=True).run(0.05)
+    finally:
+        stop.set()
+        waiter.join()
+
+    assert not any(stack.startswith('idle-waiter;') for stack in quiet)
+    assert any(stack.startswith('idle-waiter;') for stack in everything)
+
+
+def test_one_profile_at_a_time():
+    with profiling._profile_lock:
+        with pytest.raises(ProfilerBusyError):
+            SamplingProfiler().run(0.01)
+
+
+@pytest.fixture
+def client(make_app):
+    return make_app(DEBUG_TOKEN=TOKEN).test_client()
+
+
+def test_endpoint_hidden_without_token(make_app):
+    assert make_app().test_client().get(PROFILE, headers={'X-Debug-Token': ''}).status_code == 404
+
+
+@pytest.mark.parametrize('query, headers', [
+    ('', {}),
+    (f'&token={TOKEN}', {}),
+    (f'&debug_token={TOKEN}', {}),
+    ('', {'X-Debug-Token': 'wrong'}),
+    ('', {'X-Debug-Token': TOKEN[:-1]}),
+])
+def test_endpoint_refuses_missing_or_wrong_header(client, query, headers):
+    response = client.get(PROFILE + query, headers=headers)
+    assert response.status_code == 403
+
+
+def test_endpoint_profiles_with_header_token(client):
+    started = time.monotonic()
+    response = client.get(PROFILE, headers={'X-Debug-Token': TOKEN})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    assert int(response.headers['X-Profile-Samples']) > 0
+    assert 'attachment; filename=profile-' in response.headers['Content-Disposition']
+    assert time.monotonic() - started < 2
+
+
+def test_endpoint_rejects_bad_parameters(client):
+    response = client.get('/debug/profile?seconds=soon', headers={'X-Debug-Token': TOKEN})
+    assert response.status_code == 400
+
+
+def test_endpoint_reports_running_profile(client):
+    with profiling._profile_lock:
+        response = client.get(PROFILE, headers={'X-Debug-Token': TOKEN})
+    assert response.status_code == 409
@@ -0,0 +1,95 @@
+"""Tests for recording and replaying Home Assistant traffic"""
+from datetime import datetime, timedelta, timezone
+import gzip
+import json
+import time
+
+import pytest
+
+from services.home_assistant import HomeAssistantClient
+from services.recording import ReplayMiss, ReplayTransport, RecordingTransport, request_key
+
+NOW = datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+
+
+def client(transport):
+    return HomeAssistantClient('http://ha.test', 'token', retries=0, transport=transport)
+
+
+def history(ha, hours, end=NOW):
+    return ha.get_history('sensor.heater_power', (end - timedelta(hours=hours)).isoformat(), end.isoformat())
+
+
+@pytest.fixture
+def archive(tmp_path, fake_ha):
+    """Archive recording the states and a 24 hour history query"""
+    path = str(tmp_path / 'ha.jsonl.gz')
+    recorder = RecordingTransport(path, 'http://ha.test', transport=fake_ha)
+    ha = client(recorder)
+    ha.get_states()
+    history(ha, 24)
+    recorder.close()
+    assert recorder.count == 2
+    return path
+
+
+def test_request_key_ignores_timestamps_but_keeps_spans():
+    params = {'filter_entity_id': 'sensor.a', 'end_time': '2026-03-02T12:00:00+00:00'}
+    shape, spans = request_key('GET', 'history/period/2026-03-01T12:00:00+00:00', params)
+    later_shape, later_spans = request_key(
+        'GET', 'history/period/2026-03-05T08:30:00+00:00',
+        {'filter_entity_id': 'sensor.a', 'end_time': '2026-03-06T08:30:00+00:00'})
+
+    assert shape == later_shape == 'GET history/period/*?end_time=*&filter_entity_id=sensor.a'
+    assert spans == later_spans == (1440,)
+    assert request_key('GET', 'states', None) == ('GET states?', ())
+
+
+def test_replay_round_trip(archive, fake_ha):
+    replay = ReplayTransport(archive, shift_time=False)
+    ha = client(replay)
+
+    assert {state['entity_id']: state['state'] for state in ha.get_states()} == fake_ha.states
+
+    # Same request shape and span at another time
+    entries = history(ha, 24, end=NOW + timedelta(days=3))
+    assert len(entries) == 24 * 6
+    assert entries[0]['last_changed'] == (NOW - timedelta(hours=24)).isoformat()
+    assert replay.misses == 0
+
+
+def test_replay_uses_nearest_recorded_span(archive):
+    replay = ReplayTransport(archive, shift_time=False)
+    assert len(history(client(replay), 20)) == 24 * 6
+
+
+def test_replay_miss_for_unknown_request(archive):
+    replay = ReplayTransport(archive, shift_time=False)
+    with pytest.raises(ReplayMiss):
+        replay('GET', 'http://ha.test/api/states/sensor.heater_power')
+    assert replay.misses == 1
+
+
+def test_replay_shifts_timestamps(tmp_path):
+    path = tmp_path / 'old.jsonl.gz'
+    recorded = time.time() - 3600
+    stamp = datetime.fromtimestamp(recorded, timezone.utc)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'version': 1, 'recorded': recorded, 'base_url': 'http://ha.test'}) + '\n')
+        f.write(json.dumps({'method': 'GET', 'endpoint': 'states', 'params': None, 'status': 200,
+                            'elapsed': 0.01, 'content_type': 'application/json',
+                            'body': json.dumps([{'entity_id': 'sensor.a', 'last_changed': stamp.isoformat()}])})
+                + '\n')
+
+    shifted = client(ReplayTransport(str(path))).get_states()[0]['last_changed']
+    unshifted = client(ReplayTransport(str(path), shift_time=False)).get_states()[0]['last_changed']
+    assert datetime.fromisoformat(unshifted) == stamp
+    assert (datetime.fromisoformat(shifted) - stamp).total_seconds() == pytest.approx(3600, abs=5)
+
+
+def test_replay_rejects_other_versions(tmp_path):
+    path = tmp_path / 'future.jsonl.gz'
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'version': 99, 'recorded': 0}) + '\n')
+    with pytest.raises(ValueError):
+        ReplayTransport(str(path))
@@ -0,0 +1,84 @@
+"""Tests for the rendered page cache"""
+import pytest
+
+import app as dashboard
+from utils.render_cache import LRUCache, PageCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_zero_entries_disables_cache():
+    cache = PageCache(max_entries=0)
+    data = {'timestamp': 't1'}
+    cache.store('overview', data, 'settings', '<html>')
+    assert cache.lookup('overview', data, 'settings') is None
+
+
+def test_page_hit_needs_same_data_object_and_settings():
+    cache = PageCache()
+    data = {'timestamp': 't1'}
+    cache.store('overview', data, 'settings', '<html>')
+
+    assert cache.lookup('overview', data, 'settings') == '<html>'
+    assert cache.lookup('overview', {'timestamp': 't1'}, 'settings') is None
+    assert cache.lookup('overview', data, 'other settings') is None
+    assert cache.lookup('costs', data, 'settings') is None
+
+
+def test_clear():
+    cache = PageCache()
+    data = {}
+    cache.store('overview', data, 'settings', '<html>')
+    cache.clear()
+    assert cache.lookup('overview', data, 'settings') is None
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    templates = []
+    original = dashboard.render_template
+
+    def render_template(template, **context):
+        templates.append(template)
+        return original(template, **context)
+
+    monkeypatch.setattr(dashboard, 'render_template', render_template)
+    return templates
+
+
+def test_pages_are_rendered_once_per_data_generation(make_app, rendered):
+    application = make_app(ETAGS=False)
+    services = application.extensions['energy_dashboard']
+    client = application.test_client()
+
+    first = client.get('/overview').data
+    assert client.get('/overview').data == first
+    assert rendered == ['overview.html']
+
+    services.data_processor.clear_cache()
+    client.get('/overview')
+    assert rendered == ['overview.html'] * 2
+
+    # Same view data, other settings
+    data = services.data_processor.peek('overview')
+    services.settings.update({'CURRENCY_SYMBOL': '€'})
+    client.get('/overview')
+    assert services.data_processor.peek('overview') is data
+    assert rendered == ['overview.html'] * 3
+
+
+def test_render_cache_can_be_turned_off(make_app, rendered):
+    client = make_app(ETAGS=False, RENDER_CACHE_SIZE=0).test_client()
+    client.get('/overview')
+    client.get('/overview')
+    assert rendered == ['overview.html'] * 2
@@ -0,0 +1,92 @@
+"""Tests for the runtime settings store"""
+import json
+
+import pytest
+
+from services.settings_store import SettingsStore
+
+DEFAULTS = {'ELECTRICITY_RATE': 0.15, 'CURRENCY_SYMBOL': '$', 'CACHE_TTL': 60, 'HA_URL': 'http://ha'}
+
+
+def make_store(tmp_path, **kwargs):
+    return SettingsStore(str(tmp_path / 'settings.json'), DEFAULTS, check_interval=0, **kwargs)
+
+
+def test_defaults_only_cover_runtime_settings(tmp_path):
+    store = make_store(tmp_path)
+    assert store.values() == {'ELECTRICITY_RATE': 0.15, 'CURRENCY_SYMBOL': '$', 'CACHE_TTL': 60}
+    assert store.version == 0
+
+
+def test_update_parses_persists_and_notifies(tmp_path):
+    store = make_store(tmp_path)
+    notified = []
+    store.subscribe(notified.append)
+
+    changed = store.update({'ELECTRICITY_RATE': '0.3', 'CURRENCY_SYMBOL': '$'})
+    assert changed == {'ELECTRICITY_RATE': 0.3}
+    assert notified == [{'ELECTRICITY_RATE': 0.3}]
+    assert store.get('ELECTRICITY_RATE') == 0.3
+    assert store.version == 1
+    assert json.loads((tmp_path / 'settings.json').read_text())['ELECTRICITY_RATE'] == 0.3
+
+    assert store.update({'ELECTRICITY_RATE': 0.3}) == {}
+    assert store.version == 1
+
+
+@pytest.mark.parametrize('changes', [
+    {'HA_URL': 'http://other'},
+    {'ELECTRICITY_RATE': 'cheap'},
+    {'ELECTRICITY_RATE': -1},
+    {'CACHE_TTL': 0},
+    {'CURRENCY_SYMBOL': ' '},
+])
+def test_invalid_updates_are_rejected(tmp_path, changes):
+    store = make_store(tmp_path)
+    with pytest.raises(ValueError):
+        store.update(changes)
+    assert not (tmp_path / 'settings.json').exists()
+
+
+def test_other_workers_pick_up_changes(tmp_path):
+    writer, reader = make_store(tmp_path), make_store(tmp_path)
+    notified = []
+    reader.subscribe(notified.append)
+
+    writer.update({'CACHE_TTL': 120})
+    assert reader.get('CACHE_TTL') == 120
+    assert notified == [{'CACHE_TTL': 120}]
+
+
+def test_check_interval_limits_file_checks(tmp_path):
+    writer = make_store(tmp_path)
+    reader = SettingsStore(str(tmp_path / 'settings.json'), DEFAULTS, check_interval=3600)
+    reader.refresh()
+
+    writer.update({'CACHE_TTL': 120})
+    assert reader.get('CACHE_TTL') == 60
+
+
+def test_invalid_file_entries_are_ignored(tmp_path):
+    (tmp_path / 'settings.json').write_text(json.dumps({'CACHE_TTL': -5, 'CURRENCY_SYMBOL': '€'}))
+    store = make_store(tmp_path)
+    assert store.get('CACHE_TTL') == 60
+    assert store.get('CURRENCY_SYMBOL') == '€'
+
+    (tmp_path / 'settings.json').write_text('not json')
+    store.refresh()
+    assert store.values() == {'ELECTRICITY_RATE': 0.15, 'CURRENCY_SYMBOL': '$', 'CACHE_TTL': 60}
+
+
+def test_fingerprint_follows_values_not_reloads(tmp_path):
+    writer, reader = make_store(tmp_path), make_store(tmp_path)
+    initial = reader.fingerprint
+
+    writer.update({'CACHE_TTL': 120})
+    writer.update({'CACHE_TTL': 90})
+    reader.refresh()
+    assert writer.version == 2 and reader.version == 1
+    assert reader.fingerprint == writer.fingerprint != initial
+
+    writer.update({'CACHE_TTL': 60})
+    assert writer.fingerprint == initial
@@ -0,0 +1,128 @@
+"""Tests for the multi-site registry and portfolio view"""
+import threading
+import time
+
+import pytest
+
+from services.sites import Site, SiteRegistry, parse_sites
+
+
+class StubProcessor:
+    """Serves fixed overview and cost views, optionally slow or failing"""
+
+    def __init__(self, power, daily_cost, delay=0.0, error=None, stale=False, gate=None):
+        self.overview = {'total_power': power, 'daily_energy': power / 100, 'device_count': 2, 'stale': stale,
+                         'top_consumers': [{'name': f'Heater {power}', 'power': power * 0.8}]}
+        self.costs = {'daily_cost': daily_cost, 'monthly_cost': daily_cost * 30,
+                      'monthly_projection': daily_cost * 31}
+        self.delay = delay
+        self.error = error
+        self.gate = gate
+        self.calls = {'overview': 0, 'costs': 0}
+        self._lock = threading.Lock()
+
+    def _serve(self, view):
+        with self._lock:
+            self.calls[view] += 1
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return getattr(self, view)
+
+    def get_overview_data(self):
+        return self._serve('overview')
+
+    def get_cost_data(self):
+        return self._serve('costs')
+
+
+def registry(*processors, timeout=5):
+    return SiteRegistry([Site(f'site{i}', f'Site {i}', None, processor)
+                         for i, processor in enumerate(processors)], timeout=timeout)
+
+
+def test_portfolio_merges_sites():
+    data = registry(StubProcessor(1000, 2.0), StubProcessor(500, 1.0)).get_portfolio_data()
+
+    assert data['total_power'] == 1500
+    assert data['daily_cost'] == pytest.approx(3.0)
+    assert data['monthly_projection'] == pytest.approx(93.0)
+    assert data['device_count'] == 4
+    assert (data['sites_ok'], data['sites_failed']) == (2, 0)
+    assert [consumer['site'] for consumer in data['top_consumers']] == ['Site 0', 'Site 1']
+
+
+def test_sites_are_fetched_concurrently():
+    sites = registry(*(StubProcessor(100, 1.0, delay=0.2) for _ in range(3)))
+    started = time.monotonic()
+    sites.get_portfolio_data()
+    assert time.monotonic() - started < 0.35
+
+
+def test_failing_site_is_reported_and_left_out_of_totals():
+    data = registry(StubProcessor(1000, 2.0),
+                    StubProcessor(500, 1.0, error=ConnectionError('unreachable'))).get_portfolio_data()
+
+    failed = data['sites'][1]
+    assert failed['status'] == 'error'
+    assert 'unreachable' in failed['error']
+    assert data['total_power'] == 1000
+    assert (data['sites_ok'], data['sites_failed']) == (1, 1)
+
+
+def test_stale_site_data_is_flagged():
+    data = registry(StubProcessor(1000, 2.0), StubProcessor(500, 1.0, stale=True)).get_portfolio_data()
+    assert [row['stale'] for row in data['sites']] == [False, True]
+    assert data['total_power'] == 1500
+
+
+def test_hung_site_times_out_and_its_fetch_is_joined():
+    gate = threading.Event()
+    hung = StubProcessor(500, 1.0, gate=gate)
+    sites = registry(StubProcessor(1000, 2.0), hung, timeout=0.2)
+    try:
+        for _ in range(3):
+            started = time.monotonic()
+            data = sites.get_portfolio_data()
+            assert time.monotonic() - started < 0.5
+            assert data['sites'][0]['status'] == 'ok'
+            assert data['sites'][1]['status'] == 'error'
+            assert 'No answer' in data['sites'][1]['error']
+
+        # Later portfolio requests wait for the running fetch instead of queueing more
+        assert hung.calls == {'overview': 1, 'costs': 1}
+    finally:
+        gate.set()
+
+    time.sleep(0.05)
+    data = sites.get_portfolio_data()
+    assert data['sites'][1]['status'] == 'ok'
+    assert hung.calls == {'overview': 2, 'costs': 2}
+
+
+def test_unchanged_views_reuse_merged_result():
+    sites = registry(StubProcessor(1000, 2.0))
+    assert sites.get_portfolio_data() is sites.get_portfolio_data()
+
+
+def test_parse_sites(monkeypatch):
+    monkeypatch.setenv('HA_TOKEN_BEACH_HOUSE', 'secret')
+    sites = parse_sites('[{"id": "beach-house", "url": "http://beach:8123", "rate": 0.3}]')
+    assert sites == [{'id': 'beach-house', 'name': 'beach-house', 'url': 'http://beach:8123',
+                      'token': 'secret', 'rate': 0.3}]
+    assert parse_sites('') == []
+
+
+@pytest.mark.parametrize('spec', [
+    'not json',
+    '{"id": "a"}',
+    '[{"id": "a"}]',
+    '[{"id": "a", "url": "http://a"}]',
+    '[{"id": "a", "url": "http://a", "token": "t"}, {"id": "a", "url": "http://b", "token": "t"}]',
+])
+def test_parse_sites_rejects_malformed_settings(spec, monkeypatch):
+    monkeypatch.delenv('HA_TOKEN_A', raising=False)
+    with pytest.raises(ValueError):
+        parse_sites(spec)
@@ -0,0 +1,84 @@
+"""Tests for the quantile sketch"""
+import random
+
+import pytest
+
+from services.sketch import QuantileSketch
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean is None
+
+
+@pytest.mark.parametrize('q', [0.01, 0.25, 0.5, 0.95, 0.99])
+def test_quantiles_within_relative_accuracy(q):
+    rng = random.Random(1)
+    values = [rng.lognormvariate(5, 1.5) for _ in range(5000)]
+    sketch = QuantileSketch(relative_accuracy=0.02)
+    for value in values:
+        sketch.add(value)
+
+    expected = exact_quantile(values, q)
+    assert sketch.quantile(q) == pytest.approx(expected, rel=0.02)
+
+
+def test_extremes_are_exact():
+    sketch = QuantileSketch()
+    for value in (3.0, 7.5, 120.0):
+        sketch.add(value)
+    assert sketch.quantile(0) == 3.0
+    assert sketch.quantile(1) == 120.0
+    assert sketch.mean == pytest.approx(130.5 / 3)
+
+
+def test_zero_and_negative_values():
+    sketch = QuantileSketch()
+    for value in (-50.0, -5.0, 0.0, 0.0, 10.0):
+        sketch.add(value)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(0.2) == pytest.approx(-50.0, rel=0.02)
+    assert sketch.quantile(0.3) == pytest.approx(-5.0, rel=0.02)
+
+
+def test_weights_count_as_repeated_values():
+    weighted, repeated = QuantileSketch(), QuantileSketch()
+    weighted.add(100.0, weight=9)
+    weighted.add(1.0)
+    for _ in range(9):
+        repeated.add(100.0)
+    repeated.add(1.0)
+    assert weighted.count == repeated.count == 10
+    assert weighted.quantile(0.5) == repeated.quantile(0.5)
+
+
+def test_merge_matches_single_sketch():
+    rng = random.Random(2)
+    values = [rng.uniform(1, 3000) for _ in range(2000)]
+    whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (first if i % 2 else second).add(value)
+
+    first.merge(second)
+    first.merge(QuantileSketch())
+    assert first.count == whole.count
+    assert first.min == whole.min and first.max == whole.max
+    for q in (0.1, 0.5, 0.9, 0.99):
+        assert first.quantile(q) == whole.quantile(q)
+
+
+def test_bins_are_bounded():
+    sketch = QuantileSketch(relative_accuracy=0.01, max_bins=32)
+    for exponent in range(-20, 40):
+        sketch.add(2.0 ** exponent)
+    assert len(sketch.positive) <= 32
+    # Collapsing only loses accuracy for the smallest values
+    assert sketch.quantile(1) == 2.0 ** 39
+    assert sketch.quantile(0.99) == pytest.approx(2.0 ** 38, rel=0.01)
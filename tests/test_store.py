@@ -0,0 +1,77 @@
+"""Tests for the shared view store"""
+import threading
+import time
+
+from services.store import HEARTBEAT_KEY, SharedStore
+
+
+def test_put_get_roundtrip(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    assert store.get('overview') is None
+
+    store.put('overview', {'total_power': 1200.5}, ts=1000.0)
+    assert store.get('overview') == (1000.0, {'total_power': 1200.5})
+
+
+def test_decoded_view_is_reused_until_republished(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    store.put('overview', {'total_power': 1}, ts=1000.0)
+    first = store.get('overview')
+    assert store.get('overview') is first
+
+    store.put('overview', {'total_power': 2}, ts=1001.0)
+    assert store.get('overview') == (1001.0, {'total_power': 2})
+
+
+def test_other_processes_see_published_views(tmp_path):
+    writer = SharedStore(str(tmp_path / 'views.db'))
+    reader = SharedStore(str(tmp_path / 'views.db'))
+    writer.put('costs', {'daily_cost': 1.5})
+    assert reader.get('costs')[1] == {'daily_cost': 1.5}
+
+
+def test_connections_are_per_thread(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    store.put('realtime', [1, 2, 3])
+    results = []
+    thread = threading.Thread(target=lambda: results.append(store.get('realtime')[1]))
+    thread.start()
+    thread.join()
+    assert results == [[1, 2, 3]]
+
+
+def test_delete(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    store.put('history_range_1_2', {'points': []})
+    store.get('history_range_1_2')
+    store.delete('history_range_1_2')
+    assert store.get('history_range_1_2') is None
+    store.delete('never_published')
+
+
+def test_keys_exclude_heartbeat(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    store.put('overview', {})
+    store.heartbeat({'cycle': 1})
+    assert store.keys() == ['overview']
+
+
+def test_demanded_drops_old_requests(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    store.request('device_sensor.a')
+    since = time.time()
+    time.sleep(0.01)
+    store.request('device_sensor.b')
+
+    assert store.demanded(since) == ['device_sensor.b']
+    assert store.demanded(0) == ['device_sensor.b']
+
+
+def test_collector_status(tmp_path):
+    store = SharedStore(str(tmp_path / 'views.db'))
+    assert store.collector_status() is None
+
+    store.put(HEARTBEAT_KEY, {'cycle': 3}, ts=time.time() - 5)
+    status = store.collector_status()
+    assert status['cycle'] == 3
+    assert 4 <= status['age'] <= 10
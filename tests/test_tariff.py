@@ -0,0 +1,77 @@
+"""Tests for time-of-use and tiered pricing"""
+from datetime import datetime
+
+import pytest
+
+from services.tariff import STANDARD, Tariff
+
+TIERS = [{'up_to': None, 'rate': 0.20}, {'up_to': 10, 'rate': 0.10}]
+
+
+def hour(*args):
+    return int(datetime(*args).timestamp())
+
+
+def test_flat_rate():
+    tariff = Tariff(0.25)
+    priced = tariff.price([(hour(2026, 3, 2, 12), 2.0), (hour(2026, 3, 2, 13), 2.0)])
+    assert priced['cost'] == pytest.approx(1.0)
+    assert priced['kwh'] == pytest.approx(4.0)
+    assert priced['by_day'] == {'2026-03-02': {'kwh': 4.0, 'cost': pytest.approx(1.0)}}
+
+
+def test_tiers_are_sorted_and_hours_split_at_boundary():
+    tariff = Tariff(0.5, tiers=TIERS)
+    priced = tariff.price([(hour(2026, 3, 2, 0), 8.0), (hour(2026, 3, 2, 1), 4.0)])
+    # 8 kWh in the first tier, then 2 kWh at 0.10 and 2 kWh at 0.20
+    assert priced['cost'] == pytest.approx(0.8 + 0.2 + 0.4)
+    assert priced['month_kwh'] == pytest.approx(12.0)
+
+
+def test_consumption_beyond_last_tier_uses_base_rate():
+    tariff = Tariff(0.5, tiers=[{'up_to': 10, 'rate': 0.10}])
+    priced = tariff.price([(hour(2026, 3, 2, 0), 12.0)])
+    assert priced['cost'] == pytest.approx(1.0 + 1.0)
+
+
+def test_tier_consumption_restarts_every_month():
+    tariff = Tariff(0.5, tiers=TIERS)
+    priced = tariff.price([(hour(2026, 3, 31, 23), 10.0), (hour(2026, 4, 1, 0), 5.0)])
+    assert priced['cost'] == pytest.approx(1.0 + 0.5)
+    assert priced['month_kwh'] == pytest.approx(5.0)
+
+
+def test_priced_from_seeds_month_consumption():
+    tariff = Tariff(0.5, tiers=TIERS)
+    priced = tariff.price(
+        [(hour(2026, 3, 1, 0), 8.0), (hour(2026, 3, 2, 0), 4.0)],
+        priced_from=hour(2026, 3, 2, 0)
+    )
+    assert priced['kwh'] == pytest.approx(4.0)
+    assert priced['cost'] == pytest.approx(0.2 + 0.4)
+    assert priced['month_kwh'] == pytest.approx(12.0)
+    assert list(priced['by_day']) == ['2026-03-02']
+
+
+def test_window_energy_counts_towards_tiers_at_window_rate():
+    # 2026-03-02 is a Monday
+    windows = [{'name': 'Night', 'days': [0], 'start': 0, 'end': 6, 'rate': 0.05}]
+    tariff = Tariff(0.5, windows=windows, tiers=TIERS)
+    priced = tariff.price([(hour(2026, 3, 2, 1), 10.0), (hour(2026, 3, 2, 12), 1.0)])
+    assert priced['by_window']['Night']['cost'] == pytest.approx(0.5)
+    assert priced['by_window'][STANDARD]['cost'] == pytest.approx(0.2)
+
+
+def test_overnight_window_belongs_to_start_day():
+    windows = [{'name': 'Night', 'days': [4], 'start': 22, 'end': 6, 'rate': 0.05}]
+    tariff = Tariff(0.3, windows=windows)
+    # Friday 23:00 and Saturday 02:00 are in the window, Friday 02:00 is not
+    assert tariff.rate_at(datetime(2026, 3, 6, 23)) == ('Night', 0.05)
+    assert tariff.rate_at(datetime(2026, 3, 7, 2)) == ('Night', 0.05)
+    assert tariff.rate_at(datetime(2026, 3, 6, 2)) == (STANDARD, 0.3)
+
+
+def test_invalid_spec():
+    with pytest.raises(ValueError):
+        Tariff.from_spec({'windows': [{'start': 0, 'end': 6}]}, 0.3)
+    assert Tariff.from_spec('', 0.3).base_rate == 0.3
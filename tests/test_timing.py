@@ -0,0 +1,94 @@
+"""Tests for the per-request stage timings and the Server-Timing header"""
+import re
+import time
+
+import pytest
+
+from utils import timing
+
+
+@pytest.fixture
+def enabled():
+    timing.enable(True)
+    timing.start_request()
+    yield
+    timing.end_request()
+    timing.enable(False)
+
+
+def metrics(header):
+    """Server-Timing header as {name: (duration ms, description)}"""
+    parsed = {}
+    for metric in header.split(', '):
+        match = re.fullmatch(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', metric)
+        assert match, metric
+        parsed[match.group(1)] = (float(match.group(2)), match.group(3))
+    return parsed
+
+
+def test_nested_stages_count_self_time(enabled):
+    with timing.stage('aggregate'):
+        time.sleep(0.02)
+        with timing.stage('ha'):
+            time.sleep(0.05)
+    with timing.stage('ha'):
+        time.sleep(0.01)
+
+    stages = timing.current().as_dict()['stages']
+    assert stages['ha']['count'] == 2
+    assert stages['aggregate']['count'] == 1
+    assert stages['ha']['ms'] >= 60
+    assert 20 <= stages['aggregate']['ms'] < 50
+
+
+def test_header_format(enabled):
+    with timing.stage('json'):
+        pass
+
+    parsed = metrics(timing.current().header())
+    assert list(parsed) == ['json', 'total']
+    assert parsed['json'][1] == 'JSON decoding (1)'
+
+
+def test_timed_decorator(enabled):
+    @timing.timed('aggregate')
+    def work():
+        return 42
+
+    assert work() == 42
+    assert timing.current().stages['aggregate'][1] == 1
+
+
+def test_disabled_timing_is_a_no_op():
+    timing.enable(False)
+    assert timing.stage('ha') is timing.stage('json')
+    timing.start_request()
+    assert timing.current() is None
+    assert timing.end_request() is None
+
+
+def test_no_header_unless_enabled(make_app):
+    response = make_app().test_client().get('/overview')
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response.headers
+
+
+def test_server_timing_header(make_app):
+    client = make_app(SERVER_TIMING=True).test_client()
+    response = client.get('/overview')
+    assert response.status_code == 200
+
+    parsed = metrics(response.headers['Server-Timing'])
+    assert {'ha', 'json', 'aggregate', 'render', 'total'} <= set(parsed)
+    assert parsed['ha'][1].startswith('Home Assistant I/O')
+    assert sum(duration for name, (duration, _) in parsed.items() if name != 'total') <= parsed['total'][0] + 1
+
+
+def test_timing_debug_block(make_app):
+    client = make_app(SERVER_TIMING=True).test_client()
+
+    body = client.get('/api/realtime?timing=1').get_json()
+    assert set(body['_timing']['stages']) >= {'ha', 'json'}
+
+    html = client.get('/overview?timing=1', headers={'Accept-Encoding': 'identity'}).get_data(as_text=True)
+    assert '<script type="application/json" id="server-timing">' in html
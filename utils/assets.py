@@ -0,0 +1,188 @@
+"""
+Fingerprinted Static Assets
+
+A build step copies every file under static/ to static/dist/ with a content
+hash in its name (css/custom.css -> dist/css/custom.3f2a9c1b7e.css), writes
+gzip and brotli variants of text assets next to it, and records the mapping
+in static/dist/manifest.json.
+
+With the manifest present, url_for('static', filename='css/custom.css')
+returns the fingerprinted URL, so templates need no changes. Fingerprinted
+files never change, so they are served with an immutable one-year cache
+lifetime, in the precompressed encoding the client accepts. Without a
+manifest (e.g. during development) static files are served as before.
+
+    python build_assets.py
+"""
+from typing import Dict, Optional
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import logging
+
+from flask import Flask, abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; only gzip variants are built without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Build output inside the static folder
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Assets that get precompressed variants
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.map')
+
+# Relative references inside stylesheets (data: URIs, absolute URLs and paths are left alone)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)(?!data:|[a-z]+://|/|#)([^'")?#]+)([^'")]*)\1\s*\)''')
+
+# Cache lifetime of fingerprinted files
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _fingerprinted(filename: str, content: bytes) -> str:
+    """Name with a content hash before the extension ('css/a.css' -> 'css/a.<hash>.css')"""
+    digest = hashlib.blake2b(content, digest_size=5).hexdigest()
+    root, ext = posixpath.splitext(filename)
+    return f"{root}.{digest}{ext}"
+
+
+def _rewrite_css(filename: str, content: bytes, manifest: Dict[str, str]) -> bytes:
+    """Point relative url() references of a stylesheet at the fingerprinted files"""
+    directory = posixpath.dirname(filename)
+
+    def replace(match):
+        quote, path, suffix = match.groups()
+        target = posixpath.normpath(posixpath.join(directory, path))
+        hashed = manifest.get(target)
+        if hashed is None:
+            return match.group()
+        relative = posixpath.relpath(hashed[len(DIST_DIR) + 1:], directory or '.')
+        return f"url({quote}{relative}{suffix}{quote})"
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def build(static_folder: str, level: int = 9) -> Dict[str, str]:
+    """
+    Build fingerprinted and precompressed copies of all static files
+
+    The previous build is replaced. Stylesheets are processed last, so their
+    references to other assets can be rewritten first.
+
+    Args:
+        static_folder: Flask static folder
+        level: Compression level (gzip 1-9; brotli uses its maximum quality)
+
+    Returns:
+        Manifest mapping source file names to fingerprinted file names,
+        both relative to the static folder
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(files):
+            if not name.startswith('.'):
+                path = os.path.join(root, name)
+                sources.append(os.path.relpath(path, static_folder).replace(os.sep, '/'))
+    sources.sort(key=lambda filename: filename.endswith('.css'))
+
+    manifest = {}
+    for filename in sources:
+        with open(os.path.join(static_folder, filename), 'rb') as f:
+            content = f.read()
+        if filename.endswith('.css'):
+            content = _rewrite_css(filename, content, manifest)
+
+        hashed = posixpath.join(DIST_DIR, _fingerprinted(filename, content))
+        target = os.path.join(static_folder, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+
+        if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            with open(target + '.gz', 'wb') as f:
+                f.write(gzip.compress(content, compresslevel=level, mtime=0))
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+        manifest[filename] = hashed
+
+    with open(os.path.join(dist, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder: str) -> Optional[Dict[str, str]]:
+    """
+    Read the manifest of the last build
+
+    Args:
+        static_folder: Flask static folder
+
+    Returns:
+        Manifest, or None if no build exists
+    """
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable asset manifest %s: %s", path, e)
+        return None
+
+
+def init_app(app: Flask) -> bool:
+    """
+    Serve fingerprinted assets and rewrite static URLs to them
+
+    Args:
+        app: Flask application
+
+    Returns:
+        Whether a build was found
+    """
+    manifest = load_manifest(app.static_folder)
+    if not manifest:
+        return False
+
+    def fingerprint_url(endpoint: str, values: dict):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def serve_asset(filename: str):
+        path = safe_join(app.static_folder, DIST_DIR, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        encoding = request.accept_encodings.best_match(
+            [name for name, ext in (('br', '.br'), ('gzip', '.gz')) if os.path.isfile(path + ext)]
+        )
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        response = send_from_directory(app.static_folder, posixpath.join(DIST_DIR, filename) + suffix,
+                                       mimetype=mimetypes.guess_type(filename)[0], max_age=31536000)
+        if suffix:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    app.url_defaults(fingerprint_url)
+    app.add_url_rule(f"{app.static_url_path}/{DIST_DIR}/<path:filename>", 'static_asset', serve_asset)
+    logger.info("Serving %s fingerprinted static assets", len(manifest))
+    return True
@@ -0,0 +1,147 @@
+"""
+Conditional and Compressed Responses
+
+Response post-processing for pages and API endpoints: views get a weak ETag
+derived from the version of the data they show, known before anything is
+rendered, so a client that already holds the same view gets a bodyless 304
+without the page being rendered or serialized. Responses without a data
+version fall back to a tag hashed from the body. Larger text bodies are
+compressed with brotli (when installed) or gzip.
+"""
+from typing import Optional
+import gzip
+import hashlib
+import os
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is used without it
+    brotli = None
+
+# Content types worth compressing
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+                      'image/svg+xml')
+
+
+def _buffered(response: Response) -> bool:
+    """Whether the body is fully in memory (not a stream or file)"""
+    return not response.direct_passthrough and not response.is_streamed
+
+
+def release_id(*folders: str) -> str:
+    """
+    Identifier of the deployed templates and static files
+
+    Part of every data ETag, so a deploy changing a template does not leave
+    clients with pages rendered by the old one.
+
+    Args:
+        folders: Directories to scan
+
+    Returns:
+        Newest modification time of any file in the folders
+    """
+    newest = 0.0
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in files:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return f'{newest:.0f}'
+
+
+def data_etag(*parts) -> str:
+    """
+    ETag of a response built from one version of view data
+
+    Args:
+        parts: Everything the response depends on (URL, data version, settings, ...)
+
+    Returns:
+        Opaque tag
+    """
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def not_modified(etag: str, request: Request) -> Optional[Response]:
+    """
+    Answer a request whose If-None-Match holds the tag, before building the body
+
+    Args:
+        etag: Tag of the response that would be built
+        request: Current request
+
+    Returns:
+        304 response, or None if the body is needed
+    """
+    if request.method not in ('GET', 'HEAD') or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def add_etag(response: Response, request: Request, etag: Optional[str] = None) -> Response:
+    """
+    Attach an ETag and answer If-None-Match with 304
+
+    The tag is weak, so it stays valid for every content encoding of the
+    same body.
+
+    Args:
+        response: Response about to be sent
+        request: Current request
+        etag: Tag derived from the data version (see data_etag); without
+            one, the tag is hashed from the body
+
+    Returns:
+        The response, turned into a 304 if the client's copy is current
+    """
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200 or not _buffered(response):
+        return response
+
+    if 'ETag' not in response.headers:
+        if etag is None:
+            etag = hashlib.blake2b(response.get_data(), digest_size=12).hexdigest()
+        response.set_etag(etag, weak=True)
+    # Clients keep the body but revalidate it on every use
+    response.headers.setdefault('Cache-Control', 'no-cache')
+    return response.make_conditional(request)
+
+
+def compress(response: Response, request: Request, min_size: int = 1024, level: int = 6) -> Response:
+    """
+    Compress a text body with the best encoding the client accepts
+
+    Args:
+        response: Response about to be sent
+        request: Current request
+        min_size: Bodies smaller than this many bytes are sent as they are
+        level: Compression level (gzip 1-9; brotli uses quality 5 for speed)
+
+    Returns:
+        The response, with its body encoded when worthwhile
+    """
+    if (response.status_code < 200 or response.status_code in (204, 304) or not _buffered(response)
+            or 'Content-Encoding' in response.headers
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(encodings)
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=5))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=level))
+    else:
+        return response
+
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -1,34 +1,89 @@
 """
 Logging utility for Energy Dashboard
+
+Loggers created with setup_logger() share a single non-blocking pipeline:
+request threads only put records on an in-memory queue, and a background
+listener thread formats them and writes them to the console and the rotating
+log file. Repetitive messages are rate limited before they reach the queue.
 """
+import atexit
+import copy
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 
+_pipeline_lock = threading.Lock()
+_queue_handler = None
+_listener = None
 
-def setup_logger(name: str, level: str = None) -> logging.Logger:
-    """
-    Set up a logger with console and file handlers
 
-    Args:
-        name: Logger name (typically __name__)
-        level: Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
 
-    Returns:
-        Configured logger instance
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now so later mutation can't change the message;
+        # timestamps and layout are applied by the listener's formatters.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
     """
-    # Get log level from environment or use INFO as default
-    if level is None:
-        level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    Limit how often the same message template is logged
 
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
+    Records are grouped by logger, level and unformatted message, so
+    'API error: %s' counts as one message regardless of its arguments. At most
+    `burst` records per group pass in each `interval`; the first record of the
+    next window reports how many were suppressed.
+    """
 
-    # Avoid duplicate handlers
-    if logger.handlers:
-        return logger
+    def __init__(self, burst: int = 5, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+                return True
+
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+
+            window[2] += 1
+            return False
+
+
+def _create_pipeline() -> NonBlockingQueueHandler:
+    """Create the shared queue handler and start its background writer"""
+    global _queue_handler, _listener
 
     # Create formatters
     detailed_formatter = logging.Formatter(
@@ -44,9 +99,10 @@ def setup_logger(name: str, level: str = None) -> logging.Logger:
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(simple_formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
 
     # File handler with rotation
+    file_error = None
     try:
         log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
         os.makedirs(log_dir, exist_ok=True)
@@ -58,9 +114,55 @@ def setup_logger(name: str, level: str = None) -> logging.Logger:
         )
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(detailed_formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
     except Exception as e:
-        logger.warning(f"Could not set up file logging: {e}")
+        file_error = e
+
+    log_queue = queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', '10000')))
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter(
+        burst=int(os.environ.get('LOG_RATE_LIMIT', '5')),
+        interval=float(os.environ.get('LOG_RATE_INTERVAL', '60'))
+    ))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    if file_error:
+        logging.getLogger(__name__).warning("Could not set up file logging: %s", file_error)
+
+    return _queue_handler
+
+
+def setup_logger(name: str, level: str = None) -> logging.Logger:
+    """
+    Set up a logger writing through the shared non-blocking pipeline
+
+    Args:
+        name: Logger name (typically __name__)
+        level: Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+
+    Returns:
+        Configured logger instance
+    """
+    # Get log level from environment or use INFO as default
+    if level is None:
+        level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+    # Create logger
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+
+    # Avoid duplicate handlers
+    if logger.handlers:
+        return logger
+
+    with _pipeline_lock:
+        handler = _queue_handler or _create_pipeline()
+
+    logger.addHandler(handler)
+    logger.propagate = False
 
     return logger
 
@@ -75,8 +177,8 @@ def log_exception(logger: logging.Logger, exception: Exception, context: str = N
         context: Additional context information
     """
     if context:
-        logger.error(f"{context}: {type(exception).__name__}: {str(exception)}")
+        logger.error("%s: %s: %s", context, type(exception).__name__, str(exception))
     else:
-        logger.error(f"{type(exception).__name__}: {str(exception)}")
+        logger.error("%s: %s", type(exception).__name__, str(exception))
 
     logger.debug("Exception details:", exc_info=True)
@@ -0,0 +1,104 @@
+"""
+Rendered Output Cache
+
+Pages are rendered from view data that stays the same object for a whole
+cache generation, so the rendered HTML can be reused until the data object
+or the runtime settings change.
+"""
+from collections import OrderedDict
+from typing import Hashable, Optional
+import threading
+
+
+class LRUCache:
+    """Thread-safe mapping that drops its least recently used entries"""
+
+    def __init__(self, max_entries: int = 64):
+        """
+        Initialize cache
+
+        Args:
+            max_entries: Maximum number of entries kept (0 disables the cache)
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        """
+        Get an entry and mark it as recently used
+
+        Args:
+            key: Entry key
+
+        Returns:
+            Cached value or None
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value):
+        """
+        Store an entry, evicting the oldest one when full
+
+        Args:
+            key: Entry key
+            value: Value to cache
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+class PageCache(LRUCache):
+    """Rendered pages, valid while their view data object and settings are unchanged"""
+
+    def lookup(self, key: Hashable, data, settings: str) -> Optional[str]:
+        """
+        Get the HTML rendered from exactly this data object
+
+        The entry keeps a reference to the data it was rendered from, so
+        comparing identity is safe: a recomputed view is a new object.
+
+        Args:
+            key: Template and render arguments
+            data: View data about to be rendered
+            settings: Fingerprint of the current runtime settings
+
+        Returns:
+            Rendered HTML or None
+        """
+        entry = self.get(key)
+        if entry is None or entry[0] is not data or entry[1] != settings:
+            return None
+        return entry[2]
+
+    def store(self, key: Hashable, data, settings: str, html: str):
+        """
+        Remember the HTML rendered from a data object
+
+        Args:
+            key: Template and render arguments
+            data: View data the page was rendered from
+            settings: Fingerprint of the runtime settings used
+            html: Rendered page
+        """
+        self.set(key, (data, settings, html))
+
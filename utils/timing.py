@@ -0,0 +1,183 @@
+"""
+Per-request timing instrumentation for Energy Dashboard
+
+Records how long each request spends in Home Assistant I/O, JSON decoding,
+DataProcessor aggregation and template rendering, and formats the result as
+a Server-Timing header. Stages are accounted as self time: a stage nested in
+another is subtracted from its parent, so the stages add up to the request.
+
+When timing is disabled, stage() returns a shared no-op context manager and
+timed() calls straight through, so instrumented code pays a single flag check.
+"""
+import functools
+import threading
+import time
+from typing import Dict, Optional
+
+_enabled = False
+_local = threading.local()
+
+# Human readable descriptions shown in browser devtools
+STAGE_DESCRIPTIONS = {
+    'ha': 'Home Assistant I/O',
+    'json': 'JSON decoding',
+    'aggregate': 'DataProcessor aggregation',
+    'render': 'Template rendering',
+}
+
+
+class _NullStage:
+    """No-op stage used when timing is disabled or outside a request"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class RequestTimings:
+    """Accumulated stage timings for a single request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._stack = []
+
+    def push(self, name: str):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        name, started, children = self._stack.pop()
+        elapsed = time.perf_counter() - started
+
+        duration, count = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (duration + elapsed - children, count + 1)
+
+        # Charge the parent only for its own work
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self) -> Dict:
+        """
+        Timings as a JSON-serialisable dictionary
+
+        Returns:
+            Dictionary with per-stage milliseconds, call counts and total
+        """
+        return {
+            'stages': {
+                name: {'ms': round(duration * 1000, 2), 'count': count}
+                for name, (duration, count) in self.stages.items()
+            },
+            'total_ms': round(self.total_ms(), 2)
+        }
+
+    def header(self) -> str:
+        """
+        Timings formatted as a Server-Timing header value
+
+        Returns:
+            Header value, e.g. 'ha;dur=120.5;desc="Home Assistant I/O (2)"'
+        """
+        metrics = []
+        for name, (duration, count) in self.stages.items():
+            desc = STAGE_DESCRIPTIONS.get(name, name)
+            metrics.append(f'{name};dur={duration * 1000:.1f};desc="{desc} ({count})"')
+        metrics.append(f'total;dur={self.total_ms():.1f}')
+        return ', '.join(metrics)
+
+
+class _Stage:
+    """Context manager timing one stage of the current request"""
+
+    __slots__ = ('timings', 'name')
+
+    def __init__(self, timings: RequestTimings, name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.timings.push(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings.pop()
+        return False
+
+
+def enable(flag: bool = True):
+    """Turn timing collection on or off process-wide"""
+    global _enabled
+    _enabled = flag
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def start_request():
+    """Begin collecting timings for the current thread's request"""
+    if _enabled:
+        _local.timings = RequestTimings()
+
+
+def end_request() -> Optional[RequestTimings]:
+    """
+    Stop collecting timings for the current thread's request
+
+    Returns:
+        Collected timings, or None if timing was not active
+    """
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    return timings
+
+
+def current() -> Optional[RequestTimings]:
+    """Timings of the request running on this thread, if any"""
+    if not _enabled:
+        return None
+    return getattr(_local, 'timings', None)
+
+
+def stage(name: str):
+    """
+    Time a block of code as the given stage
+
+    Args:
+        name: Stage name ('ha', 'json', 'aggregate', 'render')
+
+    Returns:
+        Context manager (no-op if timing is disabled or no request is active)
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    timings = getattr(_local, 'timings', None)
+    if timings is None:
+        return _NULL_STAGE
+    return _Stage(timings, name)
+
+
+def timed(name: str):
+    """
+    Decorator timing every call of a function as the given stage
+
+    Args:
+        name: Stage name
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator